@@ -15,6 +15,8 @@ from blueprints.employees import bp as employees_bp
 from blueprints.auth import bp as auth_bp
 from blueprints.admin import bp as admin_bp
 from blueprints.inquiries import bp as inquiries_bp
+from blueprints.media import bp as media_bp
+from blueprints.exports import bp as exports_bp
 
 
 def create_app():
@@ -26,13 +28,41 @@ def create_app():
     migrate.init_app(app, db)
     login_manager.init_app(app)
 
+    import querycount
+    querycount.init_app(app)
+
     # ВАЖНО: импорт моделей ПОСЛЕ db.init_app, чтобы избежать циклов
     from models import Car, Customer, Employee, Sale, User, Inquiry  # noqa: F401
 
+    # CLI-команды (flask rates ..., flask images ..., flask uploads ..., flask remote-images ..., flask counters ..., flask passwords ..., flask rollups ..., flask export ..., flask cars import ..., flask outbox dispatch)
+    from rates import rates_cli
+    from images import images_cli, image_srcset
+    from storage import uploads_cli
+    from remote_images import remote_images_cli, remote_image_path
+    from counters import counters_cli, entity_counts
+    from passwords import passwords_cli
+    from rollups import rollups_cli
+    from exports import export_command
+    from car_import import cars_cli
+    from outbox import outbox_cli
+    app.cli.add_command(rates_cli)
+    app.cli.add_command(images_cli)
+    app.cli.add_command(uploads_cli)
+    app.cli.add_command(remote_images_cli)
+    app.cli.add_command(counters_cli)
+    app.cli.add_command(passwords_cli)
+    app.cli.add_command(rollups_cli)
+    app.cli.add_command(export_command)
+    app.cli.add_command(cars_cli)
+    app.cli.add_command(outbox_cli)
+    app.add_template_global(image_srcset)
+    app.add_template_global(remote_image_path)
+
     @login_manager.user_loader
     def load_user(user_id):
-        from models import User  # локальный импорт во избежание циклов
-        return User.query.get(int(user_id))
+        from identity import load_identity  # локальный импорт во избежание циклов
+        # кэш в воркере: без запроса users на каждую страницу (см. identity.py)
+        return load_identity(int(user_id))
 
     # регистрация блюпринтов
     app.register_blueprint(cars_bp, url_prefix='/cars')
@@ -42,6 +72,13 @@ def create_app():
     app.register_blueprint(auth_bp, url_prefix='/auth')
     app.register_blueprint(admin_bp, url_prefix='/admin')
     app.register_blueprint(inquiries_bp, url_prefix='/inquiries')
+    app.register_blueprint(media_bp)
+    app.register_blueprint(exports_bp, url_prefix='/exports')
+
+    @app.template_global()
+    def upload_url(name):
+        """URL загруженного файла (см. blueprints/media)."""
+        return url_for('media.upload', name=name)
 
     # фильтр Jinja
     @app.template_filter('money')
@@ -53,21 +90,21 @@ def create_app():
             v = value
         return f"{v} {symbols.get(cur, cur)}"
 
+    @app.template_global()
+    def url_with(**overrides):
+        """Текущий URL с заменой части параметров (фильтры сохраняются при листании)."""
+        args = request.args.to_dict(flat=False)
+        for key, value in overrides.items():
+            if value is None:
+                args.pop(key, None)
+            else:
+                args[key] = value
+        return url_for(request.endpoint, **(request.view_args or {}), **args)
+
     @app.route('/')
     def index():
-        insp = inspect(db.engine)
-        # защищаемся на момент пустой БД (до миграций)
-        cars_count = Car.query.count() if insp.has_table("cars") else 0
-        customers_count = Customer.query.count() if insp.has_table("customers") else 0
-        employees_count = Employee.query.count() if insp.has_table("employees") else 0
-        sales_count = Sale.query.count() if insp.has_table("sales") else 0
-
-        stats = {
-            'cars': cars_count,
-            'customers': customers_count,
-            'employees': employees_count,
-            'sales': sales_count,
-        }
+        # счётчики ведутся событиями ORM (counters.py) — один запрос вместо четырёх COUNT(*)
+        stats = entity_counts()
         return render_template(
             'index.html',
             stats=stats,
@@ -1,15 +1,83 @@
-from flask import render_template, redirect, url_for, flash
+from datetime import datetime
+
+from flask import render_template, redirect, url_for, flash, request, current_app, jsonify
+from sqlalchemy import and_, select
+from sqlalchemy.orm import aliased
+
 from . import bp
 from extensions import db
 from models import User, Car
 from decorators import admin_required
+from storage import release
+from pagination import keyset_paginate, page_size
+from inventory import STATUS_LABELS
+from querycount import query_budget
+from rollups import DIMENSIONS, month_start, report
+from services import inquiries_client
+
+ROLES = ('buyer', 'seller', 'admin')
+# новые сверху; индексы ix_users_created_at_id и ix_cars_*_created_at_id
+USER_KEYS = [('created_at', User.created_at), ('id', User.id)]
+CAR_KEYS = [('created_at', Car.created_at), ('id', Car.id)]
+
+
+def _page(query, keys):
+    cfg = current_app.config
+    per_page = page_size(request.args.get('per_page'), cfg['ADMIN_PER_PAGE'], cfg['ADMIN_PER_PAGE_MAX'])
+    return keyset_paginate(query, keys, cursor=request.args.get('cursor'), per_page=per_page)
+
+
+def _email_prefix(expr, prefix: str):
+    # диапазон по уникальному индексу users.email вместо LIKE
+    prefix = prefix.lower()
+    return and_(expr >= prefix, expr < prefix + '\uffff')
+
 
 @bp.route('/')
 @admin_required
 def panel():
-    users = User.query.order_by(User.created_at.desc()).all()
-    cars = Car.query.order_by(Car.created_at.desc()).all()
-    return render_template('admin/panel.html', users=users, cars=cars)
+    # разделы подгружаются отдельными запросами: admin.users_section и admin.cars_section
+    return render_template('admin/panel.html')
+
+@bp.route('/users')
+@admin_required
+@query_budget(3)
+def users_section():
+    """Страница пользователей (HTML-фрагмент): ?role=…&email=<начало>&cursor=…"""
+    role = request.args.get('role', '')
+    email = request.args.get('email', '').strip()
+    query = db.session.query(User.id, User.email, User.role, User.last_name, User.first_name,
+                             User.middle_name, User.created_at)
+    if role in ROLES:
+        query = query.filter(User.role == role)
+    if email:
+        query = query.filter(_email_prefix(User.email, email))
+    page = _page(query, USER_KEYS)
+    return render_template('admin/_users.html', page=page, role=role, email=email, roles=ROLES)
+
+@bp.route('/cars')
+@admin_required
+@query_budget(3)
+def cars_section():
+    """Страница машин (HTML-фрагмент): ?status=…&seller=<начало email>&cursor=…"""
+    status = request.args.get('status', '')
+    seller_email = request.args.get('seller', '').strip()
+    seller = aliased(User)
+    query = (
+        db.session.query(Car.id, Car.brand, Car.model, Car.vin, Car.price, Car.currency, Car.status,
+                         Car.created_at, seller.email.label('seller_email'),
+                         seller.last_name, seller.first_name, seller.middle_name)
+        .outerjoin(seller, seller.id == Car.seller_id)
+    )
+    if status in STATUS_LABELS:
+        query = query.filter(Car.status == status)
+    if seller_email:
+        # id продавцов по индексу email, дальше — ix_cars_seller_created_at_id
+        ids = select(User.id).where(_email_prefix(User.email, seller_email))
+        query = query.filter(Car.seller_id.in_(ids))
+    page = _page(query, CAR_KEYS)
+    return render_template('admin/_cars.html', page=page, status=status, seller=seller_email,
+                           statuses=STATUS_LABELS)
 
 @bp.route('/users/<int:user_id>/delete', methods=['POST'])
 @admin_required
@@ -27,7 +95,35 @@ def delete_user(user_id):
 @admin_required
 def delete_car(car_id):
     c = Car.query.get_or_404(car_id)
+    img = c.image_path
     db.session.delete(c)
     db.session.commit()
+    release(img)
     flash('Машина удалена.', 'info')
     return redirect(url_for('admin.panel'))
+
+
+def _month_arg(name):
+    """?from=2025-01 -> date(2025, 1, 1) или None."""
+    try:
+        return month_start(datetime.strptime(request.args.get(name, ''), '%Y-%m'))
+    except ValueError:
+        return None
+
+@bp.route('/reports')
+@admin_required
+@query_budget(5)
+def reports():
+    dimension = request.args.get('dimension', 'month')
+    if dimension not in DIMENSIONS:
+        dimension = 'month'
+    date_from, date_to = _month_arg('from'), _month_arg('to')
+    rows, total = report(dimension, date_from, date_to)
+    return render_template('admin/reports.html', rows=rows, total=total, dimension=dimension,
+                           dimensions=DIMENSIONS, date_from=date_from, date_to=date_to)
+
+@bp.route('/inquiries-client.json')
+@admin_required
+def inquiries_client_stats():
+    """Пул соединений, задержки и предохранитель клиента сервиса заявок (в этом процессе)."""
+    return jsonify(inquiries_client.stats())
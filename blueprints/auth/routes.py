@@ -5,6 +5,9 @@ from . import bp
 from extensions import db
 from models import User, Customer
 from forms import LoginForm, RegisterForm
+from passwords import PasswordHashUnavailable
+
+BUSY_MESSAGE = "Сервер перегружен, попробуйте ещё раз через минуту"
 
 
 def split_full_name(full_name: str):
@@ -22,7 +25,19 @@ def login():
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data.lower()).first()
-        if user and user.check_password(form.password.data):
+        try:
+            password_ok = bool(user) and user.check_password(form.password.data)
+        except PasswordHashUnavailable:
+            flash(BUSY_MESSAGE, "warning")
+            return render_template("auth/login.html", form=form), 503
+        if password_ok:
+            if user.password_needs_rehash:
+                # пароль известен только сейчас — пересчитываем хэш с текущими параметрами
+                try:
+                    user.set_password(form.password.data)
+                    db.session.commit()
+                except PasswordHashUnavailable:
+                    pass  # старый хэш остаётся рабочим, пересчитаем при следующем входе
             login_user(user)
             flash("Добро пожаловать!", "success")
             return redirect(request.args.get("next") or url_for("index"))
@@ -58,7 +73,11 @@ def register():
             first_name=first,
             middle_name=middle,
         )
-        user.set_password(form.password.data)
+        try:
+            user.set_password(form.password.data)
+        except PasswordHashUnavailable:
+            flash(BUSY_MESSAGE, "warning")
+            return render_template("auth/register.html", form=form), 503
         db.session.add(user)
         db.session.flush()
 
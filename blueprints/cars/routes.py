@@ -1,15 +1,28 @@
-import os
-import uuid
-from flask import render_template, request, redirect, url_for, flash, abort, current_app
+import io
+
+from flask import render_template, request, redirect, url_for, flash, abort, current_app, jsonify
 from flask_login import current_user
 from werkzeug.utils import secure_filename
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import with_expression
+from sqlalchemy.orm.exc import StaleDataError
 
 from . import bp
 from extensions import db
 from models import Car
-from forms import CarForm
+from forms import CarForm, CarImportForm
 from decorators import seller_required
+from images import schedule_variants
+from storage import save_upload, release
+from remote_images import schedule_refresh
+from pagination import keyset_paginate, page_size
+from search import search_cars
+from facets import CatalogFilters, FACET_COLUMNS, facet_counts
+from page_cache import cached_page
+from loading import with_profile
+from querycount import query_budget
+from car_import import ImportFormatError, import_cars
+from inventory import STATUS_LABELS, can_transition
 
 def _allowed_ext(filename: str) -> bool:
     if '.' not in filename:
@@ -26,35 +39,66 @@ def _save_image(file_storage):
         flash('Недопустимый формат изображения', 'warning')
         return None
     ext = filename.rsplit('.', 1)[-1].lower()
-    unique = f"{uuid.uuid4().hex}.{ext}"
-    dst_dir = current_app.config['UPLOAD_FOLDER']
-    os.makedirs(dst_dir, exist_ok=True)
-    file_storage.save(os.path.join(dst_dir, unique))
-    return unique
-
-def _remove_image(name: str):
-    if not name:
-        return
-    try:
-        os.remove(os.path.join(current_app.config['UPLOAD_FOLDER'], name))
-    except FileNotFoundError:
-        pass
+    return save_upload(file_storage, ext)
+
+# ключ сортировки каталога: новые сверху, id разрешает одинаковые created_at
+CATALOG_KEYS = [('created_at', Car.created_at), ('id', Car.id)]
+PRICE_KEYS = [('price_base', Car.price_base), ('id', Car.id)]
+
+# ?sort= -> (ключи, по убыванию)
+SORTS = {
+    'new': (CATALOG_KEYS, True),
+    'price_asc': (PRICE_KEYS, False),
+    'price_desc': (PRICE_KEYS, True),
+}
+
+def _paginate(query, keys=CATALOG_KEYS, descending=True):
+    cfg = current_app.config
+    per_page = page_size(request.args.get('per_page'), cfg['CARS_PER_PAGE'], cfg['CARS_PER_PAGE_MAX'])
+    return keyset_paginate(query, keys, cursor=request.args.get('cursor'), per_page=per_page,
+                           descending=descending)
 
 @bp.route('/')
+@cached_page(['catalog'])
+@query_budget(12)
 def list_():
-    q = request.args.get('q', '').strip()
-    query = Car.query
-    if q:
-        like = f"%{q}%"
-        query = query.filter((Car.brand.ilike(like)) | (Car.model.ilike(like)) | (Car.vin.ilike(like)))
-    cars = query.order_by(Car.created_at.desc()).all()
-    return render_template('cars/list.html', cars=cars, q=q)
+    dialect = db.engine.dialect.name
+    filters = CatalogFilters.from_args(request.args)
+    q = filters.q
+    query = filters.apply(with_profile(Car.query, 'cars.list'), dialect, with_search=False)
+    query, rank = search_cars(query, q, dialect)
+    sort = request.args.get('sort')
+    if sort in SORTS:
+        keys, descending = SORTS[sort]
+        if keys is PRICE_KEYS:
+            query = query.filter(Car.price_base.isnot(None))
+        page = _paginate(query, keys, descending)
+    elif rank is not None:
+        # при поиске — по релевантности, id разрешает равные ранги
+        query = query.options(with_expression(Car.search_rank, rank))
+        page = _paginate(query, [('search_rank', rank), ('id', Car.id)])
+    else:
+        page = _paginate(query)
+    return render_template('cars/list.html', cars=page.items, page=page, q=q, sort=sort,
+                           filters=filters, facets=facet_counts(filters, dialect))
+
+@bp.route('/facets')
+def facets():
+    """Счётчики фасетов каталога для текущих фильтров (JSON)."""
+    filters = CatalogFilters.from_args(request.args)
+    data = facet_counts(filters, db.engine.dialect.name)
+    price = data['price']
+    return jsonify({
+        **{name: [{'value': v, 'count': n} for v, n in data[name]] for name in FACET_COLUMNS},
+        'price': {k: (float(v) if v is not None else None) for k, v in price.items()},
+    })
 
 @bp.route('/my')
 @seller_required
+@query_budget(6)
 def my():
-    cars = Car.query.filter_by(seller_id=current_user.id).order_by(Car.created_at.desc()).all()
-    return render_template('cars/list.html', cars=cars, q="", my_list=True)
+    page = _paginate(with_profile(Car.query, 'cars.list').filter_by(seller_id=current_user.id))
+    return render_template('cars/list.html', cars=page.items, page=page, q="", my_list=True)
 
 @bp.route('/create', methods=['GET','POST'])
 @seller_required
@@ -80,10 +124,13 @@ def create():
 
         try:
             db.session.commit()
+            schedule_variants(img_name)
+            schedule_refresh(car.image_url)  # внешнее фото скачиваем сразу, а не при первом показе
             flash('Объявление успешно создано!', 'success')
             return redirect(url_for('cars.my'))
         except IntegrityError as e:
             db.session.rollback()
+            release(img_name)  # файл без ссылок — иначе останется сиротой
             # Проверка конкретной ошибки уникальности
             error_msg = str(e.orig)
             if 'cars_vin_key' in error_msg or 'duplicate key' in error_msg:
@@ -94,6 +141,29 @@ def create():
 
     return render_template('cars/form.html', form=form, title='Новое объявление')
 
+@bp.route('/import', methods=['GET','POST'])
+@seller_required
+def import_():
+    form = CarImportForm()
+    report = None
+    if form.validate_on_submit():
+        stream = io.TextIOWrapper(form.file.data.stream, encoding='utf-8-sig', newline='')
+        try:
+            report = import_cars(stream, seller_id=current_user.id, dry_run=form.dry_run.data)
+        except ImportFormatError as e:
+            db.session.rollback()
+            flash(str(e), 'danger')
+        except UnicodeDecodeError:
+            db.session.rollback()
+            flash('Файл должен быть в кодировке UTF-8', 'danger')
+        else:
+            if form.dry_run.data:
+                db.session.rollback()
+            else:
+                db.session.commit()
+                flash(f'Загружено машин: {report.inserted}', 'success')
+    return render_template('cars/import.html', form=form, report=report)
+
 @bp.route('/<int:car_id>/edit', methods=['GET','POST'])
 @seller_required
 def edit(car_id):
@@ -105,7 +175,20 @@ def edit(car_id):
     form = CarForm(car_id=car.id, obj=car)
 
     if form.validate_on_submit():
-        old_img = car.image_path
+        if form.version.data is not None and form.version.data != car.version:
+            # пока форма была открыта, машину сохранил кто-то другой (или продали)
+            form.set_version(car.version)
+            flash('Объявление уже изменили, пока открыта форма: сейчас статус — '
+                  f'«{STATUS_LABELS.get(car.status, car.status)}». Проверьте поля и сохраните ещё раз.', 'warning')
+            return render_template('cars/form.html', form=form, title='Редактировать объявление')
+        if form.status.data != car.status and not can_transition(car.status, form.status.data):
+            if car.status == 'sold':
+                form.status.errors.append('Машина продана: вернуть её в наличие можно, только удалив сделку')
+            else:
+                form.status.errors.append('Такой смены статуса не бывает')
+            return render_template('cars/form.html', form=form, title='Редактировать объявление')
+
+        old_img, old_url = car.image_path, car.image_url
         form.populate_obj(car)  # обновит стандартные поля
 
         # Нормализуем VIN
@@ -114,14 +197,30 @@ def edit(car_id):
         new_img = _save_image(form.image_file.data)
         if new_img:
             car.image_path = new_img
-            _remove_image(old_img)
 
         try:
             db.session.commit()
+            if new_img and new_img != old_img:
+                schedule_variants(new_img)
+                release(old_img)  # старое фото могло быть общим с другой машиной
+            if car.image_url and car.image_url != old_url:
+                schedule_refresh(car.image_url)
             flash('Изменения успешно сохранены!', 'success')
             return redirect(url_for('cars.my'))
+        except StaleDataError:
+            # машину изменили между чтением и UPDATE ... WHERE version = ...
+            db.session.rollback()
+            release(new_img)
+            current = db.session.get(Car, car_id)
+            if current is None:
+                flash('Объявление только что удалили.', 'warning')
+                return redirect(url_for('cars.my'))
+            form.set_version(current.version)
+            flash('Объявление только что изменил другой пользователь. Проверьте поля и сохраните ещё раз.', 'warning')
+            return render_template('cars/form.html', form=form, title='Редактировать объявление')
         except IntegrityError as e:
             db.session.rollback()
+            release(new_img)
             error_msg = str(e.orig)
             if 'cars_vin_key' in error_msg or 'duplicate key' in error_msg:
                 flash(f'Ошибка: Автомобиль с VIN {form.vin.data.upper().strip()} уже существует!', 'danger')
@@ -137,13 +236,16 @@ def delete(car_id):
     car = Car.query.get_or_404(car_id)
     if not (current_user.is_admin or car.seller_id == current_user.id):
         abort(403)
-    _remove_image(car.image_path)
+    img = car.image_path
     db.session.delete(car)
     db.session.commit()
+    release(img)
     flash('Объявление удалено', 'info')
     return redirect(url_for('cars.my'))
 
 @bp.route('/<int:car_id>')
+@cached_page(lambda car_id: [f'car:{car_id}'])
+@query_budget(4)
 def detail(car_id):
     car = Car.query.get_or_404(car_id)
     return render_template('cars/detail.html', car=car)
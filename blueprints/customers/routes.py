@@ -1,9 +1,8 @@
 from flask import render_template, request, redirect, url_for, flash
-from sqlalchemy import func
-
 from . import bp
 from extensions import db
 from models import Customer
+from search import person_match
 from forms import CustomerForm
 
 
@@ -24,10 +23,10 @@ def list_():
     q = request.args.get('q', '').strip()
     query = Customer.query
     if q:
-        like = f"%{q}%"
-        # поиск по склеенному ФИО + телефону
-        name_expr = func.concat_ws(' ', Customer.last_name, Customer.first_name, Customer.middle_name)
-        query = query.filter((name_expr.ilike(like)) | (Customer.phone.ilike(like)))
+        # подстрока ФИО или телефона в любом формате — по индексу (см. search.person_match)
+        cond = person_match(Customer, q, db.engine.dialect.name)
+        if cond is not None:
+            query = query.filter(cond)
     customers = query.order_by(Customer.created_at.desc()).all()
     return render_template('customers/list.html', customers=customers, q=q)
 
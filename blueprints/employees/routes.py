@@ -1,9 +1,8 @@
 from flask import render_template, request, redirect, url_for, flash
-from sqlalchemy import func
-
 from . import bp
 from extensions import db
 from models import Employee
+from search import person_match
 from forms import EmployeeForm
 from decorators import admin_required
 
@@ -22,9 +21,10 @@ def list_():
     q = request.args.get('q', '').strip()
     query = Employee.query
     if q:
-        like = f"%{q}%"
-        name_expr = func.concat_ws(' ', Employee.last_name, Employee.first_name, Employee.middle_name)
-        query = query.filter(name_expr.ilike(like))
+        # подстрока ФИО — по индексу (см. search.person_match)
+        cond = person_match(Employee, q, db.engine.dialect.name)
+        if cond is not None:
+            query = query.filter(cond)
     employees = query.order_by(Employee.created_at.desc()).all()
     return render_template('employees/list.html', employees=employees, q=q)
 
@@ -0,0 +1,5 @@
+from flask import Blueprint
+
+bp = Blueprint('exports', __name__)
+
+from . import routes  # noqa
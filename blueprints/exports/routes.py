@@ -0,0 +1,25 @@
+from flask import Response, abort, send_file, stream_with_context
+
+from . import bp
+from decorators import admin_required
+from exports import DATASETS, FORMATS, filename, iter_csv, xlsx_file
+
+
+@bp.route('/<dataset>.<fmt>')
+@admin_required
+def download(dataset, fmt):
+    if dataset not in DATASETS or fmt not in FORMATS:
+        abort(404)
+    name = filename(dataset, fmt)
+    if fmt == 'xlsx':
+        return send_file(
+            xlsx_file(dataset),
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            as_attachment=True,
+            download_name=name,
+        )
+    # строки пишутся в ответ по мере чтения из БД
+    resp = Response(stream_with_context(iter_csv(dataset)), mimetype='text/csv')
+    resp.headers['Content-Disposition'] = f'attachment; filename="{name}"'
+    resp.headers['X-Accel-Buffering'] = 'no'  # nginx не копит ответ целиком
+    return resp
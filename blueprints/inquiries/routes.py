@@ -1,9 +1,20 @@
-from flask import render_template, request, redirect, url_for, flash, abort
+from datetime import date
+
+from flask import current_app, render_template, request, redirect, url_for, flash, abort
 from flask_login import login_required, current_user
 
 from . import bp
-from services.inquiries_client import create_inquiry, list_by_buyer, list_by_seller, update_status
-from models import Car, User
+from extensions import db
+from outbox import FAILED, PENDING, enqueue
+from services.inquiries_client import (
+    InquiriesUnavailable, list_by_buyer, list_by_seller, update_status, update_status_many,
+)
+from models import Car, InquiryOutbox, User
+from pagination import KeysetPage, page_size
+
+STATUS_LABELS = {"new": "Новая", "accepted": "Принята", "declined": "Отклонена", "closed": "Закрыта"}
+# заявок за одно массовое изменение статуса (предел Go-сервиса — 500)
+BULK_MAX = 500
 
 
 def _require(role: str):
@@ -19,6 +30,36 @@ def _require(role: str):
         abort(403)
 
 
+def _filters() -> dict:
+    """Фильтры и листание из ?status=&from=&to=&cursor=&per_page= (некорректное отбрасывается)."""
+    def day(value):
+        try:
+            return date.fromisoformat(value).isoformat()
+        except (TypeError, ValueError):
+            return None
+
+    status = request.args.get("status")
+    cfg = current_app.config
+    return {
+        "cursor": request.args.get("cursor") or None,
+        "limit": page_size(request.args.get("per_page"), cfg["INQUIRIES_PER_PAGE"], cfg["INQUIRIES_PER_PAGE_MAX"]),
+        "status": status if status in STATUS_LABELS else None,
+        "date_from": day(request.args.get("from")),
+        "date_to": day(request.args.get("to")),
+    }
+
+
+def _load(fn, user_id, filters: dict) -> KeysetPage:
+    """Страница заявок или пустая страница с предупреждением, если сервис недоступен."""
+    try:
+        return fn(user_id, **filters)
+    except InquiriesUnavailable as e:
+        flash(f"{e}. Попробуйте обновить страницу позже.", "warning")
+    except RuntimeError as e:
+        flash(f"Не удалось загрузить заявки: {e}", "danger")
+    return KeysetPage([])
+
+
 @bp.route("/my")
 @login_required
 def my():
@@ -26,13 +67,27 @@ def my():
     Покупатель — свои исходящие заявки.
     Продавец/админ — входящие заявки к ним.
     """
+    filters = _filters()
     if getattr(current_user, "is_buyer", False):
-        items = list_by_buyer(current_user.id)
-        return render_template("inquiries/my.html", items=items, role="buyer")
+        page = _load(list_by_buyer, current_user.id, filters)
+        # ещё не доставленные в сервис (outbox.py) и отвергнутые им
+        queued = [] if filters["cursor"] else (
+            InquiryOutbox.query
+            .filter(InquiryOutbox.buyer_id == current_user.id, InquiryOutbox.status.in_((PENDING, FAILED)))
+            .order_by(InquiryOutbox.id.desc())
+            .all()
+        )
+        cars = {}
+        if queued:
+            ids = {q.car_id for q in queued}
+            cars = {c.id: c for c in Car.query.filter(Car.id.in_(ids))}
+        return render_template("inquiries/my.html", page=page, filters=filters, statuses=STATUS_LABELS,
+                               role="buyer", queued=queued, cars=cars)
 
     if getattr(current_user, "is_seller", False) or getattr(current_user, "is_admin", False):
-        items = list_by_seller(current_user.id)
-        return render_template("inquiries/my.html", items=items, role="seller")
+        page = _load(list_by_seller, current_user.id, filters)
+        return render_template("inquiries/my.html", page=page, filters=filters, statuses=STATUS_LABELS,
+                               role="seller")
 
     abort(403)
 
@@ -42,8 +97,9 @@ def my():
 def incoming():
     """Страница входящих заявок для продавца/админа."""
     _require("seller")  # админ тоже пройдёт, если у него is_seller=True
-    items = list_by_seller(current_user.id)
-    return render_template("inquiries/incoming.html", items=items)
+    filters = _filters()
+    page = _load(list_by_seller, current_user.id, filters)
+    return render_template("inquiries/incoming.html", page=page, filters=filters, statuses=STATUS_LABELS)
 
 
 @bp.route("/new/<int:car_id>")
@@ -77,11 +133,16 @@ def create(car_id: int):
         admin = User.query.filter_by(role="admin").first()
         seller_id = admin.id if admin else current_user.id
 
+    message = (request.form.get("message") or "").strip()
+    if not message:
+        flash("Напишите сообщение продавцу", "danger")
+        return redirect(url_for("inq.new", car_id=car.id))
+
     payload = {
         "car_id": car.id,
         "buyer_id": current_user.id,
         "seller_id": seller_id,
-        "message": request.form.get("message") or "",
+        "message": message,
         "contact_phone": request.form.get("contact_phone") or "",
     }
 
@@ -90,11 +151,10 @@ def create(car_id: int):
         # Go-сервис ожидает строку "YYYY-MM-DDTHH:MM"
         payload["preferred_time"] = pref
 
-    try:
-        create_inquiry(payload)
-        flash("Заявка отправлена продавцу", "success")
-    except Exception as e:
-        flash(f"Не удалось отправить заявку: {e}", "danger")
+    # в сервис заявок её доставит `flask outbox dispatch`; покупатель не ждёт ответа сервиса
+    enqueue(payload)
+    db.session.commit()
+    flash("Заявка принята и будет передана продавцу", "success")
 
     return redirect(url_for("cars.detail", car_id=car.id))
 
@@ -114,3 +174,28 @@ def set_status(inq_id: int):
         flash(f"Ошибка обновления: {e}", "danger")
 
     return redirect(request.referrer or url_for("inq.incoming"))
+
+
+@bp.route("/status", methods=["POST"])
+@login_required
+def bulk_status():
+    """Один статус для отмеченных заявок продавца/админа."""
+    if not (getattr(current_user, "is_seller", False) or getattr(current_user, "is_admin", False)):
+        abort(403)
+
+    status = request.form.get("status")
+    ids = sorted({int(v) for v in request.form.getlist("ids") if v.isdigit()})
+    if status not in STATUS_LABELS or not ids:
+        flash("Отметьте заявки и выберите статус", "warning")
+    elif len(ids) > BULK_MAX:
+        flash(f"За раз можно изменить не больше {BULK_MAX} заявок", "warning")
+    else:
+        try:
+            updated = update_status_many(current_user.id, ids, status)
+            flash(f"Статус «{STATUS_LABELS[status]}»: обновлено заявок — {len(updated)}", "success")
+            if len(updated) < len(ids):
+                flash(f"Не обновлено {len(ids) - len(updated)}: заявки удалены или адресованы не вам", "warning")
+        except Exception as e:
+            flash(f"Ошибка обновления: {e}", "danger")
+
+    return redirect(request.referrer or url_for("inq.incoming"))
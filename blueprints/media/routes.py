@@ -0,0 +1,72 @@
+"""
+Отдача загруженных фото.
+
+UPLOADS_SERVE_MODE:
+  direct     — файл отдаёт Flask (ETag, 304, Range, Cache-Control);
+  x-accel    — отдаёт nginx по X-Accel-Redirect, воркер освобождается сразу:
+                   location /_protected_uploads/ {
+                       internal;
+                       alias /app/static/uploads/;
+                   }
+  x-sendfile — то же для Apache/lighttpd (mod_xsendfile).
+"""
+import mimetypes
+import os
+
+from flask import Response, abort, current_app, send_file
+from werkzeug.security import safe_join
+
+from . import bp
+from storage import content_digest
+
+# имена из sha256 и их варианты никогда не меняют содержимое
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# старые uuid-имена могут быть перезаписаны, кэшируем умеренно
+MUTABLE_MAX_AGE = 3600
+
+
+def _is_immutable(name: str) -> bool:
+    stem, _, ext = name.rpartition('.')
+    if content_digest(name):
+        return True
+    # вариант: ab/cd/<sha256>_thumb_240.webp
+    base = stem.rsplit('_', 2)[0]
+    return content_digest(f"{base}.{ext}") is not None
+
+
+def _max_age(immutable: bool) -> int:
+    return IMMUTABLE_MAX_AGE if immutable else MUTABLE_MAX_AGE
+
+
+def _cache_headers(resp, immutable: bool):
+    # send_file без max_age ставит no-cache — с ним браузер перепроверял бы каждое фото
+    resp.cache_control.no_cache = None
+    resp.cache_control.public = True
+    resp.cache_control.max_age = _max_age(immutable)
+    if immutable:
+        resp.cache_control.immutable = True
+    return resp
+
+
+@bp.route('/media/<path:name>')
+def upload(name):
+    cfg = current_app.config
+    path = safe_join(cfg['UPLOAD_FOLDER'], name)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    immutable = _is_immutable(name)
+    mode = cfg['UPLOADS_SERVE_MODE']
+
+    if mode in ('x-accel', 'x-sendfile'):
+        resp = Response(mimetype=mimetypes.guess_type(name)[0] or 'application/octet-stream')
+        if mode == 'x-accel':
+            resp.headers['X-Accel-Redirect'] = cfg['UPLOADS_ACCEL_PREFIX'].rstrip('/') + '/' + name
+        else:
+            resp.headers['X-Sendfile'] = path
+        return _cache_headers(resp, immutable)
+
+    # сильный ETag: для оригинала — сам sha256, иначе werkzeug (mtime+размер+имя)
+    digest = content_digest(name)
+    resp = send_file(path, conditional=True, etag=digest or True, max_age=_max_age(immutable))
+    return _cache_headers(resp, immutable)
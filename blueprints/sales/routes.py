@@ -1,30 +1,35 @@
-from flask import render_template, request, redirect, url_for, flash
+from flask import render_template, request, redirect, url_for, flash, current_app, jsonify
+from sqlalchemy import and_, or_
 from . import bp
 from extensions import db
 from models import Sale, Car, Customer, Employee
 from forms import SaleForm
 from flask_login import login_required, current_user
+from pagination import keyset_paginate, page_size
+from search import match_clause, normalize, phone_match, phone_query
+from loading import with_profile
+from querycount import query_budget
+from inventory import SALE_DELETED, StatusConflict, change_status
 
 @bp.route('/')
+@query_budget(5)
 def list_():
-    sales = (
-        Sale.query
-        .join(Sale.car)
-        .join(Sale.customer)
-        .join(Sale.employee)
-        .order_by(Sale.sale_date.desc())
-        .all()
-    )
+    query = Sale.query.join(Sale.car).join(Sale.customer).join(Sale.employee)
+    sales = with_profile(query, 'sales.list').order_by(Sale.sale_date.desc()).all()
     return render_template('sales/list.html', sales=sales)
 
 @bp.route('/create', methods=['GET','POST'])
 def create():
     form = SaleForm()
-    form.car_id.choices = [(c.id, f"{c.brand} {c.model} ({c.vin})") for c in Car.query.filter(Car.status!='sold').all()]
-    form.customer_id.choices = [(c.id, c.full_name) for c in Customer.query.all()]
-    form.employee_id.choices = [(e.id, f"{e.full_name} — {e.role}") for e in Employee.query.all()]
 
     if form.validate_on_submit():
+        try:
+            # до вставки сделки: параллельная продажа той же машины проиграет здесь
+            change_status(form.car_id.data, 'sold')
+        except StatusConflict as e:
+            db.session.rollback()
+            form.car_id.errors.append(str(e))
+            return render_template('sales/form.html', form=form, title='Новая сделка')
         sale = Sale(
             car_id=form.car_id.data,
             customer_id=form.customer_id.data,
@@ -34,20 +39,87 @@ def create():
             payment_method=form.payment_method.data,
         )
         db.session.add(sale)
-        car = Car.query.get(form.car_id.data)
-        if car:
-            car.status = 'sold'
         db.session.commit()
         flash('Продажа зарегистрирована', 'success')
         return redirect(url_for('sales.list_'))
 
     return render_template('sales/form.html', form=form, title='Новая сделка')
 
+
+# ---- подсказки для формы сделки: ?q=…&cursor=… -> {"items": [{id, label}], "next": курсор} ----
+
+def _lookup(query, keys, label, descending=False):
+    cfg = current_app.config
+    per_page = page_size(request.args.get('per_page'), cfg['LOOKUP_PER_PAGE'], cfg['LOOKUP_PER_PAGE_MAX'])
+    page = keyset_paginate(query, keys, cursor=request.args.get('cursor'), per_page=per_page,
+                           descending=descending)
+    return jsonify({
+        'items': [{'id': row.id, 'label': label(row)} for row in page.items],
+        'next': page.next_cursor,
+    })
+
+
+def _prefix(expr, prefix: str):
+    # диапазон вместо LIKE 'x%': его обслуживает обычный B-tree индекс в обеих БД
+    return and_(expr >= prefix, expr < prefix + '\uffff')
+
+
+def _person_label(row):
+    return " ".join(p for p in (row.last_name, row.first_name, row.middle_name) if p)
+
+
+@bp.route('/lookup/cars')
+def lookup_cars():
+    """Непроданные машины по марке/модели/VIN (поисковый индекс каталога), новые сверху."""
+    q = request.args.get('q', '').strip()
+    query = db.session.query(Car.id, Car.brand, Car.model, Car.year, Car.vin).filter(Car.status != 'sold')
+    if q:
+        clause = match_clause(q, db.engine.dialect.name)
+        if clause is None:
+            return jsonify({'items': [], 'next': None})
+        query = query.filter(clause)
+    return _lookup(query, [('id', Car.id)], lambda r: f"{r.brand} {r.model} {r.year} ({r.vin})",
+                   descending=True)
+
+
+@bp.route('/lookup/customers')
+def lookup_customers():
+    """Клиенты по началу ФИО или части телефона (в любом формате, можно без кода страны), по алфавиту."""
+    q = request.args.get('q', '').strip()
+    query = db.session.query(Customer.id, Customer.last_name, Customer.first_name, Customer.middle_name,
+                             Customer.phone, Customer.search_name)
+    if q:
+        conds = [_prefix(Customer.search_name, normalize(q))]
+        digits = phone_query(q)
+        if digits:
+            # подстрока номера — по trigram-индексу (см. search.person_match)
+            conds.append(phone_match(Customer, digits, db.engine.dialect.name))
+        query = query.filter(or_(*conds))
+    return _lookup(query, [('search_name', Customer.search_name), ('id', Customer.id)],
+                   lambda r: _person_label(r) + (f", {r.phone}" if r.phone else ''))
+
+
+@bp.route('/lookup/employees')
+def lookup_employees():
+    """Сотрудники по началу ФИО, по алфавиту."""
+    q = request.args.get('q', '').strip()
+    query = db.session.query(Employee.id, Employee.last_name, Employee.first_name, Employee.middle_name,
+                             Employee.role, Employee.search_name)
+    if q:
+        query = query.filter(_prefix(Employee.search_name, normalize(q)))
+    return _lookup(query, [('search_name', Employee.search_name), ('id', Employee.id)],
+                   lambda r: f"{_person_label(r)} — {r.role}")
+
 @bp.route('/<int:sale_id>/delete', methods=['POST'])
 def delete(sale_id):
     sale = Sale.query.get_or_404(sale_id)
-    if sale.car:
-        sale.car.status = 'in_stock'
+    if sale.car and sale.car.status == 'sold':
+        try:
+            change_status(sale.car_id, 'in_stock', SALE_DELETED)
+        except StatusConflict as e:
+            db.session.rollback()
+            flash(f'Продажа не удалена: {e}', 'warning')
+            return redirect(url_for('sales.list_'))
     db.session.delete(sale)
     db.session.commit()
     flash('Продажа удалена', 'info')
@@ -61,5 +133,6 @@ def my():  # <-- endpoint будет 'sales.my'
     if not customer:
         flash("Для аккаунта не найден профиль клиента.", "warning")
         return redirect(url_for("index"))
-    sales = Sale.query.filter_by(customer_id=customer.id).order_by(Sale.sale_date.desc()).all()
+    query = Sale.query.join(Sale.car).join(Sale.customer).join(Sale.employee).filter(Sale.customer_id == customer.id)
+    sales = with_profile(query, 'sales.list').order_by(Sale.sale_date.desc()).all()
     return render_template("sales/list.html", sales=sales, my_list=True)
@@ -0,0 +1,157 @@
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+
+class LocalCache:
+    """Потокобезопасный LRU-кэш с TTL в памяти процесса (у каждого gunicorn-воркера свой)."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float = None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+# ---- версии тегов ----
+#
+# Закэшированное значение помечается тегами («catalog», «car:42»). Версия
+# каждого тега лежит в таблице cache_tags и увеличивается сразу после
+# коммита записи, отдельной короткой транзакцией: строку «catalog» меняет
+# каждая запись машины, и держать её блокировку до конца каждой транзакции
+# значило бы выстроить все записи каталога в очередь. Значение, посчитанное
+# до увеличения версии, помечено старой версией и после него не отдаётся.
+# Инвалидация видна всем воркерам, проверка свежести — один запрос по
+# первичному ключу.
+
+def tag_versions(tags) -> dict:
+    """Текущие версии тегов одним запросом; отсутствующий тег = 0."""
+    from extensions import db
+    from models import CacheTag
+
+    tags = sorted(set(tags))
+    versions = dict.fromkeys(tags, 0)
+    if tags:
+        rows = db.session.execute(select(CacheTag.tag, CacheTag.version).where(CacheTag.tag.in_(tags)))
+        versions.update(dict(rows.all()))
+    return versions
+
+
+_PENDING = 'cache_tags_pending'
+
+
+def bump_tags(session, tags):
+    """Увеличить версии тегов после коммита текущей транзакции session."""
+    session.info.setdefault(_PENDING, set()).update(tags)
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_after_commit(session):
+    tags = session.info.pop(_PENDING, None)
+    if tags:
+        with session.get_bind().begin() as connection:
+            _bump_now(connection, tags)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_pending(session):
+    # лишнее увеличение версии безвредно, поэтому забываем теги, только
+    # когда откатилась вся транзакция, а не точка сохранения
+    if not session.in_transaction():
+        session.info.pop(_PENDING, None)
+
+
+def _bump_now(connection, tags):
+    """Увеличить версии тегов (upsert) на переданном соединении."""
+    from models import CacheTag
+
+    tags = sorted(set(tags))
+    if not tags:
+        return
+    t = CacheTag.__table__
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        for tag in tags:
+            res = connection.execute(t.update().where(t.c.tag == tag).values(version=t.c.version + 1))
+            if not res.rowcount:
+                connection.execute(t.insert().values(tag=tag, version=1))
+        return
+    stmt = insert(t).values([{'tag': tag, 'version': 1} for tag in tags])
+    stmt = stmt.on_conflict_do_update(index_elements=[t.c.tag], set_={'version': t.c.version + 1})
+    connection.execute(stmt)
+
+
+def cached(cache: LocalCache, key, tags, compute):
+    """Вернуть значение из кэша, если версии его тегов не менялись, иначе пересчитать."""
+    versions = tag_versions(tags)
+    hit = cache.get(key)
+    if hit is not None and hit[1] == versions:
+        return hit[0]
+    value = compute()
+    cache.set(key, (value, versions))
+    return value
+
+
+# ---- автоматическая инвалидация при записи моделей ----
+
+_tag_sources = {}
+
+
+def track_tags(model, tags_for):
+    """Поднимать версии tags_for(obj) при каждой вставке/изменении/удалении model."""
+    _tag_sources[model] = tags_for
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_on_flush(session, flush_context):
+    if not _tag_sources:
+        return
+    tags = set()
+    for obj in list(session.new) + list(session.deleted):
+        fn = _tag_sources.get(type(obj))
+        if fn:
+            tags.update(fn(obj))
+    for obj in session.dirty:
+        fn = _tag_sources.get(type(obj))
+        if fn and session.is_modified(obj, include_collections=False):
+            tags.update(fn(obj))
+    if tags:
+        bump_tags(session, tags)
@@ -0,0 +1,255 @@
+import csv
+import io
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from cache import bump_tags
+from counters import adjust
+from extensions import db
+from forms import CarForm
+from models import Car, ExchangeRate, User
+from search import build_search_text
+from vin import normalize_vin, vin_error
+
+cars_cli = AppGroup('cars', help='Машины: массовая загрузка.')
+
+# Поставщики присылают склад таблицами на тысячи машин. Файл читается
+# построчно, строки проверяются теми же правилами, что и CarForm, а
+# пишутся пачками: дубликаты VIN — один запрос на пачку, вставка —
+# executemany (в Postgres — COPY). ORM и его события не участвуют, поэтому
+# search_text, price_base, отметки времени, счётчик машин и теги кэша
+# выставляются здесь.
+
+_BATCH = 1000
+
+# заголовок столбца (как в выгрузке exports.py или имя поля) -> поле Car
+HEADERS = {
+    'vin': 'vin',
+    'марка': 'brand', 'brand': 'brand',
+    'модель': 'model', 'model': 'model',
+    'год': 'year', 'year': 'year',
+    'цвет': 'color', 'color': 'color',
+    'цена': 'price', 'price': 'price',
+    'валюта': 'currency', 'currency': 'currency',
+    'статус': 'status', 'status': 'status',
+    'описание': 'description', 'description': 'description',
+    'фото': 'image_url', 'image_url': 'image_url',
+}
+REQUIRED = ('vin', 'brand', 'model', 'year', 'price')
+
+CURRENCIES = [value for value, _ in CarForm.currency.kwargs['choices']]
+STATUSES = [value for value, _ in CarForm.status.kwargs['choices']]
+
+
+class ImportFormatError(ValueError):
+    """Файл нельзя разобрать целиком (нет обязательных столбцов и т.п.)."""
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0  # при dry_run — сколько было бы вставлено
+        self.errors = []  # (номер строки файла, VIN, текст ошибки)
+
+    def add_error(self, line, vin, message):
+        self.errors.append((line, vin, message))
+
+
+def _reader(stream):
+    """csv.reader с разделителем, угаданным по строке заголовка (; , или табуляция)."""
+    header = stream.readline()
+    if not header.strip():
+        raise ImportFormatError('Пустой файл')
+    delimiter = max(';,\t', key=header.count)
+    return csv.reader(io.StringIO(header), delimiter=delimiter), csv.reader(stream, delimiter=delimiter)
+
+
+def _columns(header):
+    columns = [HEADERS.get(h.strip().lower()) for h in header]
+    missing = [name for name in REQUIRED if name not in columns]
+    if missing:
+        raise ImportFormatError(f"Нет обязательных столбцов: {', '.join(missing)}")
+    return columns
+
+
+def _max_length(name):
+    return getattr(Car.__table__.c[name].type, 'length', None)
+
+
+def _parse(values: dict):
+    """Значения строки -> (поля Car, None) или (None, текст ошибки)."""
+    vin = normalize_vin(values.get('vin'))
+    error = vin_error(vin)
+    if error:
+        return None, error
+    row = {'vin': vin}
+    for name in ('brand', 'model', 'color', 'description', 'image_url'):
+        value = (values.get(name) or '').strip() or None
+        if name in REQUIRED and value is None:
+            return None, f'Не заполнено поле {name}'
+        limit = _max_length(name)
+        if value and limit and len(value) > limit:
+            return None, f'Поле {name} длиннее {limit} символов'
+        row[name] = value
+    try:
+        row['year'] = int((values.get('year') or '').strip())
+    except ValueError:
+        return None, 'Год должен быть целым числом'
+    if not 1900 <= row['year'] <= 2100:
+        return None, 'Год вне диапазона 1900–2100'
+    try:
+        # «1 250 000,50» из русского Excel тоже подходит
+        row['price'] = Decimal((values.get('price') or '').replace(' ', '').replace('\xa0', '').replace(',', '.'))
+    except InvalidOperation:
+        return None, 'Цена должна быть числом'
+    if not row['price'].is_finite() or row['price'] <= 0:
+        return None, 'Цена должна быть больше нуля'
+    row['currency'] = (values.get('currency') or '').strip().upper() or 'RUB'
+    if row['currency'] not in CURRENCIES:
+        return None, f"Валюта должна быть одной из: {', '.join(CURRENCIES)}"
+    row['status'] = (values.get('status') or '').strip() or 'in_stock'
+    if row['status'] not in STATUSES:
+        return None, f"Статус должен быть одним из: {', '.join(STATUSES)}"
+    return row, None
+
+
+def _existing_vins(vins):
+    return set(db.session.execute(select(Car.vin).where(Car.vin.in_(vins))).scalars())
+
+
+def _copy(connection, rows):
+    """COPY ... FROM STDIN: самый быстрый способ загрузить пачку в Postgres."""
+    columns = list(rows[0])
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        # пустое поле без кавычек COPY читает как NULL
+        writer.writerow(['' if row[c] is None else row[c] for c in columns])
+    buf.seek(0)
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {Car.__tablename__} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+    finally:
+        cursor.close()
+
+
+def _insert(rows):
+    connection = db.session.connection()
+    if connection.dialect.name == 'postgresql':
+        _copy(connection, rows)
+    else:
+        connection.execute(Car.__table__.insert(), rows)
+    adjust(connection, {'cars': len(rows)})
+    bump_tags(db.session, ['catalog'])
+
+
+def _flush_batch(batch, report, dry_run):
+    """batch — [(строка файла, поля)]; дубликаты VIN из базы — в ошибки, остальное — вставить."""
+    for attempt in range(2):
+        existing = _existing_vins([row['vin'] for _, row in batch])
+        for line, row in batch:
+            if row['vin'] in existing:
+                report.add_error(line, row['vin'], f"Автомобиль с VIN {row['vin']} уже существует в базе")
+        batch = [(line, row) for line, row in batch if row['vin'] not in existing]
+        if not batch or dry_run:
+            break
+        connection = db.session.connection()
+        try:
+            with db.session.begin_nested():
+                _insert([row for _, row in batch])
+        except (IntegrityError, connection.dialect.dbapi.IntegrityError):
+            # тот же VIN успела вставить параллельная загрузка — перепроверяем пачку
+            if attempt:
+                for line, row in batch:
+                    report.add_error(line, row['vin'], 'Пачка не вставлена из-за конфликта VIN, повторите загрузку')
+                return
+            continue
+        break
+    report.inserted += len(batch)
+
+
+def import_cars(stream, seller_id=None, dry_run=False) -> ImportReport:
+    """
+    Загрузить машины из текстового потока CSV. Коммит — за вызывающим;
+    при dry_run строки только проверяются.
+    """
+    header, reader = _reader(stream)
+    columns = _columns(next(header))
+    rates = dict(db.session.execute(select(ExchangeRate.currency, ExchangeRate.rate)).all())
+    now = datetime.utcnow()
+    report = ImportReport()
+    seen = set()
+    batch = []
+    for values in reader:
+        line = reader.line_num + 1  # +1 за строку заголовка; кавычки могут занимать несколько строк
+        if not any(v.strip() for v in values):
+            continue
+        report.rows += 1
+        values = {name: v for name, v in zip(columns, values) if name}
+        row, error = _parse(values)
+        if error:
+            report.add_error(line, values.get('vin', ''), error)
+            continue
+        if row['vin'] in seen:
+            report.add_error(line, row['vin'], 'VIN повторяется в файле')
+            continue
+        seen.add(row['vin'])
+        rate = rates.get(row['currency'])
+        row.update(
+            price_base=(row['price'] * rate).quantize(Decimal('0.01')) if rate is not None else None,
+            search_text=build_search_text(row['brand'], row['model'], row['vin']),
+            seller_id=seller_id,
+            created_at=now,
+            updated_at=now,
+        )
+        batch.append((line, row))
+        if len(batch) >= _BATCH:
+            _flush_batch(batch, report, dry_run)
+            batch = []
+    if batch:
+        _flush_batch(batch, report, dry_run)
+    report.errors.sort()
+    return report
+
+
+def write_errors(report: ImportReport, out):
+    """Отчёт об ошибках в CSV: строка файла; VIN; ошибка."""
+    writer = csv.writer(out, delimiter=';')
+    writer.writerow(['Строка', 'VIN', 'Ошибка'])
+    writer.writerows(report.errors)
+
+
+@cars_cli.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--seller', 'seller_email', help='Email продавца, к которому привязать машины.')
+@click.option('--dry-run', is_flag=True, help='Только проверить файл.')
+@click.option('--errors', 'errors_path', type=click.Path(dir_okay=False), help='Куда записать ошибки (по умолчанию stderr).')
+def import_command(path, seller_email, dry_run, errors_path):
+    """Загрузить машины из CSV поставщика."""
+    seller_id = None
+    if seller_email:
+        seller_id = db.session.execute(select(User.id).where(User.email == seller_email)).scalar()
+        if seller_id is None:
+            raise click.ClickException(f"Пользователь {seller_email} не найден")
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        try:
+            report = import_cars(f, seller_id=seller_id, dry_run=dry_run)
+        except ImportFormatError as e:
+            raise click.ClickException(str(e))
+    if dry_run:
+        db.session.rollback()
+    else:
+        db.session.commit()
+    if report.errors:
+        if errors_path:
+            with open(errors_path, 'w', encoding='utf-8-sig', newline='') as out:
+                write_errors(report, out)
+        else:
+            write_errors(report, click.get_text_stream('stderr'))
+    done = 'прошли проверку' if dry_run else 'загружено'
+    click.echo(f"Строк: {report.rows}, {done}: {report.inserted}, ошибок: {len(report.errors)}")
@@ -13,6 +13,83 @@ class Config:
     UPLOAD_FOLDER = os.path.join(BASE_DIR, 'static', 'uploads')
     MAX_CONTENT_LENGTH = 5 * 1024 * 1024  # 5 МБ
     ALLOWED_IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+    # direct | x-accel | x-sendfile — кто передаёт файлы фото (см. blueprints/media)
+    UPLOADS_SERVE_MODE = os.getenv("UPLOADS_SERVE_MODE", "direct")
+    UPLOADS_ACCEL_PREFIX = os.getenv("UPLOADS_ACCEL_PREFIX", "/_protected_uploads/")
+    # файлы моложе стольких минут не удаляются: их мог только что сохранить
+    # запрос, который ещё не закоммитил ссылку (см. storage.release и `flask uploads gc`)
+    UPLOADS_GRACE_MINUTES = int(os.getenv("UPLOADS_GRACE_MINUTES", 60))
+    # потоков на воркер для нарезки превью (см. images.py)
+    IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", 2))
+    # локальные копии внешних фото по Car.image_url (см. remote_images.py)
+    REMOTE_IMAGES_MAX_BYTES = int(os.getenv("REMOTE_IMAGES_MAX_BYTES", 5 * 1024 * 1024))
+    REMOTE_IMAGES_TIMEOUT = float(os.getenv("REMOTE_IMAGES_TIMEOUT", 10))  # секунд на всё скачивание
+    REMOTE_IMAGES_TTL = int(os.getenv("REMOTE_IMAGES_TTL", 24 * 3600))  # как часто перепроверять источник
+    # разрешить адреса localhost/внутренней сети (только для разработки и тестов)
+    REMOTE_IMAGES_ALLOW_PRIVATE = os.getenv("REMOTE_IMAGES_ALLOW_PRIVATE", "0") == "1"
+
+    # кэш готовых страниц каталога и карточек для анонимных посетителей (см. page_cache.py)
+    PAGE_CACHE_ENABLED = os.getenv("PAGE_CACHE_ENABLED", "1") == "1"
+    PAGE_CACHE_TTL = int(os.getenv("PAGE_CACHE_TTL", 600))
+    PAGE_CACHE_MAXSIZE = int(os.getenv("PAGE_CACHE_MAXSIZE", 2000))
+
+    # хэши паролей (см. passwords.py): метод werkzeug с параметрами и размер
+    # пула процессов на воркер (0 — считать в самом воркере)
+    PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+    PASSWORD_HASH_TIMEOUT = float(os.getenv("PASSWORD_HASH_TIMEOUT", 10))
+
+    # кэш current_user в воркере (см. identity.py); изменения из других
+    # воркеров замечаются не позже чем через IDENTITY_CHECK_INTERVAL секунд
+    IDENTITY_CACHE_SIZE = int(os.getenv("IDENTITY_CACHE_SIZE", 10000))
+    IDENTITY_CACHE_TTL = int(os.getenv("IDENTITY_CACHE_TTL", 300))
+    IDENTITY_CHECK_INTERVAL = float(os.getenv("IDENTITY_CHECK_INTERVAL", 1))
+
+    # счётчик SQL на запрос (см. querycount.py); None — только в debug/testing
+    SQL_QUERY_COUNTER = {"1": True, "0": False}.get(os.getenv("SQL_QUERY_COUNTER", ""))
+    SQL_REPEAT_THRESHOLD = int(os.getenv("SQL_REPEAT_THRESHOLD", 5))  # сколько одинаковых запросов — уже N+1
+    SQL_QUERY_BUDGET_RAISE = None  # падать при превышении @query_budget; None — только в testing
+    # связи вне профиля загрузки (loading.py) вызывают ошибку вместо ленивого запроса
+    SQL_STRICT_LOADING = os.getenv("SQL_STRICT_LOADING", "0") == "1"
+
+    # размер страницы каталога (?per_page= ограничен сверху)
+    CARS_PER_PAGE = int(os.getenv("CARS_PER_PAGE", 20))
+    CARS_PER_PAGE_MAX = int(os.getenv("CARS_PER_PAGE_MAX", 100))
+
+    # страницы разделов админ-панели
+    ADMIN_PER_PAGE = int(os.getenv("ADMIN_PER_PAGE", 50))
+    ADMIN_PER_PAGE_MAX = int(os.getenv("ADMIN_PER_PAGE_MAX", 200))
+
+    # страницы списков заявок (сервис заявок отдаёт не больше 100 за раз)
+    INQUIRIES_PER_PAGE = int(os.getenv("INQUIRIES_PER_PAGE", 20))
+    INQUIRIES_PER_PAGE_MAX = int(os.getenv("INQUIRIES_PER_PAGE_MAX", 100))
+
+    # подсказки в форме сделки (sales.lookup_*)
+    LOOKUP_PER_PAGE = int(os.getenv("LOOKUP_PER_PAGE", 10))
+    LOOKUP_PER_PAGE_MAX = int(os.getenv("LOOKUP_PER_PAGE_MAX", 50))
+
+    # разделитель CSV-выгрузок: «;» открывается в Excel с русской локалью
+    EXPORT_CSV_DELIMITER = os.getenv("EXPORT_CSV_DELIMITER", ";")
+
+    # счётчики главной страницы (см. counters.py): на сколько строк разбит
+    # каждый счётчик, чтобы параллельные вставки не ждали одну строку
+    ENTITY_COUNTER_SHARDS = int(os.getenv("ENTITY_COUNTER_SHARDS", 8))
+
+    # базовая валюта для сравнения цен и стартовые курсы («USD:92.5,EUR:99»),
+    # дальше курсы меняются командой `flask rates set`
+    BASE_CURRENCY = "RUB"
+    DEFAULT_EXCHANGE_RATES = {
+        cur: rate
+        for cur, rate in (
+            item.split(":") for item in os.getenv("DEFAULT_EXCHANGE_RATES", "USD:90,EUR:100").split(",") if item
+        )
+    }
+
+    # доставка заявок из outbox в Go-сервис (`flask outbox dispatch`):
+    # размер пакета, пауза между опросами и потолок паузы после сбоев, секунды
+    OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 100))
+    OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", 2))
+    OUTBOX_MAX_BACKOFF = float(os.getenv("OUTBOX_MAX_BACKOFF", 300))
 
     INQUIRY_API_URL = os.getenv("INQUIRY_API_URL", "http://inquiries:8080")
     INQUIRY_API_KEY = os.getenv("INQUIRY_API_KEY", "super-secret-inquiries")
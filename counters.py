@@ -0,0 +1,110 @@
+import random
+from collections import Counter
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import Car, Customer, Employee, EntityCounter, Sale
+
+counters_cli = AppGroup('counters', help='Счётчики записей для главной страницы.')
+
+# модель -> имя счётчика в entity_counters
+COUNTED = {
+    Car: 'cars',
+    Customer: 'customers',
+    Employee: 'employees',
+    Sale: 'sales',
+}
+
+_DELTAS = 'entity_counter_deltas'
+_ready = False
+
+# Каждый счётчик — несколько строк (name, shard), значение — их сумма.
+# Транзакция прибавляет свою дельту к случайному сегменту и держит до
+# коммита блокировку только его строки, поэтому параллельные вставки
+# машин/продаж не выстраиваются в очередь за одной строкой «cars».
+
+
+def adjust(connection, deltas):
+    """Прибавить deltas {'cars': 3, 'sales': -1} к счётчикам на переданном соединении (upsert)."""
+    deltas = {name: d for name, d in deltas.items() if d}
+    if not deltas:
+        return
+    shard = random.randrange(max(current_app.config['ENTITY_COUNTER_SHARDS'], 1))
+    t = EntityCounter.__table__
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        for name, d in sorted(deltas.items()):
+            match = (t.c.name == name) & (t.c.shard == shard)
+            res = connection.execute(t.update().where(match).values(value=t.c.value + d))
+            if not res.rowcount:
+                connection.execute(t.insert().values(name=name, shard=shard, value=d))
+        return
+    # сортировка — одинаковый порядок блокировок строк в параллельных транзакциях
+    stmt = insert(t).values([{'name': name, 'shard': shard, 'value': d} for name, d in sorted(deltas.items())])
+    stmt = stmt.on_conflict_do_update(index_elements=[t.c.name, t.c.shard],
+                                      set_={'value': t.c.value + stmt.excluded.value})
+    connection.execute(stmt)
+
+
+# after_insert/after_delete срабатывают и для каскадных удалений
+# (продажи при удалении машины); дельты копятся в сессии и пишутся
+# одним запросом в конце flush, в той же транзакции
+def _track(delta):
+    def listener(mapper, connection, target):
+        inspect(target).session.info.setdefault(_DELTAS, Counter())[COUNTED[mapper.class_]] += delta
+    return listener
+
+
+for _model in COUNTED:
+    event.listen(_model, 'after_insert', _track(1))
+    event.listen(_model, 'after_delete', _track(-1))
+
+
+@event.listens_for(Session, 'before_flush')
+def _reset_deltas(session, flush_context, instances):
+    # остатки от flush, упавшего до after_flush, не должны попасть в следующий
+    session.info.pop(_DELTAS, None)
+
+
+@event.listens_for(Session, 'after_flush')
+def _apply_deltas(session, flush_context):
+    deltas = session.info.pop(_DELTAS, None)
+    if deltas:
+        adjust(session.connection(), deltas)
+
+
+def entity_counts() -> dict:
+    """Все счётчики одним запросом; до миграций — нули."""
+    global _ready
+    counts = dict.fromkeys(COUNTED.values(), 0)
+    if not _ready:
+        # проверка схемы — один раз на процесс (после `flask db upgrade` таблица уже есть)
+        if not inspect(db.engine).has_table(EntityCounter.__tablename__):
+            return counts
+        _ready = True
+    rows = db.session.execute(
+        select(EntityCounter.name, func.sum(EntityCounter.value)).group_by(EntityCounter.name))
+    counts.update((name, int(value)) for name, value in rows)
+    return counts
+
+
+@counters_cli.command('rebuild')
+def rebuild_command():
+    """Пересчитать счётчики через COUNT(*) (после ручных правок в БД)."""
+    t = EntityCounter.__table__
+    counts = {name: db.session.execute(select(func.count()).select_from(model)).scalar()
+              for model, name in COUNTED.items()}
+    db.session.execute(t.delete())
+    db.session.execute(t.insert(), [{'name': name, 'shard': 0, 'value': value} for name, value in counts.items()])
+    db.session.commit()
+    for name, value in counts.items():
+        click.echo(f"{name}\t{value}")
@@ -0,0 +1,178 @@
+import csv
+import io
+import sys
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+
+from extensions import db
+from models import Car, Customer, Employee, Sale, User
+
+# Выгрузки читают строки порциями (yield_per; в Postgres — серверный
+# курсор) и сразу отдают их дальше, поэтому память не растёт с размером
+# таблицы, а первый байт CSV уходит клиенту до конца чтения.
+
+FORMATS = ('csv', 'xlsx')
+_BATCH = 1000
+# первые строки CSV уходят сразу, не дожидаясь полной порции
+_FIRST_CHUNK = 50
+
+
+def _name(last, first, middle):
+    return " ".join(p for p in (last, first, middle) if p)
+
+
+def _cars():
+    seller = aliased(User)
+    stmt = (
+        select(Car.id, Car.vin, Car.brand, Car.model, Car.year, Car.color, Car.price, Car.currency,
+               Car.price_base, Car.status, seller.email, seller.last_name, seller.first_name,
+               seller.middle_name, Car.created_at)
+        .outerjoin(seller, seller.id == Car.seller_id)
+        .order_by(Car.id)
+    )
+    headers = ['ID', 'VIN', 'Марка', 'Модель', 'Год', 'Цвет', 'Цена', 'Валюта', 'Цена, RUB',
+               'Статус', 'Email продавца', 'Продавец', 'Создано']
+
+    def row(r):
+        return [r.id, r.vin, r.brand, r.model, r.year, r.color, r.price, r.currency, r.price_base,
+                r.status, r.email, _name(r.last_name, r.first_name, r.middle_name), r.created_at]
+    return headers, stmt, row
+
+
+def _customers():
+    stmt = (
+        select(Customer.id, Customer.last_name, Customer.first_name, Customer.middle_name,
+               Customer.phone, Customer.email, Customer.created_at)
+        .order_by(Customer.id)
+    )
+    headers = ['ID', 'Фамилия', 'Имя', 'Отчество', 'Телефон', 'Email', 'Создан']
+
+    def row(r):
+        return list(r)
+    return headers, stmt, row
+
+
+def _sales():
+    stmt = (
+        select(Sale.id, Sale.sale_date, Car.vin, Car.brand, Car.model, Car.currency,
+               Customer.last_name.label('c_last'), Customer.first_name.label('c_first'),
+               Customer.middle_name.label('c_middle'),
+               Employee.last_name.label('e_last'), Employee.first_name.label('e_first'),
+               Employee.middle_name.label('e_middle'),
+               Sale.price, Sale.price_base, Sale.payment_method)
+        .join(Car, Car.id == Sale.car_id)
+        .join(Customer, Customer.id == Sale.customer_id)
+        .join(Employee, Employee.id == Sale.employee_id)
+        .order_by(Sale.id)
+    )
+    headers = ['ID', 'Дата', 'VIN', 'Марка', 'Модель', 'Клиент', 'Сотрудник', 'Цена', 'Валюта',
+               'Цена, RUB', 'Оплата']
+
+    def row(r):
+        return [r.id, r.sale_date, r.vin, r.brand, r.model, _name(r.c_last, r.c_first, r.c_middle),
+                _name(r.e_last, r.e_first, r.e_middle), r.price, r.currency, r.price_base,
+                r.payment_method]
+    return headers, stmt, row
+
+
+DATASETS = {
+    'cars': _cars,
+    'customers': _customers,
+    'sales': _sales,
+}
+
+
+def iter_rows(dataset: str):
+    """Заголовок, затем строки выгрузки dataset, читаемые порциями."""
+    headers, stmt, row = DATASETS[dataset]()
+    yield headers
+    result = db.session.execute(stmt.execution_options(yield_per=_BATCH))
+    for r in result:
+        yield row(r)
+
+
+def _csv_value(v):
+    if v is None:
+        return ''
+    if isinstance(v, datetime):
+        return v.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(v, Decimal):
+        # Excel с русской локалью ждёт запятую в дробных числах
+        return str(v).replace('.', ',')
+    return v
+
+
+def iter_csv(dataset: str):
+    """
+    CSV кусками: заголовок — сразу (до запроса к базе), затем первые
+    _FIRST_CHUNK строк, дальше по _BATCH. BOM — чтобы Excel сразу понял UTF-8.
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf, delimiter=current_app.config['EXPORT_CSV_DELIMITER'])
+    buf.write('\ufeff')
+    for n, row in enumerate(iter_rows(dataset)):
+        writer.writerow([_csv_value(v) for v in row])
+        # n — номер строки данных (0 — заголовок)
+        if n == 0 or n == _FIRST_CHUNK or (n > _FIRST_CHUNK and (n - _FIRST_CHUNK) % _BATCH == 0):
+            yield buf.getvalue().encode('utf-8')
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode('utf-8')
+
+
+def write_xlsx(dataset: str, out):
+    """
+    XLSX в режиме write_only (строки не держатся в памяти). Формат — zip,
+    поэтому файл собирается целиком во временном файле и только потом отдаётся.
+    """
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(dataset)
+    for row in iter_rows(dataset):
+        ws.append([float(v) if isinstance(v, Decimal) else v for v in row])
+    wb.save(out)
+
+
+def xlsx_file(dataset: str):
+    """Временный файл с XLSX, указатель в начале."""
+    tmp = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    write_xlsx(dataset, tmp)
+    tmp.seek(0)
+    return tmp
+
+
+def filename(dataset: str, fmt: str) -> str:
+    return f"{dataset}-{date.today().isoformat()}.{fmt}"
+
+
+@click.command('export')
+@click.argument('dataset', type=click.Choice(list(DATASETS)))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), default='csv', show_default=True)
+@click.option('-o', '--output', type=click.Path(dir_okay=False), help='Файл (по умолчанию stdout для CSV).')
+@with_appcontext
+def export_command(dataset, fmt, output):
+    """Выгрузить таблицу: flask export sales --format xlsx -o sales.xlsx"""
+    if fmt == 'xlsx':
+        output = output or filename(dataset, fmt)
+        with open(output, 'wb') as f:
+            write_xlsx(dataset, f)
+        click.echo(output, err=True)
+        return
+    if output:
+        with open(output, 'wb') as f:
+            for chunk in iter_csv(dataset):
+                f.write(chunk)
+    else:
+        out = sys.stdout.buffer
+        for chunk in iter_csv(dataset):
+            out.write(chunk)
+        out.flush()
@@ -0,0 +1,135 @@
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import func, select
+
+from cache import LocalCache, cached
+from extensions import db
+from models import Car
+from search import match_clause
+
+# фасеты со списком значений и счётчиками «Toyota (132)»
+FACET_COLUMNS = {
+    'brand': Car.brand,
+    'year': Car.year,
+    'currency': Car.currency,
+    'color': Car.color,
+    'status': Car.status,
+}
+
+# TTL — лишь страховка: свежесть гарантирует версия тега «catalog»
+_facet_cache = LocalCache(maxsize=256, ttl=300)
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _decimal(value):
+    try:
+        return Decimal(value) if value not in (None, '') else None
+    except InvalidOperation:
+        return None
+
+
+class CatalogFilters:
+    """Фильтры каталога из query string: ?brand=…&year_min=…&price_max=…&q=…"""
+
+    LIST_FIELDS = ('brand', 'currency', 'color', 'status')
+
+    def __init__(self, q='', brand=(), currency=(), color=(), status=(),
+                 year_min=None, year_max=None, price_min=None, price_max=None):
+        self.q = (q or '').strip()
+        self.brand = tuple(sorted(v for v in brand if v))
+        self.currency = tuple(sorted(v for v in currency if v))
+        self.color = tuple(sorted(v for v in color if v))
+        self.status = tuple(sorted(v for v in status if v))
+        self.year_min = year_min
+        self.year_max = year_max
+        self.price_min = price_min
+        self.price_max = price_max
+
+    @classmethod
+    def from_args(cls, args):
+        return cls(
+            q=args.get('q', ''),
+            brand=args.getlist('brand'),
+            currency=args.getlist('currency'),
+            color=args.getlist('color'),
+            status=args.getlist('status'),
+            year_min=_int(args.get('year_min')),
+            year_max=_int(args.get('year_max')),
+            price_min=_decimal(args.get('price_min')),
+            price_max=_decimal(args.get('price_max')),
+        )
+
+    @property
+    def active(self) -> bool:
+        return any(getattr(self, f) for f in self.LIST_FIELDS) or any(
+            v is not None for v in (self.year_min, self.year_max, self.price_min, self.price_max)
+        )
+
+    def conditions(self, dialect, exclude=None, with_search=True):
+        """
+        Условия WHERE. exclude — имя фасета, собственный фильтр которого
+        не учитывается при подсчёте его значений (иначе после выбора
+        «Toyota» остальные марки показывали бы 0).
+        """
+        conds = []
+        for name in self.LIST_FIELDS:
+            values = getattr(self, name)
+            if values and name != exclude:
+                conds.append(FACET_COLUMNS[name].in_(values))
+        if exclude != 'year':
+            if self.year_min is not None:
+                conds.append(Car.year >= self.year_min)
+            if self.year_max is not None:
+                conds.append(Car.year <= self.year_max)
+        if exclude != 'price':
+            # диапазон цены — в базовой валюте, чтобы сравнивать RUB/USD/EUR между собой
+            if self.price_min is not None:
+                conds.append(Car.price_base >= self.price_min)
+            if self.price_max is not None:
+                conds.append(Car.price_base <= self.price_max)
+        if with_search and self.q:
+            clause = match_clause(self.q, dialect)
+            if clause is not None:
+                conds.append(clause)
+        return conds
+
+    def apply(self, query, dialect, with_search=True):
+        return query.filter(*self.conditions(dialect, with_search=with_search))
+
+    def key(self):
+        return (self.q, self.brand, self.currency, self.color, self.status,
+                self.year_min, self.year_max, self.price_min, self.price_max)
+
+
+def _compute_facets(filters: CatalogFilters, dialect: str) -> dict:
+    # по одному GROUP BY на фасет — число запросов не зависит от числа значений
+    result = {}
+    for name, col in FACET_COLUMNS.items():
+        stmt = (
+            select(col, func.count())
+            .where(col.isnot(None), *filters.conditions(dialect, exclude=name))
+            .group_by(col)
+            .order_by(col.desc() if name == 'year' else col)
+        )
+        result[name] = [(value, count) for value, count in db.session.execute(stmt)]
+
+    lo, hi = db.session.execute(
+        select(func.min(Car.price_base), func.max(Car.price_base)).where(*filters.conditions(dialect, exclude='price'))
+    ).one()
+    result['price'] = {'min': lo, 'max': hi}
+    return result
+
+
+def facet_counts(filters: CatalogFilters, dialect: str) -> dict:
+    """
+    Счётчики фасетов для текущих фильтров. Кэшируются в процессе и
+    сбрасываются тегом «catalog», который поднимается при любой записи Car.
+    """
+    return cached(_facet_cache, ('facets',) + filters.key(), ['catalog'],
+                  lambda: _compute_facets(filters, dialect))
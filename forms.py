@@ -1,5 +1,5 @@
 from flask_wtf import FlaskForm
-from flask_wtf.file import FileField, FileAllowed
+from flask_wtf.file import FileField, FileAllowed, FileRequired
 from wtforms import (
     StringField,
     IntegerField,
@@ -9,11 +9,16 @@ from wtforms import (
     SubmitField,
     PasswordField,
     TextAreaField,
+    BooleanField,
 )
 from wtforms.fields import DateTimeLocalField
+from wtforms.widgets import HiddenInput
 from wtforms.validators import DataRequired, NumberRange, Optional, Email, Length, ValidationError
-from models import Car, User
+from sqlalchemy import select
+from extensions import db
+from models import Car, Customer, Employee, User
 from flask import current_app
+from vin import VIN_LENGTH_MESSAGE, VIN_MAX_LENGTH, VIN_MIN_LENGTH, normalize_vin, vin_error
 
 
 class LoginForm(FlaskForm):
@@ -43,7 +48,7 @@ class CarForm(FlaskForm):
     )
     vin = StringField('VIN', validators=[
         DataRequired(),
-        Length(min=10, max=32, message='VIN должен содержать от 10 до 32 символов')
+        Length(min=VIN_MIN_LENGTH, max=VIN_MAX_LENGTH, message=VIN_LENGTH_MESSAGE)
     ])
     brand = StringField('Марка', validators=[DataRequired()])
     model = StringField('Модель', validators=[DataRequired()])
@@ -55,6 +60,8 @@ class CarForm(FlaskForm):
         validators=[Optional(), FileAllowed(['jpg', 'jpeg', 'png', 'gif', 'webp'], 'Только изображения!')],
     )
     description = TextAreaField('Описание', validators=[Optional(), Length(max=5000)])
+    # версия машины на момент открытия формы (Car.version): правка поверх чужой не сохранится
+    version = IntegerField(widget=HiddenInput(), validators=[Optional()])
     submit = SubmitField('Сохранить')
 
     def __init__(self, car_id=None, *args, **kwargs):
@@ -62,19 +69,25 @@ class CarForm(FlaskForm):
         super().__init__(*args, **kwargs)
         self.car_id = car_id
 
+    def populate_obj(self, obj):
+        """Как у FlaskForm, но без version: его увеличивает SQLAlchemy (version_id_col)"""
+        for name, field in self._fields.items():
+            if name != 'version':
+                field.populate_obj(obj, name)
+
+    def set_version(self, version):
+        # IntegerField рисует raw_data, если оно есть, поэтому меняем оба
+        self.version.data = version
+        self.version.raw_data = [str(version)]
+
     def validate_vin(self, field):
         """Проверка уникальности VIN"""
-        vin = field.data.upper().strip()  # Приводим к верхнему регистру и убираем пробелы
+        vin = normalize_vin(field.data)  # Приводим к верхнему регистру и убираем пробелы
 
-        # Проверка формата VIN
-        if not all(c.isalnum() for c in vin):
-            raise ValidationError('VIN может содержать только буквы и цифры')
-
-        # Проверка на запрещенные буквы (в реальном VIN их нет)
-        invalid_chars = ['I', 'O', 'Q']
-        for char in invalid_chars:
-            if char in vin:
-                raise ValidationError(f'VIN не может содержать букву "{char}"')
+        # Проверка формата VIN (длину проверяет Length)
+        error = vin_error(vin, check_length=False)
+        if error:
+            raise ValidationError(error)
 
         # Проверка уникальности
         query = Car.query.filter_by(vin=vin)
@@ -89,6 +102,12 @@ class CarForm(FlaskForm):
             raise ValidationError(f'Автомобиль с VIN {vin} уже существует в базе')
 
 
+class CarImportForm(FlaskForm):
+    file = FileField('Файл CSV', validators=[FileRequired(), FileAllowed(['csv', 'txt'], 'Только CSV!')])
+    dry_run = BooleanField('Только проверить, не загружать')
+    submit = SubmitField('Загрузить')
+
+
 class CustomerForm(FlaskForm):
     last_name = StringField('Фамилия', validators=[DataRequired()])
     first_name = StringField('Имя', validators=[DataRequired()])
@@ -114,9 +133,10 @@ class EmployeeForm(FlaskForm):
 
 
 class SaleForm(FlaskForm):
-    car_id = SelectField('Автомобиль', coerce=int)
-    customer_id = SelectField('Клиент', coerce=int)
-    employee_id = SelectField('Сотрудник', coerce=int)
+    # id выбираются подсказками (sales.lookup_*), полные списки в форму не грузятся
+    car_id = IntegerField('Автомобиль', validators=[DataRequired('Выберите автомобиль')], widget=HiddenInput())
+    customer_id = IntegerField('Клиент', validators=[DataRequired('Выберите клиента')], widget=HiddenInput())
+    employee_id = IntegerField('Сотрудник', validators=[DataRequired('Выберите сотрудника')], widget=HiddenInput())
     sale_date = DateField('Дата продажи', validators=[DataRequired()])
     price = DecimalField('Цена', validators=[DataRequired()])
     payment_method = SelectField(
@@ -129,6 +149,37 @@ class SaleForm(FlaskForm):
     )
     submit = SubmitField('Сохранить')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.labels = {}  # подписи выбранных записей для повторного показа формы
+
+    def validate(self, extra_validators=None):
+        ok = super().validate(extra_validators)
+        return self._check_refs() and ok
+
+    def _check_refs(self) -> bool:
+        """Проверить выбранные машину, клиента и сотрудника одним запросом."""
+        fields = {
+            self.car_id: select(Car.brand + ' ' + Car.model + ' (' + Car.vin + ')')
+                .where(Car.id == self.car_id.data, Car.status != 'sold'),
+            self.customer_id: select(Customer.last_name + ' ' + Customer.first_name)
+                .where(Customer.id == self.customer_id.data),
+            self.employee_id: select(Employee.last_name + ' ' + Employee.first_name + ' — ' + Employee.role)
+                .where(Employee.id == self.employee_id.data),
+        }
+        fields = {f: q for f, q in fields.items() if f.data}
+        if not fields:
+            return True
+        row = db.session.execute(select(*(q.scalar_subquery() for q in fields.values()))).one()
+        ok = True
+        for field, label in zip(fields, row):
+            if label is None:
+                field.errors.append('Автомобиль не найден или уже продан' if field is self.car_id else 'Запись не найдена')
+                ok = False
+            else:
+                self.labels[field.name] = label
+        return ok
+
 
 class RegisterForm(FlaskForm):
     last_name = StringField('Фамилия', validators=[DataRequired()])
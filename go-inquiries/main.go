@@ -2,14 +2,20 @@ package main
 
 import (
 	"database/sql"
+	"encoding/base64"
+	"encoding/json"
+	"fmt"
 	"log"
 	"net/http"
 	"os"
+	"strconv"
+	"strings"
 	"time"
 
 	"github.com/gin-gonic/gin"
 	"gorm.io/driver/postgres"
 	"gorm.io/gorm"
+	"gorm.io/gorm/clause"
 )
 
 /* ---------- Модели ---------- */
@@ -17,14 +23,15 @@ import (
 type Inquiry struct {
 	ID            uint       `json:"id" gorm:"primaryKey"`
 	CarID         uint       `json:"car_id" binding:"required"`
-	BuyerID       uint       `json:"buyer_id" binding:"required"`
-	SellerID      uint       `json:"seller_id" binding:"required"`
+	BuyerID       uint       `json:"buyer_id" binding:"required" gorm:"index:idx_inquiries_buyer_updated,priority:1"`
+	SellerID      uint       `json:"seller_id" binding:"required" gorm:"index:idx_inquiries_seller_updated,priority:1"`
 	Message       string     `json:"message" binding:"required"`
 	PreferredTime *time.Time `json:"preferred_time"`
 	ContactPhone  string     `json:"contact_phone"`
+	ClientRef     *string    `json:"client_ref,omitempty" gorm:"type:varchar(64);uniqueIndex"` // ключ идемпотентности outbox веб-приложения
 	Status        string     `json:"status" gorm:"type:varchar(16);default:'new'"`
 	CreatedAt     time.Time  `json:"created_at"`
-	UpdatedAt     time.Time  `json:"updated_at"`
+	UpdatedAt     time.Time  `json:"updated_at" gorm:"index:idx_inquiries_buyer_updated,priority:2;index:idx_inquiries_seller_updated,priority:2"` // валидатор списка для условного GET
 }
 
 type InquiryFull struct {
@@ -44,6 +51,13 @@ type InquiryFull struct {
 	SellerName    string     `json:"seller_name"`
 }
 
+// страница списка; курсоры непрозрачны для клиента
+type InquiryPage struct {
+	Items      []InquiryFull `json:"items"`
+	NextCursor string        `json:"next_cursor,omitempty"`
+	PrevCursor string        `json:"prev_cursor,omitempty"`
+}
+
 /* ---------- DTO ---------- */
 
 type CreateInquiryDTO struct {
@@ -55,12 +69,208 @@ type CreateInquiryDTO struct {
 	ContactPhone  string `json:"contact_phone"`
 }
 
+type BatchItemDTO struct {
+	ClientRef string `json:"client_ref" binding:"required,max=64"`
+	CreateInquiryDTO
+}
+
+type BatchDTO struct {
+	Items []BatchItemDTO `json:"items" binding:"required,max=500,dive"`
+}
+
+// результат по каждому элементу пакета, в том же порядке
+type BatchResult struct {
+	ClientRef string `json:"client_ref"`
+	ID        uint   `json:"id,omitempty"`
+	Error     string `json:"error,omitempty"`
+}
+
 type UpdateStatusDTO struct {
 	Status string `json:"status" binding:"required,oneof=new accepted declined closed"`
 }
 
+type BulkStatusDTO struct {
+	SellerID uint   `json:"seller_id" binding:"required"`
+	IDs      []uint `json:"ids" binding:"required,min=1,max=500"`
+	Status   string `json:"status" binding:"required,oneof=new accepted declined closed"`
+}
+
 /* ---------- helpers ---------- */
 
+// минимально допустимая дата встречи
+var minPreferredTime = time.Date(2025, 12, 10, 0, 0, 0, 0, time.UTC)
+
+// newInquiry проверяет DTO и собирает модель; строка ошибки — для ответа клиенту
+func newInquiry(dto CreateInquiryDTO) (Inquiry, string) {
+	// разбор и проверка preferred_time, если передан
+	var pt *time.Time
+	if dto.PreferredTime != "" {
+		// формат от <input type="datetime-local">
+		t, err := time.Parse("2006-01-02T15:04", dto.PreferredTime)
+		if err != nil {
+			return Inquiry{}, "Некорректный формат времени, ожидается YYYY-MM-DDTHH:MM"
+		}
+		if t.Before(minPreferredTime) {
+			return Inquiry{}, "Время встречи не может быть раньше 14.11.2025"
+		}
+		pt = &t
+	}
+
+	return Inquiry{
+		CarID:         dto.CarID,
+		BuyerID:       dto.BuyerID,
+		SellerID:      dto.SellerID,
+		Message:       dto.Message,
+		PreferredTime: pt,
+		ContactPhone:  dto.ContactPhone,
+	}, ""
+}
+
+// listVersion — валидатор списка под фильтром: число заявок и самое позднее
+// updated_at (число ловит удаления, которые max не двигают). Имена машин и
+// пользователей из join в него не входят: они меняются редко, а список
+// перечитается при следующем изменении заявки.
+func listVersion(q *gorm.DB) (string, time.Time, error) {
+	var v struct {
+		N    int64
+		Last sql.NullTime
+	}
+	if err := q.Select("COUNT(*) AS n, MAX(i.updated_at) AS last").Scan(&v).Error; err != nil {
+		return "", time.Time{}, err
+	}
+	var ts int64
+	if v.Last.Valid {
+		ts = v.Last.Time.UnixMicro()
+	}
+	return fmt.Sprintf(`W/"%d-%d"`, v.N, ts), v.Last.Time, nil
+}
+
+// notModified — условный GET: If-None-Match важнее If-Modified-Since (RFC 9110)
+func notModified(r *http.Request, etag string, modified time.Time) bool {
+	if inm := r.Header.Get("If-None-Match"); inm != "" {
+		for _, t := range strings.Split(inm, ",") {
+			t = strings.TrimSpace(t)
+			if t == "*" || strings.TrimPrefix(t, "W/") == strings.TrimPrefix(etag, "W/") {
+				return true
+			}
+		}
+		return false
+	}
+	if ims := r.Header.Get("If-Modified-Since"); ims != "" && !modified.IsZero() {
+		if t, err := http.ParseTime(ims); err == nil {
+			return !modified.Truncate(time.Second).After(t)
+		}
+	}
+	return false
+}
+
+// размер страницы списка (?limit=)
+const (
+	defaultPageLimit = 20
+	maxPageLimit     = 100
+)
+
+var inquiryStatuses = map[string]bool{"new": true, "accepted": true, "declined": true, "closed": true}
+
+// listFilter разбирает фильтры списка: buyer_id, seller_id, status и
+// диапазон дат from..to (YYYY-MM-DD, обе границы включительно).
+// Строка ошибки — для ответа 400.
+func listFilter(c *gin.Context) (func(*gorm.DB) *gorm.DB, string) {
+	type cond struct {
+		sql string
+		arg interface{}
+	}
+	var conds []cond
+	if b := c.Query("buyer_id"); b != "" {
+		conds = append(conds, cond{"i.buyer_id = ?", b})
+	}
+	if s := c.Query("seller_id"); s != "" {
+		conds = append(conds, cond{"i.seller_id = ?", s})
+	}
+	if st := c.Query("status"); st != "" {
+		if !inquiryStatuses[st] {
+			return nil, "Некорректный статус"
+		}
+		conds = append(conds, cond{"i.status = ?", st})
+	}
+	if from := c.Query("from"); from != "" {
+		t, err := time.Parse("2006-01-02", from)
+		if err != nil {
+			return nil, "Некорректная дата from, ожидается YYYY-MM-DD"
+		}
+		conds = append(conds, cond{"i.created_at >= ?", t})
+	}
+	if to := c.Query("to"); to != "" {
+		t, err := time.Parse("2006-01-02", to)
+		if err != nil {
+			return nil, "Некорректная дата to, ожидается YYYY-MM-DD"
+		}
+		conds = append(conds, cond{"i.created_at < ?", t.AddDate(0, 0, 1)})
+	}
+	return func(q *gorm.DB) *gorm.DB {
+		for _, cd := range conds {
+			q = q.Where(cd.sql, cd.arg)
+		}
+		return q
+	}, ""
+}
+
+func pageLimit(s string) int {
+	n, err := strconv.Atoi(s)
+	if err != nil || n < 1 {
+		return defaultPageLimit
+	}
+	if n > maxPageLimit {
+		return maxPageLimit
+	}
+	return n
+}
+
+// listCursor — позиция в списке по ключу (created_at, id) и направление листания
+type listCursor struct {
+	T int64  `json:"t"` // created_at, микросекунды
+	I uint   `json:"i"`
+	D string `json:"d"` // next | prev
+}
+
+func encodeCursor(in InquiryFull, dir string) string {
+	raw, _ := json.Marshal(listCursor{T: in.CreatedAt.UnixMicro(), I: in.ID, D: dir})
+	return base64.RawURLEncoding.EncodeToString(raw)
+}
+
+func decodeCursor(s string) (*listCursor, bool) {
+	raw, err := base64.RawURLEncoding.DecodeString(s)
+	if err != nil {
+		return nil, false
+	}
+	var cur listCursor
+	if err := json.Unmarshal(raw, &cur); err != nil || (cur.D != "next" && cur.D != "prev") {
+		return nil, false
+	}
+	return &cur, true
+}
+
+// createOnce вставляет заявку, если её client_ref ещё не встречался;
+// иначе подставляет id уже доставленной заявки
+func createOnce(tx *gorm.DB, in *Inquiry) error {
+	res := tx.Clauses(clause.OnConflict{
+		Columns:   []clause.Column{{Name: "client_ref"}},
+		DoNothing: true,
+	}).Create(in)
+	if res.Error != nil {
+		return res.Error
+	}
+	if res.RowsAffected == 0 {
+		// уже доставлена раньше
+		var existing Inquiry
+		if err := tx.Select("id").Where("client_ref = ?", *in.ClientRef).Take(&existing).Error; err != nil {
+			return err
+		}
+		in.ID = existing.ID
+	}
+	return nil
+}
+
 func openDBWithRetry(dsn string, attempts int, delay time.Duration) (*gorm.DB, *sql.DB) {
 	var (
 		gdb *gorm.DB
@@ -154,37 +364,10 @@ func main() {
 			return
 		}
 
-		// разбор и проверка preferred_time, если передан
-		var pt *time.Time
-		if dto.PreferredTime != "" {
-			// формат от <input type="datetime-local">
-			t, err := time.Parse("2006-01-02T15:04", dto.PreferredTime)
-			if err != nil {
-				c.JSON(http.StatusBadRequest, gin.H{
-					"error": "Некорректный формат времени, ожидается YYYY-MM-DDTHH:MM",
-				})
-				return
-			}
-
-			// минимально допустимая дата: 14.11.2025 00:00 UTC
-			min := time.Date(2025, 12, 10, 0, 0, 0, 0, time.UTC)
-			if t.Before(min) {
-				c.JSON(http.StatusBadRequest, gin.H{
-					"error": "Время встречи не может быть раньше 14.11.2025",
-				})
-				return
-			}
-
-			pt = &t
-		}
-
-		in := Inquiry{
-			CarID:         dto.CarID,
-			BuyerID:       dto.BuyerID,
-			SellerID:      dto.SellerID,
-			Message:       dto.Message,
-			PreferredTime: pt,
-			ContactPhone:  dto.ContactPhone,
+		in, msg := newInquiry(dto)
+		if msg != "" {
+			c.JSON(http.StatusBadRequest, gin.H{"error": msg})
+			return
 		}
 
 		if err := db.Create(&in).Error; err != nil {
@@ -195,9 +378,93 @@ func main() {
 		c.JSON(http.StatusCreated, in)
 	})
 
-	// GET /api/inquiries — список заявок (фильтры buyer_id / seller_id)
+	// POST /api/inquiries/batch — пакет заявок из outbox веб-приложения.
+	// Элементы вставляются по порядку в одной транзакции; client_ref, который
+	// уже есть в базе, не вставляется повторно — возвращается id существующей заявки.
+	// Ошибка в отдельном элементе не мешает остальным: она уходит в его результат.
+	// Каждый элемент пишется под своей точкой сохранения, так что и ошибка БД
+	// (например, нарушенное ограничение) откатывает только его, а не весь пакет.
+	api.POST("/inquiries/batch", func(c *gin.Context) {
+		var dto BatchDTO
+		if err := c.ShouldBindJSON(&dto); err != nil {
+			c.JSON(http.StatusBadRequest, gin.H{"error": err.Error()})
+			return
+		}
+
+		results := make([]BatchResult, len(dto.Items))
+		err := db.Transaction(func(tx *gorm.DB) error {
+			for i, item := range dto.Items {
+				ref := item.ClientRef
+				results[i].ClientRef = ref
+
+				in, msg := newInquiry(item.CreateInquiryDTO)
+				if msg != "" {
+					results[i].Error = msg
+					continue
+				}
+				in.ClientRef = &ref
+
+				sp := fmt.Sprintf("item_%d", i)
+				if err := tx.SavePoint(sp).Error; err != nil {
+					return err
+				}
+				if err := createOnce(tx, &in); err != nil {
+					if rbErr := tx.RollbackTo(sp).Error; rbErr != nil {
+						return rbErr // соединение потеряно — повторит весь пакет
+					}
+					results[i].Error = err.Error()
+					continue
+				}
+				results[i].ID = in.ID
+			}
+			return nil
+		})
+		if err != nil {
+			c.JSON(http.StatusInternalServerError, gin.H{"error": err.Error()})
+			return
+		}
+		c.JSON(http.StatusOK, gin.H{"results": results})
+	})
+
+	// GET /api/inquiries — страница списка заявок, новые сверху.
+	// Фильтры: buyer_id, seller_id, status, from, to; листание: limit, cursor.
+	// Ключ (created_at, id) обслуживается индексами (buyer_id|seller_id, created_at, id):
+	// страница читает limit+1 строк, сколько бы заявок ни было у продавца.
+	// Отдаёт ETag/Last-Modified; если у клиента актуальная копия — 304 без join.
 	api.GET("/inquiries", func(c *gin.Context) {
-		var list []InquiryFull
+		filter, msg := listFilter(c)
+		if msg != "" {
+			c.JSON(http.StatusBadRequest, gin.H{"error": msg})
+			return
+		}
+		var cur *listCursor
+		if s := c.Query("cursor"); s != "" {
+			var ok bool
+			if cur, ok = decodeCursor(s); !ok {
+				c.JSON(http.StatusBadRequest, gin.H{"error": "Некорректный курсор"})
+				return
+			}
+		}
+		limit := pageLimit(c.Query("limit"))
+
+		etag, modified, err := listVersion(db.Table("inquiries AS i").Scopes(filter))
+		if err != nil {
+			c.JSON(http.StatusInternalServerError, gin.H{"error": err.Error()})
+			return
+		}
+		c.Header("ETag", etag)
+		if !modified.IsZero() {
+			c.Header("Last-Modified", modified.UTC().Format(http.TimeFormat))
+		}
+		c.Header("Cache-Control", "private, no-cache")
+		if notModified(c.Request, etag, modified) {
+			c.Status(http.StatusNotModified)
+			return
+		}
+
+		// назад листаем в обратном порядке и разворачиваем
+		forward := cur == nil || cur.D == "next"
+		list := []InquiryFull{}
 		q := db.Table("inquiries AS i").
 			Select(`
 				i.id, i.car_id, i.buyer_id, i.seller_id, i.message, i.preferred_time,
@@ -210,20 +477,52 @@ func main() {
 			Joins("LEFT JOIN cars ON cars.id = i.car_id").
 			Joins("LEFT JOIN users AS buyers ON buyers.id = i.buyer_id").
 			Joins("LEFT JOIN users AS sellers ON sellers.id = i.seller_id").
-			Order("i.created_at DESC")
-
-		if b := c.Query("buyer_id"); b != "" {
-			q = q.Where("i.buyer_id = ?", b)
+			Scopes(filter)
+		if forward {
+			q = q.Order("i.created_at DESC, i.id DESC")
+		} else {
+			q = q.Order("i.created_at ASC, i.id ASC")
 		}
-		if s := c.Query("seller_id"); s != "" {
-			q = q.Where("i.seller_id = ?", s)
+		if cur != nil {
+			op := "<"
+			if !forward {
+				op = ">"
+			}
+			q = q.Where("(i.created_at, i.id) "+op+" (?, ?)", time.UnixMicro(cur.T), cur.I)
 		}
 
-		if err := q.Find(&list).Error; err != nil {
+		if err := q.Limit(limit + 1).Find(&list).Error; err != nil {
 			c.JSON(http.StatusInternalServerError, gin.H{"error": err.Error()})
 			return
 		}
-		c.JSON(http.StatusOK, list)
+		hasMore := len(list) > limit
+		if hasMore {
+			list = list[:limit]
+		}
+		if !forward {
+			for a, b := 0, len(list)-1; a < b; a, b = a+1, b-1 {
+				list[a], list[b] = list[b], list[a]
+			}
+		}
+
+		page := InquiryPage{Items: list}
+		if len(list) > 0 {
+			first, last := list[0], list[len(list)-1]
+			if forward {
+				if hasMore {
+					page.NextCursor = encodeCursor(last, "next")
+				}
+				if cur != nil {
+					page.PrevCursor = encodeCursor(first, "prev")
+				}
+			} else {
+				page.NextCursor = encodeCursor(last, "next")
+				if hasMore {
+					page.PrevCursor = encodeCursor(first, "prev")
+				}
+			}
+		}
+		c.JSON(http.StatusOK, page)
 	})
 
 	// PUT /api/inquiries/:id/status — обновить статус заявки
@@ -242,5 +541,29 @@ func main() {
 		c.Status(http.StatusNoContent)
 	})
 
+	// PUT /api/inquiries/status — один статус для многих заявок продавца.
+	// Один UPDATE ... WHERE id IN (...) AND seller_id = ?: чужие и удалённые
+	// заявки просто не попадают под условие; в ответе — id обновлённых.
+	api.PUT("/inquiries/status", func(c *gin.Context) {
+		var dto BulkStatusDTO
+		if err := c.ShouldBindJSON(&dto); err != nil {
+			c.JSON(http.StatusBadRequest, gin.H{"error": err.Error()})
+			return
+		}
+		var updated []Inquiry
+		if err := db.Model(&updated).
+			Clauses(clause.Returning{Columns: []clause.Column{{Name: "id"}}}).
+			Where("id IN ? AND seller_id = ?", dto.IDs, dto.SellerID).
+			Update("status", dto.Status).Error; err != nil {
+			c.JSON(http.StatusInternalServerError, gin.H{"error": err.Error()})
+			return
+		}
+		ids := make([]uint, len(updated))
+		for i, in := range updated {
+			ids[i] = in.ID
+		}
+		c.JSON(http.StatusOK, gin.H{"updated": ids})
+	})
+
 	log.Fatal(r.Run("0.0.0.0:" + port))
 }
@@ -0,0 +1,119 @@
+import threading
+import time
+
+from flask import current_app
+from flask_login import UserMixin
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from cache import LocalCache, bump_tags, tag_versions
+from extensions import db
+from models import User
+
+# Кэш пользователей для Flask-Login: навбар и проверки ролей обходятся без
+# запроса users на каждый запрос. Своя запись инвалидируется сразу после
+# коммита, изменения из других воркеров видны через версию тега «users»,
+# которую каждый воркер перечитывает не чаще раза в IDENTITY_CHECK_INTERVAL.
+
+# что хранится в кэше; всё остальное подгружается из БД по требованию
+FIELDS = ('id', 'email', 'role', 'last_name', 'first_name', 'middle_name')
+# изменение этих полей (или удаление) сбрасывает кэш
+_WATCHED = FIELDS[1:] + ('password_hash',)
+
+_CHANGED = 'identity_changed_ids'
+
+_identities = None
+_sync_lock = threading.Lock()
+_checked_at = 0.0
+_users_version = None
+
+
+class UserIdentity(UserMixin):
+    """
+    Лёгкая копия User для current_user. Роли и ФИО — из кэша; прочие
+    атрибуты (customer, cars, check_password, ...) берутся у настоящего
+    User, который загружается при первом обращении.
+    """
+
+    is_admin = User.is_admin
+    is_seller = User.is_seller
+    is_buyer = User.is_buyer
+    is_staff = User.is_staff
+    full_name = User.full_name
+
+    def __init__(self, fields: dict):
+        self.__dict__.update(fields)
+
+    def __getattr__(self, name):
+        # вызывается только для атрибутов, которых нет в кэше
+        if name.startswith('__') or name == '_user':
+            raise AttributeError(name)
+        if '_user' not in self.__dict__:
+            self.__dict__['_user'] = db.session.get(User, self.id)
+        return getattr(self.__dict__['_user'], name)
+
+    def __repr__(self):
+        return f"<UserIdentity {self.id} {self.role}>"
+
+
+def _cache() -> LocalCache:
+    global _identities
+    if _identities is None:
+        cfg = current_app.config
+        _identities = LocalCache(maxsize=cfg['IDENTITY_CACHE_SIZE'], ttl=cfg['IDENTITY_CACHE_TTL'])
+    return _identities
+
+
+def _sync():
+    """Сбросить кэш, если пользователей меняли в другом воркере."""
+    global _checked_at, _users_version
+    now = time.monotonic()
+    if now - _checked_at < current_app.config['IDENTITY_CHECK_INTERVAL']:
+        return
+    version = tag_versions(['users'])['users']
+    with _sync_lock:
+        if version != _users_version:
+            _cache().clear()
+            _users_version = version
+        _checked_at = now
+
+
+def load_identity(user_id: int):
+    """user_loader: UserIdentity из кэша или из БД; None, если пользователя нет."""
+    _sync()
+    cache = _cache()
+    fields = cache.get(user_id)
+    if fields is None:
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        fields = {f: getattr(user, f) for f in FIELDS}
+        cache.set(user_id, fields)
+    return UserIdentity(fields)
+
+
+def _identity_changed(user) -> bool:
+    attrs = inspect(user).attrs
+    return any(attrs[f].history.has_changes() for f in _WATCHED)
+
+
+@event.listens_for(Session, 'after_flush')
+def _users_changed(session, flush_context):
+    changed = {u.id for u in session.deleted if isinstance(u, User)}
+    changed.update(u.id for u in session.dirty if isinstance(u, User) and _identity_changed(u))
+    if changed:
+        session.info.setdefault(_CHANGED, set()).update(changed)
+        bump_tags(session, ['users'])
+
+
+@event.listens_for(Session, 'after_commit')
+def _forget_changed(session):
+    ids = session.info.pop(_CHANGED, None)
+    if ids and _identities is not None:
+        for user_id in ids:
+            _identities.delete(user_id)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _drop_changed(session, previous_transaction):
+    session.info.pop(_CHANGED, None)
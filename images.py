@@ -0,0 +1,169 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+from flask import current_app, url_for
+from flask.cli import AppGroup
+from PIL import Image, ImageOps
+
+from cache import LocalCache
+
+log = logging.getLogger(__name__)
+
+images_cli = AppGroup('images', help='Уменьшенные копии фотографий машин.')
+
+# варианты: имя -> (список размеров, обрезать ли под размер)
+# thumb — ячейка 120×80 в списке (1x и 2x), detail — карточка машины
+VARIANTS = {
+    'thumb': ([(120, 80), (240, 160)], True),
+    'detail': ([(600, 450), (1200, 900)], False),
+}
+FORMATS = ('jpg', 'webp')
+_SAVE_OPTIONS = {
+    'jpg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+}
+
+# успешные проверки «вариант уже на диске» — файлы неизменяемы, перепроверять незачем
+_ready = LocalCache(maxsize=20000, ttl=24 * 3600)
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def variant_name(name: str, variant: str, width: int, fmt: str) -> str:
+    """'ab/cd/<hash>.jpg' -> 'ab/cd/<hash>_thumb_240.webp'"""
+    stem = name.rsplit('.', 1)[0]
+    return f"{stem}_{variant}_{width}.{fmt}"
+
+
+def all_variant_names(name: str):
+    for variant, (sizes, _) in VARIANTS.items():
+        for w, _h in sizes:
+            for fmt in FORMATS:
+                yield variant_name(name, variant, w, fmt)
+
+
+def _flatten(im):
+    """JPEG не умеет прозрачность и палитры — кладём на белый фон."""
+    if im.mode in ('RGBA', 'LA') or (im.mode == 'P' and 'transparency' in im.info):
+        im = im.convert('RGBA')
+        bg = Image.new('RGB', im.size, (255, 255, 255))
+        bg.paste(im, mask=im.split()[-1])
+        return bg
+    return im.convert('RGB')
+
+
+def generate_variants(folder: str, name: str, force: bool = False):
+    """
+    Сделать все варианты для загруженного файла. EXIF (в т.ч. геометки)
+    в варианты не копируется, ориентация из EXIF применяется к пикселям.
+    Файлы пишутся во временные и переименовываются, чтобы шаблон никогда
+    не отдал недописанный вариант.
+    """
+    src = os.path.join(folder, name)
+    if not force and all(os.path.exists(os.path.join(folder, v)) for v in all_variant_names(name)):
+        return  # то же фото уже загружали
+    with Image.open(src) as im:
+        im.seek(0)  # у анимированных GIF — первый кадр
+        im = _flatten(ImageOps.exif_transpose(im))
+        for variant, (sizes, crop) in VARIANTS.items():
+            for w, h in sizes:
+                if crop:
+                    out = ImageOps.fit(im, (w, h), Image.LANCZOS)
+                else:
+                    out = im.copy()
+                    out.thumbnail((w, h), Image.LANCZOS)
+                for fmt in FORMATS:
+                    dst = os.path.join(folder, variant_name(name, variant, w, fmt))
+                    tmp = f"{dst}.{os.getpid()}-{threading.get_ident()}.tmp"
+                    out.save(tmp, **_SAVE_OPTIONS[fmt])
+                    os.replace(tmp, dst)
+
+
+def get_pool(workers: int):
+    """Общий фоновый пул процесса для работы с картинками."""
+    # пул создаётся лениво и заново после fork (gunicorn --preload)
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='images')
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _run(folder, name):
+    try:
+        generate_variants(folder, name)
+    except Exception:
+        log.exception("не удалось сделать варианты для %s", name)
+
+
+def schedule_variants(name: str):
+    """Поставить генерацию вариантов в фоновый пул, не задерживая запрос."""
+    if not name:
+        return
+    cfg = current_app.config
+    get_pool(cfg['IMAGE_WORKERS']).submit(_run, cfg['UPLOAD_FOLDER'], name)
+
+
+def remove_variants(name: str):
+    folder = current_app.config['UPLOAD_FOLDER']
+    for v in all_variant_names(name):
+        _ready.delete(v)
+        try:
+            os.remove(os.path.join(folder, v))
+        except FileNotFoundError:
+            pass
+
+
+def _exists(name: str) -> bool:
+    if _ready.get(name):
+        return True
+    if os.path.exists(os.path.join(current_app.config['UPLOAD_FOLDER'], name)):
+        _ready.set(name, True)
+        return True
+    return False
+
+
+def image_srcset(name: str, variant: str):
+    """
+    Данные для <picture>: {'src', 'jpg', 'webp'} со строками srcset,
+    или None, если варианты ещё не готовы (тогда показываем оригинал).
+    """
+    if not name:
+        return None
+    sizes, _ = VARIANTS[variant]
+    largest = variant_name(name, variant, sizes[-1][0], FORMATS[-1])
+    if not _exists(largest):
+        return None
+
+    def url(n):
+        return url_for('media.upload', name=n)
+
+    result = {'src': url(variant_name(name, variant, sizes[0][0], 'jpg'))}
+    for fmt in FORMATS:
+        result[fmt] = ', '.join(f"{url(variant_name(name, variant, w, fmt))} {w}w" for w, _h in sizes)
+    return result
+
+
+@images_cli.command('rebuild')
+@click.option('--missing-only', is_flag=True, help='Только для фото без готовых вариантов.')
+def rebuild_command(missing_only):
+    """Сделать варианты для всех загруженных фото машин."""
+    from models import Car
+
+    folder = current_app.config['UPLOAD_FOLDER']
+    done = failed = 0
+    names = Car.query.with_entities(Car.image_path).filter(Car.image_path.isnot(None)).distinct()
+    for (name,) in names.yield_per(500):
+        try:
+            generate_variants(folder, name, force=not missing_only)
+            done += 1
+        except Exception as e:
+            failed += 1
+            click.echo(f"{name}: {e}", err=True)
+    click.echo(f"Готово: {done}, ошибок: {failed}")
@@ -0,0 +1,61 @@
+from datetime import datetime
+
+from sqlalchemy import select, update
+
+from cache import bump_tags
+from extensions import db
+from models import Car
+
+# Переходы статуса машины без блокировок. Статус и версия читаются
+# обычным SELECT, а UPDATE срабатывает, только если версия не изменилась
+# (WHERE version = <прочитанная>). Ноль обновлённых строк означает, что
+# машину успел поменять кто-то другой: перечитываем и пробуем снова,
+# пока переход ещё допустим, иначе сообщаем о конфликте.
+
+STATUS_LABELS = {'in_stock': 'в наличии', 'reserved': 'в резерве', 'sold': 'продана'}
+
+# текущий статус -> куда можно перевести (форма машины, оформление сделки)
+TRANSITIONS = {
+    'in_stock': ('reserved', 'sold'),
+    'reserved': ('in_stock', 'sold'),
+    'sold': (),  # пока есть сделка, машина продана
+}
+# вернуть проданную машину в наличие можно, только удалив её сделку (sales.delete)
+SALE_DELETED = {'sold': ('in_stock',)}
+
+_ATTEMPTS = 3
+
+
+class StatusConflict(Exception):
+    """Переход статуса невозможен: машина удалена, уже в другом статусе или её постоянно меняют."""
+
+
+def can_transition(current: str, target: str, transitions: dict = TRANSITIONS) -> bool:
+    return target in transitions.get(current or 'in_stock', ())
+
+
+def change_status(car_id: int, target: str, transitions: dict = TRANSITIONS):
+    """
+    Перевести машину в статус target в текущей транзакции (коммит — за
+    вызывающим). Загруженный в сессию объект Car обновляется тут же.
+    transitions — таблица допустимых переходов (SALE_DELETED при удалении сделки).
+    """
+    for _ in range(_ATTEMPTS):
+        row = db.session.execute(select(Car.status, Car.version).where(Car.id == car_id)).one_or_none()
+        if row is None:
+            raise StatusConflict('Машина не найдена — возможно, её удалили')
+        if not can_transition(row.status, target, transitions):
+            raise StatusConflict(
+                f"Машина уже {STATUS_LABELS.get(row.status, row.status)}, "
+                f"перевести её в «{STATUS_LABELS.get(target, target)}» нельзя"
+            )
+        res = db.session.execute(
+            update(Car)
+            .where(Car.id == car_id, Car.version == row.version)
+            .values(status=target, version=row.version + 1, updated_at=datetime.utcnow())
+        )
+        if res.rowcount == 1:
+            # массовый UPDATE не проходит через track_tags
+            bump_tags(db.session, ['catalog', f'car:{car_id}'])
+            return
+    raise StatusConflict('Машину одновременно меняют другие пользователи, попробуйте ещё раз')
@@ -0,0 +1,31 @@
+from flask import current_app
+from sqlalchemy.orm import contains_eager, raiseload, selectinload
+
+from models import Car, Sale
+
+# Именованные профили загрузки для списков: какие связи нужны шаблону
+# и как их подгрузить (JOIN или один SELECT ... IN на всю страницу).
+# Связь, не указанная в профиле, в режиме SQL_STRICT_LOADING вызывает
+# ошибку при обращении — так N+1 видно сразу, а не на проде.
+
+PROFILES = {
+    # sales/list.html: машина, клиент и сотрудник в каждой строке; запрос уже
+    # делает JOIN этих таблиц, поэтому данные берутся из него же
+    'sales.list': (
+        contains_eager(Sale.car),
+        contains_eager(Sale.customer),
+        contains_eager(Sale.employee),
+    ),
+    # cars/list.html: локальная копия внешнего фото (_car_image.html)
+    'cars.list': (
+        selectinload(Car.remote_image),
+    ),
+}
+
+
+def with_profile(query, name: str):
+    """Применить к запросу профиль загрузки name."""
+    options = PROFILES[name]
+    if current_app.config['SQL_STRICT_LOADING']:
+        options = options + (raiseload('*'),)
+    return query.options(*options)
@@ -0,0 +1,25 @@
+"""cars keyset indexes
+
+Revision ID: 3c1f9a2b7d40
+Revises: 97fc57d5f186
+Create Date: 2025-11-20 10:12:44.318220
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '3c1f9a2b7d40'
+down_revision = '97fc57d5f186'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_cars_created_at_id', 'cars', ['created_at', 'id'], unique=False)
+    op.create_index('ix_cars_seller_created_at_id', 'cars', ['seller_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_cars_seller_created_at_id', table_name='cars')
+    op.drop_index('ix_cars_created_at_id', table_name='cars')
@@ -0,0 +1,23 @@
+"""cars.image_path index for upload reference counting
+
+Revision ID: 5f3b9e07c8a1
+Revises: d2a8c4f61e93
+Create Date: 2025-11-27 11:08:52.660318
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5f3b9e07c8a1'
+down_revision = 'd2a8c4f61e93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(op.f('ix_cars_image_path'), 'cars', ['image_path'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_cars_image_path'), table_name='cars')
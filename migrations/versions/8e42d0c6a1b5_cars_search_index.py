@@ -0,0 +1,72 @@
+"""cars full-text search
+
+Revision ID: 8e42d0c6a1b5
+Revises: 3c1f9a2b7d40
+Create Date: 2025-11-21 14:03:18.552907
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from search import build_search_text
+
+
+# revision identifiers, used by Alembic.
+revision = '8e42d0c6a1b5'
+down_revision = '3c1f9a2b7d40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('cars', sa.Column('search_text', sa.Text(), nullable=True))
+
+    # заполняем поисковую строку для уже существующих машин
+    bind = op.get_bind()
+    cars = sa.table('cars', sa.column('id'), sa.column('brand'), sa.column('model'),
+                    sa.column('vin'), sa.column('search_text'))
+    rows = bind.execute(sa.select(cars.c.id, cars.c.brand, cars.c.model, cars.c.vin)).all()
+    if rows:
+        bind.execute(
+            cars.update().where(cars.c.id == sa.bindparam('b_id')).values(search_text=sa.bindparam('b_text')),
+            [{'b_id': r.id, 'b_text': build_search_text(r.brand, r.model, r.vin)} for r in rows],
+        )
+
+    if bind.dialect.name == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute("CREATE INDEX ix_cars_search_tsv ON cars USING gin (to_tsvector('simple', search_text))")
+        op.execute("CREATE INDEX ix_cars_search_trgm ON cars USING gin (search_text gin_trgm_ops)")
+    elif bind.dialect.name == 'sqlite':
+        # внешний контент: в FTS5 лежит только индекс, текст берётся из cars.search_text
+        op.execute(
+            "CREATE VIRTUAL TABLE cars_fts USING fts5("
+            "search_text, content='cars', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+        )
+        op.execute(
+            "CREATE TRIGGER cars_fts_ai AFTER INSERT ON cars BEGIN "
+            "INSERT INTO cars_fts(rowid, search_text) VALUES (new.id, new.search_text); END"
+        )
+        op.execute(
+            "CREATE TRIGGER cars_fts_ad AFTER DELETE ON cars BEGIN "
+            "INSERT INTO cars_fts(cars_fts, rowid, search_text) VALUES ('delete', old.id, old.search_text); END"
+        )
+        op.execute(
+            "CREATE TRIGGER cars_fts_au AFTER UPDATE OF search_text ON cars BEGIN "
+            "INSERT INTO cars_fts(cars_fts, rowid, search_text) VALUES ('delete', old.id, old.search_text); "
+            "INSERT INTO cars_fts(rowid, search_text) VALUES (new.id, new.search_text); END"
+        )
+        op.execute("INSERT INTO cars_fts(cars_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_cars_search_trgm")
+        op.execute("DROP INDEX IF EXISTS ix_cars_search_tsv")
+    elif bind.dialect.name == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS cars_fts_au")
+        op.execute("DROP TRIGGER IF EXISTS cars_fts_ad")
+        op.execute("DROP TRIGGER IF EXISTS cars_fts_ai")
+        op.execute("DROP TABLE IF EXISTS cars_fts")
+    with op.batch_alter_table('cars') as batch_op:
+        batch_op.drop_column('search_text')
@@ -0,0 +1,119 @@
+"""people search: search_name, phone_e164 and substring indexes
+
+Revision ID: a3e9c5d71b48
+Revises: b7d4e2f9a013
+Create Date: 2025-12-06 16:42:55.317094
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from search import build_person_text, normalize_phone
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3e9c5d71b48'
+down_revision = 'b7d4e2f9a013'
+branch_labels = None
+depends_on = None
+
+
+def _backfill(bind, name, with_phone):
+    cols = [sa.column('id'), sa.column('last_name'), sa.column('first_name'), sa.column('middle_name'),
+            sa.column('search_name')]
+    if with_phone:
+        cols += [sa.column('phone'), sa.column('phone_e164')]
+    t = sa.table(name, *cols)
+    rows = bind.execute(sa.select(*(c for c in t.c if c.name not in ('search_name', 'phone_e164')))).all()
+    if not rows:
+        return
+    values = {'search_name': sa.bindparam('b_name')}
+    if with_phone:
+        values['phone_e164'] = sa.bindparam('b_phone')
+    bind.execute(
+        t.update().where(t.c.id == sa.bindparam('b_id')).values(**values),
+        [{
+            'b_id': r.id,
+            'b_name': build_person_text(r.last_name, r.first_name, r.middle_name),
+            **({'b_phone': normalize_phone(r.phone)} if with_phone else {}),
+        } for r in rows],
+    )
+
+
+def _create_fts(name, columns):
+    # внешний контент, как у cars_fts; trigram находит любую подстроку от 3 символов
+    cols = ', '.join(columns)
+    new = ', '.join(f'new.{c}' for c in columns)
+    old = ', '.join(f'old.{c}' for c in columns)
+    op.execute(
+        f"CREATE VIRTUAL TABLE {name}_fts USING fts5("
+        f"{cols}, content='{name}', content_rowid='id', tokenize='trigram')"
+    )
+    op.execute(
+        f"CREATE TRIGGER {name}_fts_ai AFTER INSERT ON {name} BEGIN "
+        f"INSERT INTO {name}_fts(rowid, {cols}) VALUES (new.id, {new}); END"
+    )
+    op.execute(
+        f"CREATE TRIGGER {name}_fts_ad AFTER DELETE ON {name} BEGIN "
+        f"INSERT INTO {name}_fts({name}_fts, rowid, {cols}) VALUES ('delete', old.id, {old}); END"
+    )
+    op.execute(
+        f"CREATE TRIGGER {name}_fts_au AFTER UPDATE OF {cols} ON {name} BEGIN "
+        f"INSERT INTO {name}_fts({name}_fts, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {name}_fts(rowid, {cols}) VALUES (new.id, {new}); END"
+    )
+    op.execute(f"INSERT INTO {name}_fts({name}_fts) VALUES ('rebuild')")
+
+
+def _drop_fts(name):
+    for suffix in ('au', 'ad', 'ai'):
+        op.execute(f"DROP TRIGGER IF EXISTS {name}_fts_{suffix}")
+    op.execute(f"DROP TABLE IF EXISTS {name}_fts")
+
+
+def upgrade():
+    op.add_column('customers', sa.Column('search_name', sa.String(length=200), nullable=True))
+    op.add_column('customers', sa.Column('phone_e164', sa.String(length=16), nullable=True))
+    op.add_column('employees', sa.Column('search_name', sa.String(length=200), nullable=True))
+
+    bind = op.get_bind()
+    _backfill(bind, 'customers', with_phone=True)
+    _backfill(bind, 'employees', with_phone=False)
+
+    # B-tree: префиксы в подсказках формы сделки; заменяют индексы по lower(last_name) и phone
+    op.create_index(op.f('ix_customers_search_name'), 'customers', ['search_name'], unique=False)
+    op.create_index(op.f('ix_customers_phone_e164'), 'customers', ['phone_e164'], unique=False)
+    op.create_index(op.f('ix_employees_search_name'), 'employees', ['search_name'], unique=False)
+    op.drop_index('ix_customers_last_name_lower', table_name='customers')
+    op.drop_index('ix_employees_last_name_lower', table_name='employees')
+    op.drop_index('ix_customers_phone', table_name='customers')
+
+    if bind.dialect.name == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute("CREATE INDEX ix_customers_search_name_trgm ON customers USING gin (search_name gin_trgm_ops)")
+        op.execute("CREATE INDEX ix_customers_phone_e164_trgm ON customers USING gin (phone_e164 gin_trgm_ops)")
+        op.execute("CREATE INDEX ix_employees_search_name_trgm ON employees USING gin (search_name gin_trgm_ops)")
+    elif bind.dialect.name == 'sqlite':
+        _create_fts('customers', ['search_name', 'phone_e164'])
+        _create_fts('employees', ['search_name'])
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_employees_search_name_trgm")
+        op.execute("DROP INDEX IF EXISTS ix_customers_phone_e164_trgm")
+        op.execute("DROP INDEX IF EXISTS ix_customers_search_name_trgm")
+    elif bind.dialect.name == 'sqlite':
+        _drop_fts('employees')
+        _drop_fts('customers')
+
+    op.create_index('ix_customers_phone', 'customers', ['phone'], unique=False)
+    op.create_index('ix_employees_last_name_lower', 'employees', [sa.text('lower(last_name)')], unique=False)
+    op.create_index('ix_customers_last_name_lower', 'customers', [sa.text('lower(last_name)')], unique=False)
+    op.drop_index(op.f('ix_employees_search_name'), table_name='employees')
+    op.drop_index(op.f('ix_customers_phone_e164'), table_name='customers')
+    op.drop_index(op.f('ix_customers_search_name'), table_name='customers')
+    op.drop_column('employees', 'search_name')
+    op.drop_column('customers', 'phone_e164')
+    op.drop_column('customers', 'search_name')
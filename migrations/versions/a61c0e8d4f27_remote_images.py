@@ -0,0 +1,37 @@
+"""remote images cache
+
+Revision ID: a61c0e8d4f27
+Revises: 5f3b9e07c8a1
+Create Date: 2025-11-27 11:05:12.418230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a61c0e8d4f27'
+down_revision = '5f3b9e07c8a1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('remote_images',
+    sa.Column('url', sa.String(length=255), nullable=False),
+    sa.Column('image_path', sa.String(length=255), nullable=True),
+    sa.Column('status', sa.String(length=16), nullable=False),
+    sa.Column('error', sa.String(length=255), nullable=True),
+    sa.Column('failures', sa.Integer(), nullable=False),
+    sa.Column('etag', sa.String(length=255), nullable=True),
+    sa.Column('last_modified', sa.String(length=64), nullable=True),
+    sa.Column('fetched_at', sa.DateTime(), nullable=True),
+    sa.Column('checked_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('url')
+    )
+    op.create_index(op.f('ix_remote_images_image_path'), 'remote_images', ['image_path'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_remote_images_image_path'), table_name='remote_images')
+    op.drop_table('remote_images')
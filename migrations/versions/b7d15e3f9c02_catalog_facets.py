@@ -0,0 +1,38 @@
+"""catalog facets: filter indexes and cache tags
+
+Revision ID: b7d15e3f9c02
+Revises: 8e42d0c6a1b5
+Create Date: 2025-11-24 09:41:05.127634
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d15e3f9c02'
+down_revision = '8e42d0c6a1b5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('cache_tags',
+    sa.Column('tag', sa.String(length=64), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('tag')
+    )
+    op.create_index(op.f('ix_cars_brand'), 'cars', ['brand'], unique=False)
+    op.create_index(op.f('ix_cars_color'), 'cars', ['color'], unique=False)
+    op.create_index(op.f('ix_cars_currency'), 'cars', ['currency'], unique=False)
+    op.create_index(op.f('ix_cars_status'), 'cars', ['status'], unique=False)
+    op.create_index(op.f('ix_cars_year'), 'cars', ['year'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_cars_year'), table_name='cars')
+    op.drop_index(op.f('ix_cars_status'), table_name='cars')
+    op.drop_index(op.f('ix_cars_currency'), table_name='cars')
+    op.drop_index(op.f('ix_cars_color'), table_name='cars')
+    op.drop_index(op.f('ix_cars_brand'), table_name='cars')
+    op.drop_table('cache_tags')
@@ -0,0 +1,24 @@
+"""cars.version for optimistic locking
+
+Revision ID: b7d4e2f9a013
+Revises: f91d3a57b2c6
+Create Date: 2025-12-04 11:26:19.508342
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d4e2f9a013'
+down_revision = 'f91d3a57b2c6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('cars', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    op.drop_column('cars', 'version')
@@ -0,0 +1,41 @@
+"""shard entity counters
+
+Revision ID: c6a0e4b8d2f1
+Revises: f2c7a9d4e016
+Create Date: 2025-12-16 10:21:37.804153
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c6a0e4b8d2f1'
+down_revision = 'f2c7a9d4e016'
+branch_labels = None
+depends_on = None
+
+
+# в SQLite первичный ключ без имени — даём ему то же имя, что в Postgres
+_NAMING = {'pk': '%(table_name)s_pkey'}
+
+
+def upgrade():
+    # текущие значения остаются в сегменте 0
+    with op.batch_alter_table('entity_counters', recreate='always', naming_convention=_NAMING) as batch_op:
+        batch_op.add_column(sa.Column('shard', sa.SmallInteger(), server_default='0', nullable=False))
+        batch_op.drop_constraint('entity_counters_pkey', type_='primary')
+        batch_op.create_primary_key('entity_counters_pkey', ['name', 'shard'])
+
+
+def downgrade():
+    conn = op.get_bind()
+    totals = conn.execute(sa.text("SELECT name, SUM(value) FROM entity_counters GROUP BY name")).all()
+    op.execute("DELETE FROM entity_counters")
+    with op.batch_alter_table('entity_counters', recreate='always', naming_convention=_NAMING) as batch_op:
+        batch_op.drop_constraint('entity_counters_pkey', type_='primary')
+        batch_op.create_primary_key('entity_counters_pkey', ['name'])
+        batch_op.drop_column('shard')
+    if totals:
+        op.bulk_insert(sa.table('entity_counters', sa.column('name', sa.String), sa.column('value', sa.BigInteger)),
+                       [{'name': name, 'value': value} for name, value in totals])
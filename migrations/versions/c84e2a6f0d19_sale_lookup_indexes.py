@@ -0,0 +1,28 @@
+"""indexes for sale form lookups
+
+Revision ID: c84e2a6f0d19
+Revises: e3b7f1c92d58
+Create Date: 2025-11-29 13:17:08.552091
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c84e2a6f0d19'
+down_revision = 'e3b7f1c92d58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(op.f('ix_customers_phone'), 'customers', ['phone'], unique=False)
+    op.create_index('ix_customers_last_name_lower', 'customers', [sa.text('lower(last_name)')], unique=False)
+    op.create_index('ix_employees_last_name_lower', 'employees', [sa.text('lower(last_name)')], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_employees_last_name_lower', table_name='employees')
+    op.drop_index('ix_customers_last_name_lower', table_name='customers')
+    op.drop_index(op.f('ix_customers_phone'), table_name='customers')
@@ -0,0 +1,46 @@
+"""exchange rates and cars.price_base
+
+Revision ID: d2a8c4f61e93
+Revises: b7d15e3f9c02
+Create Date: 2025-11-25 16:20:37.904412
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+from config import Config
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a8c4f61e93'
+down_revision = 'b7d15e3f9c02'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    rates = op.create_table('exchange_rates',
+    sa.Column('currency', sa.String(length=3), nullable=False),
+    sa.Column('rate', sa.Numeric(precision=18, scale=6), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('currency')
+    )
+    now = datetime.utcnow()
+    seed = {Config.BASE_CURRENCY: 1, **Config.DEFAULT_EXCHANGE_RATES}
+    op.bulk_insert(rates, [{'currency': cur, 'rate': rate, 'updated_at': now} for cur, rate in seed.items()])
+
+    op.add_column('cars', sa.Column('price_base', sa.Numeric(precision=14, scale=2), nullable=True))
+    op.execute(
+        "UPDATE cars SET price_base = ROUND(price * "
+        "(SELECT rate FROM exchange_rates WHERE exchange_rates.currency = cars.currency), 2)"
+    )
+    op.create_index('ix_cars_price_base_id', 'cars', ['price_base', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_cars_price_base_id', table_name='cars')
+    with op.batch_alter_table('cars') as batch_op:
+        batch_op.drop_column('price_base')
+    op.drop_table('exchange_rates')
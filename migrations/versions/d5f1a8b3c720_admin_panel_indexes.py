@@ -0,0 +1,27 @@
+"""indexes for admin panel sections
+
+Revision ID: d5f1a8b3c720
+Revises: a3e9c5d71b48
+Create Date: 2025-12-08 12:15:37.904216
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5f1a8b3c720'
+down_revision = 'a3e9c5d71b48'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_users_created_at_id', 'users', ['created_at', 'id'], unique=False)
+    op.create_index('ix_users_role_created_at_id', 'users', ['role', 'created_at', 'id'], unique=False)
+    op.create_index('ix_cars_status_created_at_id', 'cars', ['status', 'created_at', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_cars_status_created_at_id', table_name='cars')
+    op.drop_index('ix_users_role_created_at_id', table_name='users')
+    op.drop_index('ix_users_created_at_id', table_name='users')
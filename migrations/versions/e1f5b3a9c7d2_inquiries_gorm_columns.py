@@ -0,0 +1,40 @@
+"""inquiries client_ref and updated_at indexes shared with the Go service
+
+Revision ID: e1f5b3a9c7d2
+Revises: c6a0e4b8d2f1
+Create Date: 2025-12-17 11:36:02.417395
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1f5b3a9c7d2'
+down_revision = 'c6a0e4b8d2f1'
+branch_labels = None
+depends_on = None
+
+_INDEXES = (
+    ('idx_inquiries_buyer_updated', ['buyer_id', 'updated_at'], False),
+    ('idx_inquiries_seller_updated', ['seller_id', 'updated_at'], False),
+    ('idx_inquiries_client_ref', ['client_ref'], True),
+)
+
+
+def upgrade():
+    # сервис заявок мог уже создать столбец и индексы через GORM AutoMigrate
+    insp = sa.inspect(op.get_bind())
+    if 'client_ref' not in {c['name'] for c in insp.get_columns('inquiries')}:
+        op.add_column('inquiries', sa.Column('client_ref', sa.String(length=64), nullable=True))
+    existing = {i['name'] for i in insp.get_indexes('inquiries')}
+    for name, columns, unique in _INDEXES:
+        if name not in existing:
+            op.create_index(name, 'inquiries', columns, unique=unique)
+
+
+def downgrade():
+    for name, _columns, _unique in reversed(_INDEXES):
+        op.drop_index(name, table_name='inquiries')
+    with op.batch_alter_table('inquiries') as batch_op:
+        batch_op.drop_column('client_ref')
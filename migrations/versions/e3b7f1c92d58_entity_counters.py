@@ -0,0 +1,30 @@
+"""entity counters for the home page
+
+Revision ID: e3b7f1c92d58
+Revises: a61c0e8d4f27
+Create Date: 2025-11-28 09:42:55.160374
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3b7f1c92d58'
+down_revision = 'a61c0e8d4f27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('entity_counters',
+    sa.Column('name', sa.String(length=32), nullable=False),
+    sa.Column('value', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    for table in ('cars', 'customers', 'employees', 'sales'):
+        op.execute(f"INSERT INTO entity_counters (name, value) SELECT '{table}', COUNT(*) FROM {table}")
+
+
+def downgrade():
+    op.drop_table('entity_counters')
@@ -0,0 +1,47 @@
+"""inquiry outbox
+
+Revision ID: e8b2f4a6c913
+Revises: d5f1a8b3c720
+Create Date: 2025-12-10 09:51:22.630418
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8b2f4a6c913'
+down_revision = 'd5f1a8b3c720'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('inquiry_outbox',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('client_ref', sa.String(length=64), nullable=False),
+    sa.Column('buyer_id', sa.Integer(), nullable=False),
+    sa.Column('car_id', sa.Integer(), nullable=False),
+    sa.Column('payload', sa.JSON(), nullable=False),
+    sa.Column('status', sa.String(length=16), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('remote_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('sent_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['buyer_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('client_ref')
+    )
+    with op.batch_alter_table('inquiry_outbox', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_inquiry_outbox_buyer_id'), ['buyer_id'], unique=False)
+        batch_op.create_index('ix_inquiry_outbox_status_id', ['status', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('inquiry_outbox', schema=None) as batch_op:
+        batch_op.drop_index('ix_inquiry_outbox_status_id')
+        batch_op.drop_index(batch_op.f('ix_inquiry_outbox_buyer_id'))
+
+    op.drop_table('inquiry_outbox')
@@ -0,0 +1,33 @@
+"""composite indexes for paginated inquiry lists
+
+Revision ID: f2c7a9d4e016
+Revises: e8b2f4a6c913
+Create Date: 2025-12-11 14:08:43.519207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c7a9d4e016'
+down_revision = 'e8b2f4a6c913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # ведущий столбец покрывает и прежние одиночные индексы
+    op.create_index('ix_inquiries_buyer_created_at_id', 'inquiries',
+                    ['buyer_id', sa.text('created_at DESC'), sa.text('id DESC')], unique=False)
+    op.create_index('ix_inquiries_seller_created_at_id', 'inquiries',
+                    ['seller_id', sa.text('created_at DESC'), sa.text('id DESC')], unique=False)
+    op.drop_index('ix_inquiries_buyer_id', table_name='inquiries')
+    op.drop_index('ix_inquiries_seller_id', table_name='inquiries')
+
+
+def downgrade():
+    op.create_index('ix_inquiries_seller_id', 'inquiries', ['seller_id'], unique=False)
+    op.create_index('ix_inquiries_buyer_id', 'inquiries', ['buyer_id'], unique=False)
+    op.drop_index('ix_inquiries_seller_created_at_id', table_name='inquiries')
+    op.drop_index('ix_inquiries_buyer_created_at_id', table_name='inquiries')
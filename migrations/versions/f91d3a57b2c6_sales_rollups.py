@@ -0,0 +1,58 @@
+"""sales.price_base and sales rollups
+
+Revision ID: f91d3a57b2c6
+Revises: c84e2a6f0d19
+Create Date: 2025-12-01 10:08:41.773215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f91d3a57b2c6'
+down_revision = 'c84e2a6f0d19'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('sales', sa.Column('price_base', sa.Numeric(precision=14, scale=2), nullable=True))
+    op.execute(
+        "UPDATE sales SET price_base = ROUND(price * "
+        "(SELECT exchange_rates.rate FROM cars JOIN exchange_rates ON exchange_rates.currency = cars.currency "
+        "WHERE cars.id = sales.car_id), 2)"
+    )
+
+    op.create_table('sales_rollups',
+    sa.Column('period', sa.Date(), nullable=False),
+    sa.Column('dimension', sa.String(length=16), nullable=False),
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('deals', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Numeric(precision=16, scale=2), nullable=False),
+    sa.PrimaryKeyConstraint('period', 'dimension', 'key')
+    )
+
+    if op.get_bind().dialect.name == 'postgresql':
+        month = "CAST(date_trunc('month', sales.sale_date) AS DATE)"
+    else:
+        month = "date(sales.sale_date, 'start of month')"
+    keys = {
+        'month': "''",
+        'employee': "CAST(sales.employee_id AS VARCHAR)",
+        'brand': "COALESCE(cars.brand, '')",
+        'payment': "COALESCE(sales.payment_method, '')",
+    }
+    for dimension, key in keys.items():
+        op.execute(
+            f"INSERT INTO sales_rollups (period, dimension, key, deals, revenue) "
+            f"SELECT {month}, '{dimension}', {key}, COUNT(*), COALESCE(SUM(sales.price_base), 0) "
+            f"FROM sales LEFT OUTER JOIN cars ON cars.id = sales.car_id "
+            f"WHERE sales.sale_date IS NOT NULL GROUP BY {month}, {key}"
+        )
+
+
+def downgrade():
+    op.drop_table('sales_rollups')
+    with op.batch_alter_table('sales') as batch_op:
+        batch_op.drop_column('price_base')
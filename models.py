@@ -1,6 +1,11 @@
 from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import event, func, inspect, literal_column, select
+from sqlalchemy.orm import query_expression
 from extensions import db
-from werkzeug.security import generate_password_hash, check_password_hash
+from search import build_person_text, build_search_text, normalize_phone
+from cache import track_tags
+from passwords import hash_password, verify_password, needs_rehash
 from flask_login import UserMixin
 
 
@@ -12,6 +17,11 @@ class TimestampMixin:
 # ---- Пользователи ----
 class User(db.Model, UserMixin, TimestampMixin):
     __tablename__ = "users"
+    __table_args__ = (
+        # разделы админ-панели: новые сверху, с фильтром по роли и без
+        db.Index('ix_users_created_at_id', 'created_at', 'id'),
+        db.Index('ix_users_role_created_at_id', 'role', 'created_at', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(255), unique=True, nullable=False, index=True)
@@ -28,10 +38,15 @@ class User(db.Model, UserMixin, TimestampMixin):
 
     # --- утилиты пароля ---
     def set_password(self, password: str):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password: str) -> bool:
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
+
+    @property
+    def password_needs_rehash(self) -> bool:
+        """Хэш посчитан с устаревшими параметрами (см. PASSWORD_HASH_METHOD)."""
+        return needs_rehash(self.password_hash)
 
     # --- роли ---
     @property
@@ -60,28 +75,95 @@ class User(db.Model, UserMixin, TimestampMixin):
 # ---- Бизнес-сущности ----
 class Car(db.Model, TimestampMixin):
     __tablename__ = 'cars'
+    __table_args__ = (
+        # keyset-пагинация каталога и «моих объявлений»
+        db.Index('ix_cars_created_at_id', 'created_at', 'id'),
+        db.Index('ix_cars_seller_created_at_id', 'seller_id', 'created_at', 'id'),
+        db.Index('ix_cars_price_base_id', 'price_base', 'id'),
+        # админ-панель: фильтр по статусу
+        db.Index('ix_cars_status_created_at_id', 'status', 'created_at', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     vin = db.Column(db.String(32), unique=True, nullable=False)
-    brand = db.Column(db.String(64), nullable=False)
+    brand = db.Column(db.String(64), nullable=False, index=True)
     model = db.Column(db.String(64), nullable=False)
-    year = db.Column(db.Integer, nullable=False)
-    color = db.Column(db.String(32))
+    year = db.Column(db.Integer, nullable=False, index=True)
+    color = db.Column(db.String(32), index=True)
     price = db.Column(db.Numeric(12, 2), nullable=False)
+    # цена в базовой валюте (RUB) для сортировки/фильтра; см. rates.py
+    price_base = db.Column(db.Numeric(14, 2), nullable=True)
 
     # НОВОЕ:
-    currency = db.Column(db.String(3), nullable=False, default='RUB')  # RUB | USD | EUR
+    currency = db.Column(db.String(3), nullable=False, default='RUB', index=True)  # RUB | USD | EUR
 
-    status = db.Column(db.String(16), default='in_stock')
+    status = db.Column(db.String(16), default='in_stock', index=True)
     description = db.Column(db.Text)
     image_url = db.Column(db.String(255))
-    image_path = db.Column(db.String(255), nullable=True)
+    image_path = db.Column(db.String(255), nullable=True, index=True)  # ab/cd/<sha256>.ext, см. storage.py
+    # локальная копия фото по image_url (см. remote_images.py)
+    remote_image = db.relationship(
+        'RemoteImage',
+        primaryjoin='foreign(Car.image_url) == RemoteImage.url',
+        viewonly=True, uselist=False, lazy='selectin',
+    )
 
     seller_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
 
+    # номер версии строки: UPDATE/DELETE через ORM идут с WHERE version = <прочитанная>,
+    # и параллельная правка даёт StaleDataError вместо тихой перезаписи (см. inventory.py)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    __mapper_args__ = {'version_id_col': version}
+
+    # нормализованные марка/модель в обоих алфавитах + VIN (см. search.py)
+    search_text = db.Column(db.Text, nullable=True)
+    # релевантность поиска, подставляется запросом через with_expression()
+    search_rank = query_expression()
+
     sales = db.relationship('Sale', back_populates='car', cascade='all, delete-orphan')
 
 
+# полнотекстовый и триграммный индексы есть только в Postgres;
+# в SQLite поиск идёт через виртуальную таблицу FTS5 cars_fts (см. миграцию)
+db.Index(
+    'ix_cars_search_tsv',
+    func.to_tsvector(literal_column("'simple'"), Car.search_text),
+    postgresql_using='gin',
+).ddl_if(dialect='postgresql')
+db.Index(
+    'ix_cars_search_trgm',
+    Car.search_text,
+    postgresql_using='gin',
+    postgresql_ops={'search_text': 'gin_trgm_ops'},
+).ddl_if(dialect='postgresql')
+
+
+# любая запись машины сбрасывает кэш фасетов и страниц каталога и страницу самой машины
+track_tags(Car, lambda car: ['catalog', f'car:{car.id}'])
+
+
+@event.listens_for(Car, 'before_insert')
+@event.listens_for(Car, 'before_update')
+def _car_search_text(mapper, connection, target):
+    target.search_text = build_search_text(target.brand, target.model, target.vin)
+
+
+@event.listens_for(Car, 'before_insert')
+@event.listens_for(Car, 'before_update')
+def _car_price_base(mapper, connection, target):
+    state = inspect(target)
+    if state.persistent and not (state.attrs.price.history.has_changes()
+                                 or state.attrs.currency.history.has_changes()):
+        return
+    rate = connection.execute(
+        select(ExchangeRate.rate).where(ExchangeRate.currency == (target.currency or 'RUB'))
+    ).scalar()
+    if rate is None or target.price is None:
+        target.price_base = None
+    else:
+        target.price_base = (Decimal(str(target.price)) * rate).quantize(Decimal('0.01'))
+
+
 class Customer(db.Model, TimestampMixin):
     __tablename__ = 'customers'
 
@@ -95,6 +177,10 @@ class Customer(db.Model, TimestampMixin):
     phone = db.Column(db.String(32))
     email = db.Column(db.String(128))
 
+    # для поиска (см. search.person_match): нормализованное ФИО и телефон в E.164
+    search_name = db.Column(db.String(200), nullable=True, index=True)
+    phone_e164 = db.Column(db.String(16), nullable=True, index=True)
+
     # опциональная привязка к пользователю сайта
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), unique=True, nullable=True)
     user = db.relationship('User', backref=db.backref('customer', uselist=False))
@@ -107,6 +193,28 @@ class Customer(db.Model, TimestampMixin):
         return " ".join(p for p in parts if p)
 
 
+# поиск подстрокой в Postgres; в SQLite — FTS5 customers_fts (см. миграцию)
+db.Index(
+    'ix_customers_search_name_trgm',
+    Customer.search_name,
+    postgresql_using='gin',
+    postgresql_ops={'search_name': 'gin_trgm_ops'},
+).ddl_if(dialect='postgresql')
+db.Index(
+    'ix_customers_phone_e164_trgm',
+    Customer.phone_e164,
+    postgresql_using='gin',
+    postgresql_ops={'phone_e164': 'gin_trgm_ops'},
+).ddl_if(dialect='postgresql')
+
+
+@event.listens_for(Customer, 'before_insert')
+@event.listens_for(Customer, 'before_update')
+def _customer_search_fields(mapper, connection, target):
+    target.search_name = build_person_text(target.last_name, target.first_name, target.middle_name)
+    target.phone_e164 = normalize_phone(target.phone)
+
+
 class Employee(db.Model, TimestampMixin):
     __tablename__ = 'employees'
 
@@ -119,6 +227,9 @@ class Employee(db.Model, TimestampMixin):
 
     role = db.Column(db.String(32), nullable=False, default='manager')
 
+    # нормализованное ФИО для поиска (см. search.person_match)
+    search_name = db.Column(db.String(200), nullable=True, index=True)
+
     sales = db.relationship('Sale', back_populates='employee', cascade='all, delete-orphan')
 
     @property
@@ -127,6 +238,20 @@ class Employee(db.Model, TimestampMixin):
         return " ".join(p for p in parts if p)
 
 
+db.Index(
+    'ix_employees_search_name_trgm',
+    Employee.search_name,
+    postgresql_using='gin',
+    postgresql_ops={'search_name': 'gin_trgm_ops'},
+).ddl_if(dialect='postgresql')
+
+
+@event.listens_for(Employee, 'before_insert')
+@event.listens_for(Employee, 'before_update')
+def _employee_search_name(mapper, connection, target):
+    target.search_name = build_person_text(target.last_name, target.first_name, target.middle_name)
+
+
 class Sale(db.Model, TimestampMixin):
     __tablename__ = 'sales'
 
@@ -137,6 +262,8 @@ class Sale(db.Model, TimestampMixin):
 
     sale_date = db.Column(db.Date, nullable=False, default=datetime.utcnow)
     price = db.Column(db.Numeric(12, 2), nullable=False)
+    # цена в базовой валюте по курсу на момент записи — для отчётов (см. rollups.py)
+    price_base = db.Column(db.Numeric(14, 2), nullable=True)
     payment_method = db.Column(db.String(32), default='cash')
 
     car = db.relationship('Car', back_populates='sales')
@@ -144,21 +271,155 @@ class Sale(db.Model, TimestampMixin):
     employee = db.relationship('Employee', back_populates='sales')
 
 
+@event.listens_for(Sale, 'before_insert')
+@event.listens_for(Sale, 'before_update')
+def _sale_price_base(mapper, connection, target):
+    # цена сделки — в валюте машины
+    state = inspect(target)
+    if state.persistent and not (state.attrs.price.history.has_changes()
+                                 or state.attrs.car_id.history.has_changes()):
+        return
+    rate = connection.execute(
+        select(ExchangeRate.rate)
+        .join(Car, Car.currency == ExchangeRate.currency)
+        .where(Car.id == target.car_id)
+    ).scalar()
+    if rate is None or target.price is None:
+        target.price_base = None
+    else:
+        target.price_base = (Decimal(str(target.price)) * rate).quantize(Decimal('0.01'))
+
+
 class Inquiry(db.Model, TimestampMixin):
     __tablename__ = "inquiries"
+    __table_args__ = (
+        # страницы списка Go-сервиса: фильтр по участнику, новые сверху (created_at, id)
+        db.Index('ix_inquiries_buyer_created_at_id', 'buyer_id', db.text('created_at DESC'), db.text('id DESC')),
+        db.Index('ix_inquiries_seller_created_at_id', 'seller_id', db.text('created_at DESC'), db.text('id DESC')),
+        # те же индексы объявлены тегами GORM в go-inquiries/main.go (AutoMigrate):
+        # имена совпадают, чтобы ни одна сторона не создала дубль и не удалила чужой.
+        # Валидатор списка для условного GET — max(updated_at) по участнику.
+        db.Index('idx_inquiries_buyer_updated', 'buyer_id', 'updated_at'),
+        db.Index('idx_inquiries_seller_updated', 'seller_id', 'updated_at'),
+        db.Index('idx_inquiries_client_ref', 'client_ref', unique=True),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
 
     car_id = db.Column(db.Integer, db.ForeignKey('cars.id'), nullable=False, index=True)
-    buyer_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
-    seller_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    buyer_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    seller_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
 
     message = db.Column(db.Text, nullable=False)
     preferred_time = db.Column(db.DateTime, nullable=True)
     contact_phone = db.Column(db.String(32), nullable=True)
     status = db.Column(db.String(16), nullable=False, default='new')  # new|accepted|declined|done
+    # ключ идемпотентности заявки из outbox (InquiryOutbox.client_ref); пишет Go-сервис
+    client_ref = db.Column(db.String(64), nullable=True)
 
     # связи
     car = db.relationship('Car', backref=db.backref('inquiries', lazy='dynamic'))
     buyer = db.relationship('User', foreign_keys=[buyer_id])
     seller = db.relationship('User', foreign_keys=[seller_id])
+
+
+class InquiryOutbox(db.Model):
+    """
+    Заявка покупателя, ещё не доставленная в Go-сервис (см. outbox.py).
+    Пишется в той же транзакции, что и запрос покупателя; client_ref —
+    ключ идемпотентности на стороне сервиса.
+    """
+    __tablename__ = "inquiry_outbox"
+    __table_args__ = (
+        # диспетчер берёт голову очереди: ожидающие по порядку id
+        db.Index('ix_inquiry_outbox_status_id', 'status', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)  # порядок доставки
+    client_ref = db.Column(db.String(64), unique=True, nullable=False)
+    buyer_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    car_id = db.Column(db.Integer, nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+
+    status = db.Column(db.String(16), nullable=False, default='pending')  # pending | sent | failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text, nullable=True)
+    remote_id = db.Column(db.Integer, nullable=True)  # id заявки в Go-сервисе
+
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+
+class ExchangeRate(db.Model):
+    """Курс валюты к базовой (RUB): сколько рублей стоит 1 единица."""
+    __tablename__ = "exchange_rates"
+
+    currency = db.Column(db.String(3), primary_key=True)
+    rate = db.Column(db.Numeric(18, 6), nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class RemoteImage(db.Model):
+    """Скачанная копия внешнего фото Car.image_url; см. remote_images.py."""
+    __tablename__ = "remote_images"
+
+    url = db.Column(db.String(255), primary_key=True)
+    image_path = db.Column(db.String(255), nullable=True, index=True)  # в том же хранилище, что и загрузки
+    status = db.Column(db.String(16), nullable=False, default='pending')  # pending | ok | error
+    error = db.Column(db.String(255), nullable=True)
+    failures = db.Column(db.Integer, nullable=False, default=0)
+
+    # для условных запросов при обновлении
+    etag = db.Column(db.String(255), nullable=True)
+    last_modified = db.Column(db.String(64), nullable=True)
+
+    fetched_at = db.Column(db.DateTime, nullable=True)  # когда последний раз получили содержимое
+    checked_at = db.Column(db.DateTime, nullable=True)  # когда последний раз ходили на источник
+
+
+def _remote_image_tags(img):
+    # страницы меняются, только когда меняется сам файл или его доступность
+    state = inspect(img)
+    if not (state.attrs.image_path.history.has_changes() or state.attrs.status.history.has_changes()):
+        return []
+    car_ids = state.session.connection().execute(select(Car.id).where(Car.image_url == img.url)).scalars()
+    return ['catalog', *(f'car:{car_id}' for car_id in car_ids)]
+
+
+track_tags(RemoteImage, _remote_image_tags)
+
+
+# ---- Служебные таблицы ----
+class CacheTag(db.Model):
+    """Версия тега кэша; см. cache.py."""
+    __tablename__ = "cache_tags"
+
+    tag = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=1)
+
+
+class EntityCounter(db.Model):
+    """
+    Число записей в таблице для главной страницы; см. counters.py.
+    Счётчик разбит на сегменты (shard), значение — их сумма.
+    """
+    __tablename__ = "entity_counters"
+
+    name = db.Column(db.String(32), primary_key=True)
+    shard = db.Column(db.SmallInteger, primary_key=True, default=0, server_default='0')
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+class SalesRollup(db.Model):
+    """
+    Сделки и выручка за месяц в разрезе: dimension = month | employee | brand | payment,
+    key — id сотрудника, марка или способ оплаты ('' для month). См. rollups.py.
+    """
+    __tablename__ = "sales_rollups"
+
+    period = db.Column(db.Date, primary_key=True)  # первое число месяца
+    dimension = db.Column(db.String(16), primary_key=True)
+    key = db.Column(db.String(64), primary_key=True)
+    deals = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(16, 2), nullable=False, default=0)  # в базовой валюте
@@ -0,0 +1,152 @@
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import select
+
+from extensions import db
+from models import InquiryOutbox
+from services.inquiries_client import InquiriesUnavailable, InquiryRejected, create_inquiries_batch
+
+outbox_cli = AppGroup('outbox', help='Доставка заявок покупателей в сервис заявок.')
+
+# Заявка покупателя не уходит в Go-сервис из запроса: она пишется строкой
+# inquiry_outbox в той же транзакции, и покупатель сразу получает ответ.
+# Диспетчер (`flask outbox dispatch --loop`, отдельный процесс) забирает
+# ожидающие строки по возрастанию id и отправляет пакетом в
+# /api/inquiries/batch. Порядок сохраняется: если голова очереди ждёт
+# повтора, ждёт и всё, что за ней. Повтор безопасен — сервис не создаёт
+# второй заявки с тем же client_ref. Окончательна только ошибка в самой
+# заявке (ошибка элемента в ответе или 400/422): строка уходит в failed и
+# очередь не держит. Прочие отказы (ключ, 404, 429, 5xx) — повтор позже.
+
+PENDING, SENT, FAILED = 'pending', 'sent', 'failed'
+
+
+def enqueue(payload: dict) -> InquiryOutbox:
+    """Добавить заявку в outbox текущей сессии (коммит — за вызывающим)."""
+    item = InquiryOutbox(
+        client_ref=uuid.uuid4().hex,
+        buyer_id=payload['buyer_id'],
+        car_id=payload['car_id'],
+        payload=payload,
+    )
+    db.session.add(item)
+    return item
+
+
+def _backoff(attempts: int) -> float:
+    """Экспоненциальная пауза со случайной добавкой: 1, 2, 4 ... до OUTBOX_MAX_BACKOFF секунд."""
+    cap = min(current_app.config['OUTBOX_MAX_BACKOFF'], 2 ** (attempts - 1))
+    return random.uniform(cap / 2, cap)
+
+
+def _head(limit: int) -> list[InquiryOutbox]:
+    stmt = select(InquiryOutbox).where(InquiryOutbox.status == PENDING).order_by(InquiryOutbox.id).limit(limit)
+    if db.session.get_bind().dialect.name == 'postgresql':
+        # второй диспетчер ждёт на блокировке, а не шлёт те же строки вне очереди
+        stmt = stmt.with_for_update()
+    return list(db.session.execute(stmt).scalars())
+
+
+def _send(batch: list[InquiryOutbox]) -> list[dict]:
+    return create_inquiries_batch([{**item.payload, 'client_ref': item.client_ref} for item in batch])
+
+
+def _postpone(batch, error: str, now: datetime):
+    delay = None
+    for item in batch:
+        item.attempts += 1
+        item.last_error = error[:1000]
+        # пакет повторяется целиком, поэтому пауза — по голове очереди
+        delay = delay if delay is not None else _backoff(item.attempts)
+        item.next_attempt_at = now + timedelta(seconds=delay)
+
+
+def dispatch_once(batch_size: int) -> tuple[int, int]:
+    """
+    Отправить один пакет из головы очереди. Возвращает (доставлено, отвергнуто);
+    (0, 0) — нечего отправлять или голова ждёт повтора.
+    """
+    now = datetime.utcnow()
+    batch = _head(batch_size)
+    if not batch or batch[0].next_attempt_at > now:
+        db.session.rollback()
+        return 0, 0
+    try:
+        try:
+            results = _send(batch)
+        except InquiryRejected:
+            if len(batch) == 1:
+                raise
+            # сервис отверг пакет целиком (например, неполная заявка) — выясняем, какая
+            batch = batch[:1]
+            results = _send(batch)
+    except InquiriesUnavailable as e:
+        _postpone(batch, str(e), now)
+        db.session.commit()
+        return 0, 0
+    except InquiryRejected as e:
+        # 400/422 на одну заявку: повторять бессмысленно
+        results = [{'client_ref': batch[0].client_ref, 'error': str(e)}]
+    except Exception:
+        # снимаем блокировку головы очереди, прежде чем упасть
+        db.session.rollback()
+        raise
+
+    by_ref = {r.get('client_ref'): r for r in results}
+    sent = failed = 0
+    for item in batch:
+        result = by_ref.get(item.client_ref)
+        item.attempts += 1
+        if result is None:
+            # нет в ответе — оставляем в очереди до следующего прохода
+            continue
+        if result.get('error'):
+            item.status = FAILED
+            item.last_error = result['error'][:1000]
+            failed += 1
+        else:
+            item.status = SENT
+            item.remote_id = result.get('id')
+            item.sent_at = now
+            item.last_error = None
+            sent += 1
+    db.session.commit()
+    return sent, failed
+
+
+@outbox_cli.command('dispatch')
+@click.option('--loop', is_flag=True, help='Работать постоянно (для отдельного контейнера).')
+@click.option('--batch', 'batch_size', type=int, help='Размер пакета (по умолчанию OUTBOX_BATCH_SIZE).')
+@click.option('--interval', type=float, help='Пауза, когда очередь пуста, секунды (по умолчанию OUTBOX_POLL_INTERVAL).')
+def dispatch_command(loop, batch_size, interval):
+    """Доставить ожидающие заявки в сервис заявок."""
+    batch_size = batch_size or current_app.config['OUTBOX_BATCH_SIZE']
+    interval = interval if interval is not None else current_app.config['OUTBOX_POLL_INTERVAL']
+    total_sent = total_failed = 0
+    while True:
+        try:
+            sent, failed = dispatch_once(batch_size)
+        except Exception as e:
+            if not loop:
+                raise
+            # например, таблицы ещё нет: web не успел применить миграции
+            db.session.rollback()
+            click.echo(f"Ошибка доставки: {e!r}", err=True)
+            time.sleep(interval)
+            continue
+        total_sent += sent
+        total_failed += failed
+        if loop and sent + failed:
+            click.echo(f"Доставлено: {sent}, отвергнуто: {failed}")
+        if sent + failed == batch_size:
+            continue  # очередь, вероятно, не пуста — следующий пакет сразу
+        if not loop:
+            break
+        time.sleep(interval)
+    click.echo(f"Доставлено: {total_sent}, отвергнуто: {total_failed}")
@@ -0,0 +1,78 @@
+import hashlib
+from collections import namedtuple
+from functools import wraps
+
+from flask import current_app, request, session
+from flask_login import current_user
+
+from cache import LocalCache, tag_versions
+
+# Готовые страницы для анонимных посетителей. Запись помечена тегами
+# («catalog», «car:42»); запись в БД поднимает версии тегов (cache.py),
+# и при следующем обращении страница с устаревшими версиями рендерится
+# заново — во всех воркерах сразу. TTL лишь ограничивает память.
+
+_Page = namedtuple('_Page', 'body content_type etag versions')
+
+_pages = None
+
+
+def _store() -> LocalCache:
+    global _pages
+    if _pages is None:
+        cfg = current_app.config
+        _pages = LocalCache(maxsize=cfg['PAGE_CACHE_MAXSIZE'], ttl=cfg['PAGE_CACHE_TTL'])
+    return _pages
+
+
+def _cacheable() -> bool:
+    # залогиненным — свои кнопки в шаблонах; ожидающий flash() должен быть показан
+    return (
+        current_app.config['PAGE_CACHE_ENABLED']
+        and request.method in ('GET', 'HEAD')
+        and not current_user.is_authenticated
+        and not session.get('_flashes')
+    )
+
+
+def _respond(page: _Page, hit: bool):
+    resp = current_app.response_class(page.body, status=200, content_type=page.content_type)
+    resp.set_etag(page.etag)
+    # общие прокси не должны отдавать анонимную версию залогиненному
+    resp.headers['Cache-Control'] = 'private, no-cache'
+    resp.vary.add('Cookie')
+    resp.headers['X-Page-Cache'] = 'HIT' if hit else 'MISS'
+    return resp.make_conditional(request)
+
+
+def cached_page(tags):
+    """
+    Кэшировать ответ view для анонимных GET по полному URL.
+    tags — список тегов или функция от аргументов view, возвращающая список.
+    Поддерживается ETag/If-None-Match (304).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not _cacheable():
+                return view(*args, **kwargs)
+
+            key = request.full_path
+            page_tags = tags(**kwargs) if callable(tags) else tags
+            # версии читаем до рендера: если запись случится во время рендера,
+            # сохранённая страница сразу окажется устаревшей, а не наоборот
+            versions = tag_versions(page_tags)
+            store = _store()
+            page = store.get(key)
+            if page is not None and page.versions == versions:
+                return _respond(page, hit=True)
+
+            resp = current_app.make_response(view(*args, **kwargs))
+            if resp.status_code != 200 or resp.is_streamed or session.modified:
+                return resp
+            body = resp.get_data()
+            page = _Page(body, resp.content_type, hashlib.sha1(body).hexdigest(), versions)
+            store.set(key, page)
+            return _respond(page, hit=False)
+        return wrapper
+    return decorator
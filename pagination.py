@@ -0,0 +1,155 @@
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from sqlalchemy import literal, tuple_
+
+
+class KeysetPage:
+    """Одна страница keyset-пагинации: элементы + курсоры соседних страниц."""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None, per_page=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.per_page = per_page
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self) -> bool:
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+# ---- курсоры ----
+
+def _dump_value(v):
+    if isinstance(v, datetime):
+        return {"dt": v.isoformat()}
+    if isinstance(v, date):
+        return {"d": v.isoformat()}
+    if isinstance(v, Decimal):
+        return {"dec": str(v)}
+    return v
+
+
+def _load_value(v):
+    if isinstance(v, dict):
+        if "dt" in v:
+            return datetime.fromisoformat(v["dt"])
+        if "d" in v:
+            return date.fromisoformat(v["d"])
+        if "dec" in v:
+            return Decimal(v["dec"])
+        raise ValueError("unknown cursor value")
+    return v
+
+
+def encode_cursor(values, direction: str) -> str:
+    """Упаковать значения ключа сортировки в непрозрачную строку для URL."""
+    raw = json.dumps({"k": [_dump_value(v) for v in values], "d": direction}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """Вернуть (values, direction) или None, если курсор битый."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        direction = data["d"]
+        if direction not in ("next", "prev"):
+            return None
+        return [_load_value(v) for v in data["k"]], direction
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def _fits(value, sql_type) -> bool:
+    """Значение из курсора годится для параметра типа sql_type (None — всегда)."""
+    if value is None:
+        return True
+    try:
+        expected = sql_type.python_type
+    except NotImplementedError:
+        return True
+    if isinstance(value, bool):
+        return expected is bool
+    if expected in (float, Decimal):
+        return isinstance(value, (int, float, Decimal))
+    return isinstance(value, expected)
+
+
+# ---- выборка ----
+
+def keyset_paginate(query, keys, cursor=None, per_page=20, descending=True):
+    """
+    Страница результатов по ключу сортировки без OFFSET.
+
+    keys — список пар (имя атрибута элемента, SQL-выражение), последний ключ
+    должен быть уникальным (обычно id). Все ключи сортируются в одном
+    направлении, поэтому сравнение сводится к одному кортежному условию
+    (created_at, id) < (:c, :i), которое обслуживается составным индексом,
+    и глубина листания не влияет на стоимость запроса.
+    """
+    names = [name for name, _ in keys]
+    exprs = [expr for _, expr in keys]
+
+    decoded = decode_cursor(cursor)
+    if decoded and (len(decoded[0]) != len(keys)
+                    or not all(_fits(v, e.type) for v, e in zip(decoded[0], exprs))):
+        # курсор от другой сортировки или подделанный — первая страница
+        decoded = None
+    direction = decoded[1] if decoded else "next"
+
+    # при движении назад идём в обратном порядке, затем разворачиваем
+    forward = descending if direction == "next" else not descending
+    if decoded:
+        row_key = tuple_(*exprs)
+        # типизированные параметры: иначе SQLite сравнит даты как строки другого вида
+        bound = tuple_(*(literal(v, e.type) for v, e in zip(decoded[0], exprs)))
+        query = query.filter(row_key < bound if forward else row_key > bound)
+
+    order = [e.desc() if forward else e.asc() for e in exprs]
+    rows = query.order_by(None).order_by(*order).limit(per_page + 1).all()
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if direction == "prev":
+        rows.reverse()
+
+    def key_of(item):
+        return [getattr(item, n) for n in names]
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if direction == "next":
+            if has_more:
+                next_cursor = encode_cursor(key_of(rows[-1]), "next")
+            if decoded:
+                prev_cursor = encode_cursor(key_of(rows[0]), "prev")
+        else:
+            next_cursor = encode_cursor(key_of(rows[-1]), "next")
+            if has_more:
+                prev_cursor = encode_cursor(key_of(rows[0]), "prev")
+
+    return KeysetPage(rows, next_cursor=next_cursor, prev_cursor=prev_cursor, per_page=per_page)
+
+
+def page_size(value, default: int, maximum: int) -> int:
+    """Разобрать ?per_page= с ограничением сверху."""
+    try:
+        n = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(n, maximum))
@@ -0,0 +1,134 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+passwords_cli = AppGroup('passwords', help='Хэширование паролей.')
+
+# Хэш пароля (scrypt) — сотни миллисекунд CPU. Считаем его в отдельных
+# процессах: поток gunicorn-воркера ждёт результат, не держа GIL, и
+# остальные запросы воркера продолжают обслуживаться. Размер пула
+# ограничивает, сколько ядер могут одновременно уйти на хэши.
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+class PasswordHashUnavailable(RuntimeError):
+    """Хэш не посчитан: пул не отвечает дольше PASSWORD_HASH_TIMEOUT или не поднимается."""
+
+
+def _get_pool(workers: int):
+    # пул создаётся лениво и заново после fork (gunicorn --preload)
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            # spawn: дочерним процессам не нужны копии соединений и потоков воркера
+            ctx = multiprocessing.get_context('spawn')
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=ctx)
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _drop_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _call(fn, *args):
+    cfg = current_app.config
+    workers = cfg['PASSWORD_HASH_WORKERS']
+    if workers <= 0:
+        return fn(*args)  # без пула, например в тестах
+    for attempt in range(2):
+        pool = _get_pool(workers)
+        try:
+            future = pool.submit(fn, *args)
+            return future.result(timeout=cfg['PASSWORD_HASH_TIMEOUT'])
+        except BrokenProcessPool:
+            # процесс пула умер (например, OOM на scrypt): такой пул отказывает
+            # во всех следующих вызовах — создаём новый и пробуем ещё раз
+            _drop_pool(pool)
+        except FutureTimeout:
+            future.cancel()
+            raise PasswordHashUnavailable('хэш пароля считается слишком долго') from None
+    raise PasswordHashUnavailable('пул хэширования паролей не работает')
+
+
+def hash_password(password: str) -> str:
+    return _call(generate_password_hash, password, current_app.config['PASSWORD_HASH_METHOD'])
+
+
+def verify_password(pwhash: str, password: str) -> bool:
+    return _call(check_password_hash, pwhash, password)
+
+
+def _method_params(method: str) -> tuple:
+    """
+    Метод с параметрами по умолчанию werkzeug: «scrypt» → (scrypt, 32768, 8, 1),
+    «pbkdf2» → (pbkdf2, sha256, <итераций>). В хэше werkzeug пишет их явно.
+    """
+    name, *params = method.split(':')
+    defaults = {
+        'scrypt': ['32768', '8', '1'],  # n, r, p
+        'pbkdf2': ['sha256', str(DEFAULT_PBKDF2_ITERATIONS)],
+    }.get(name, [])
+    return (name, *params, *defaults[len(params):])
+
+
+def needs_rehash(pwhash: str) -> bool:
+    """Хэш посчитан не тем методом или не с теми параметрами, что в Config."""
+    method = pwhash.split('$', 1)[0]
+    return _method_params(method) != _method_params(current_app.config['PASSWORD_HASH_METHOD'])
+
+
+@passwords_cli.command('bench')
+@click.option('--workers', default='1,2,4', show_default=True, help='Размеры пула через запятую.')
+@click.option('--seconds', default=5.0, show_default=True, help='Длительность каждого прогона.')
+@click.option('--method', default=None, help='Метод хэша (по умолчанию PASSWORD_HASH_METHOD).')
+def bench_command(workers, seconds, method):
+    """Сколько проверок пароля (логинов) в секунду выдерживает пул."""
+    global _pool
+    cfg = current_app.config
+    method = method or cfg['PASSWORD_HASH_METHOD']
+    pwhash = generate_password_hash('benchmark-password', method)
+    click.echo(f"Метод: {method}")
+    saved = cfg['PASSWORD_HASH_WORKERS']
+    try:
+        for n in (int(w) for w in workers.split(',')):
+            cfg['PASSWORD_HASH_WORKERS'] = n
+            with _pool_lock:
+                if _pool is not None:
+                    _pool.shutdown()
+                _pool = None
+            deadline = time.monotonic() + seconds
+
+            def login(app=current_app._get_current_object()):
+                # столько потоков, сколько процессов в пуле: как n одновременных логинов
+                count = 0
+                with app.app_context():
+                    while time.monotonic() < deadline:
+                        verify_password(pwhash, 'benchmark-password')
+                        count += 1
+                return count
+
+            started = time.monotonic()
+            with ThreadPoolExecutor(max_workers=max(n, 1)) as threads:
+                futures = [threads.submit(login) for _ in range(max(n, 1))]
+                done = sum(f.result() for f in futures)
+            elapsed = time.monotonic() - started
+            click.echo(f"workers={n}\t{done / elapsed:.1f} логинов/с")
+    finally:
+        cfg['PASSWORD_HASH_WORKERS'] = saved
@@ -0,0 +1,79 @@
+import logging
+import time
+from collections import Counter
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+log = logging.getLogger(__name__)
+
+# Счётчик SQL-запросов на HTTP-запрос (для разработки и тестов, SQL_QUERY_COUNTER).
+# Одинаковый текст запроса, выполненный много раз с разными параметрами, —
+# почти всегда ленивая загрузка связи в цикле шаблона (N+1).
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(limit: int):
+    """Отметить view допустимым числом SQL-запросов на один HTTP-запрос."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            g.sql_budget = limit
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _on_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'sql_stats' in g:
+        g.sql_stats[statement] += 1
+
+
+def _enabled(setting) -> bool:
+    value = current_app.config[setting]
+    return current_app.debug or current_app.testing if value is None else value
+
+
+def _start():
+    if not _enabled('SQL_QUERY_COUNTER'):
+        return
+    g.sql_stats = Counter()
+    g.sql_started = time.perf_counter()
+
+
+def _report(response):
+    stats = g.pop('sql_stats', None)
+    if stats is None:
+        return response
+    cfg = current_app.config
+    total = sum(stats.values())
+    elapsed = (time.perf_counter() - g.pop('sql_started')) * 1000
+    response.headers['X-SQL-Queries'] = str(total)
+
+    problems = []
+    repeated = [(n, sql) for sql, n in stats.items() if n >= cfg['SQL_REPEAT_THRESHOLD']]
+    for n, sql in sorted(repeated, reverse=True):
+        problems.append(f"запрос повторён {n} раз (N+1?): {' '.join(sql.split())[:300]}")
+    budget = g.pop('sql_budget', None)
+    if budget is not None and total > budget:
+        problems.append(f"{total} SQL-запросов при бюджете {budget}")
+
+    if problems:
+        message = f"{request.method} {request.path} ({request.endpoint}, {elapsed:.0f} мс): " + "; ".join(problems)
+        log.warning(message)
+        if _enabled('SQL_QUERY_BUDGET_RAISE') and budget is not None and total > budget:
+            raise QueryBudgetExceeded(message)
+    return response
+
+
+def init_app(app):
+    """Подключить счётчик; включается SQL_QUERY_COUNTER (по умолчанию — в debug и testing)."""
+    if not event.contains(Engine, 'before_cursor_execute', _on_execute):
+        event.listen(Engine, 'before_cursor_execute', _on_execute)
+    app.before_request(_start)
+    app.after_request(_report)
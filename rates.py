@@ -0,0 +1,87 @@
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import func, select
+
+from cache import bump_tags
+from extensions import db
+from models import Car, ExchangeRate
+
+rates_cli = AppGroup('rates', help='Курсы валют и пересчёт цен в базовую валюту.')
+
+
+def price_base_expr(currency_col, price_col):
+    """SQL: цена в базовой валюте по курсу из exchange_rates."""
+    rate = (
+        select(ExchangeRate.rate)
+        .where(ExchangeRate.currency == currency_col)
+        .scalar_subquery()
+    )
+    return func.round(price_col * rate, 2)
+
+
+def recompute_prices(currency: str = None) -> int:
+    """
+    Пересчитать Car.price_base одним UPDATE (для одной валюты или всех).
+    Возвращает число затронутых строк; транзакцию коммитит вызывающий.
+    """
+    stmt = db.update(Car).values(price_base=price_base_expr(Car.currency, Car.price))
+    if currency:
+        stmt = stmt.where(Car.currency == currency)
+    # массовый UPDATE идёт мимо ORM-событий, поэтому кэш каталога сбрасываем сами
+    res = db.session.execute(stmt.execution_options(synchronize_session=False))
+    bump_tags(db.session, ['catalog'])
+    return res.rowcount
+
+
+def set_rate(currency: str, rate) -> int:
+    """Сохранить курс (RUB за 1 единицу валюты) и пересчитать цены этой валюты."""
+    currency = currency.upper()
+    if currency == current_app.config['BASE_CURRENCY']:
+        raise ValueError('Курс базовой валюты всегда равен 1')
+    row = db.session.get(ExchangeRate, currency)
+    if row is None:
+        row = ExchangeRate(currency=currency)
+        db.session.add(row)
+    row.rate = rate
+    row.updated_at = datetime.utcnow()
+    db.session.flush()
+    count = recompute_prices(currency)
+    db.session.commit()
+    return count
+
+
+@rates_cli.command('list')
+def list_rates():
+    """Показать текущие курсы."""
+    for r in ExchangeRate.query.order_by(ExchangeRate.currency):
+        click.echo(f"{r.currency}\t{r.rate}\t{r.updated_at or '—'}")
+
+
+@rates_cli.command('set')
+@click.argument('currency')
+@click.argument('rate')
+def set_rate_command(currency, rate):
+    """Задать курс: flask rates set USD 92.35"""
+    try:
+        value = Decimal(rate)
+    except InvalidOperation:
+        raise click.BadParameter('курс должен быть числом', param_hint='RATE')
+    if value <= 0:
+        raise click.BadParameter('курс должен быть положительным', param_hint='RATE')
+    try:
+        count = set_rate(currency, value)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"{currency.upper()} = {value}; пересчитано машин: {count}")
+
+
+@rates_cli.command('recompute')
+def recompute_command():
+    """Пересчитать price_base у всех машин."""
+    count = recompute_prices()
+    db.session.commit()
+    click.echo(f"Пересчитано машин: {count}")
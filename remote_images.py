@@ -0,0 +1,253 @@
+import ipaddress
+import logging
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urljoin, urlsplit
+
+import click
+import requests
+from flask import current_app
+from flask.cli import AppGroup
+from PIL import Image
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from images import generate_variants, get_pool
+from models import Car, RemoteImage
+from storage import UploadTooLarge, release, save_chunks
+
+log = logging.getLogger(__name__)
+
+remote_images_cli = AppGroup('remote-images', help='Локальные копии внешних фото машин (Car.image_url).')
+
+# Content-Type источника -> расширение файла в хранилище
+CONTENT_TYPES = {
+    'image/jpeg': 'jpg',
+    'image/png': 'png',
+    'image/webp': 'webp',
+    'image/gif': 'gif',
+}
+_MAX_REDIRECTS = 3
+_CHUNK = 64 * 1024
+_USER_AGENT = 'autosalon-image-cache/1.0'
+
+# адреса, которые этот процесс уже скачивает, — чтобы страница из 20 машин
+# с одним и тем же фото не ставила 20 одинаковых задач
+_in_flight = set()
+_in_flight_lock = threading.Lock()
+
+
+class FetchError(Exception):
+    pass
+
+
+def _check_url(url: str):
+    """Только http(s) и только публичные адреса: продавец не должен заставить сервер ходить во внутреннюю сеть."""
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise FetchError('нужен адрес http(s)')
+    if current_app.config['REMOTE_IMAGES_ALLOW_PRIVATE']:
+        return
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+    try:
+        infos = socket.getaddrinfo(parts.hostname, port, proto=socket.IPPROTO_TCP)
+    except socket.gaierror:
+        raise FetchError(f'не удалось разрешить {parts.hostname}')
+    for info in infos:
+        if not ipaddress.ip_address(info[4][0]).is_global:
+            raise FetchError(f'{parts.hostname}: адрес во внутренней сети')
+
+
+def _get(url: str, headers: dict, timeout: float):
+    """GET с ручным следованием редиректам — каждый новый адрес проверяется заново."""
+    for _ in range(_MAX_REDIRECTS + 1):
+        _check_url(url)
+        resp = requests.get(url, headers=headers, timeout=timeout, stream=True, allow_redirects=False)
+        if not resp.is_redirect:
+            return resp
+        resp.close()
+        url = urljoin(url, resp.headers['Location'])
+    raise FetchError('слишком много перенаправлений')
+
+
+def _until(chunks, deadline: float):
+    # таймаут requests — на каждую операцию с сокетом; медленный источник,
+    # отдающий по байту, ограничиваем общим временем скачивания
+    for chunk in chunks:
+        if time.monotonic() > deadline:
+            raise FetchError('превышено время скачивания')
+        yield chunk
+
+
+def _verify_image(path: str):
+    # Content-Type может врать — проверяем, что Pillow понимает файл
+    try:
+        with Image.open(path) as im:
+            im.verify()
+    except Exception:
+        raise FetchError('файл не является изображением')
+
+
+def fetch(img: RemoteImage):
+    """
+    Скачать фото img.url (или перепроверить уже скачанное условным запросом)
+    и обновить поля img. Транзакцию коммитит вызывающий.
+    Возвращает имя файла, на который запись больше не ссылается
+    (его нужно отдать storage.release после коммита), или None.
+    """
+    cfg = current_app.config
+    timeout = cfg['REMOTE_IMAGES_TIMEOUT']
+    headers = {'User-Agent': _USER_AGENT, 'Accept': ', '.join(CONTENT_TYPES)}
+    if img.image_path:
+        if img.etag:
+            headers['If-None-Match'] = img.etag
+        if img.last_modified:
+            headers['If-Modified-Since'] = img.last_modified
+
+    now = datetime.utcnow()
+    img.checked_at = now
+    old = img.image_path
+    try:
+        resp = _get(img.url, headers, timeout)
+        with resp:
+            if resp.status_code == 304 and old:
+                name = old
+            else:
+                if resp.status_code != 200:
+                    raise FetchError(f'HTTP {resp.status_code}')
+                ctype = resp.headers.get('Content-Type', '').split(';')[0].strip().lower()
+                ext = CONTENT_TYPES.get(ctype)
+                if ext is None:
+                    raise FetchError(f'неподходящий Content-Type: {ctype or "—"}')
+                max_bytes = cfg['REMOTE_IMAGES_MAX_BYTES']
+                length = resp.headers.get('Content-Length', '')
+                if length.isdigit() and int(length) > max_bytes:
+                    raise UploadTooLarge(f'больше {max_bytes} байт')
+                name = save_chunks(
+                    _until(resp.iter_content(_CHUNK), time.monotonic() + timeout),
+                    ext, max_bytes=max_bytes, check=_verify_image,
+                )
+                img.etag = resp.headers.get('ETag')
+                img.last_modified = resp.headers.get('Last-Modified')
+                img.fetched_at = now
+    except (requests.RequestException, FetchError, UploadTooLarge) as e:
+        img.failures = (img.failures or 0) + 1
+        img.error = str(e)[:255]
+        # уже скачанную копию продолжаем показывать, пока источник не починится
+        if not old:
+            img.status = 'error'
+        return None
+
+    img.image_path = name
+    img.status = 'ok'
+    img.error = None
+    img.failures = 0
+    return old if old and old != name else None
+
+
+def is_due(img, now: datetime = None) -> bool:
+    """Пора ли (пере)скачивать: нет записи, копия старше TTL или ошибка и истекла пауза."""
+    if img is None or img.checked_at is None:
+        return True
+    ttl = current_app.config['REMOTE_IMAGES_TTL']
+    if img.status == 'error':
+        # экспоненциальная пауза между повторами, но не дольше обычного TTL
+        delay = min(ttl, 60 * 2 ** min(img.failures or 0, 16))
+    else:
+        delay = ttl
+    return img.checked_at + timedelta(seconds=delay) <= (now or datetime.utcnow())
+
+
+def refresh(url: str):
+    """Синхронно скачать/обновить копию url и сделать её превью."""
+    img = db.session.get(RemoteImage, url)
+    if img is None:
+        img = RemoteImage(url=url, status='pending', failures=0)
+        db.session.add(img)
+    stale = fetch(img)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # ту же картинку параллельно скачал другой воркер; наш файл подберёт `flask uploads gc`
+        db.session.rollback()
+        return None
+    if img.image_path:
+        generate_variants(current_app.config['UPLOAD_FOLDER'], img.image_path)
+    if stale:
+        release(stale)
+    return img
+
+
+def _run(app, url):
+    try:
+        with app.app_context():
+            refresh(url)
+    except Exception:
+        log.exception("не удалось обновить внешнее фото %s", url)
+    finally:
+        with _in_flight_lock:
+            _in_flight.discard(url)
+
+
+def schedule_refresh(url: str):
+    """Поставить скачивание в фоновый пул картинок, не задерживая запрос."""
+    if not url:
+        return
+    with _in_flight_lock:
+        if url in _in_flight:
+            return
+        _in_flight.add(url)
+    app = current_app._get_current_object()
+    get_pool(app.config['IMAGE_WORKERS']).submit(_run, app, url)
+
+
+def remote_image_path(car):
+    """
+    Для шаблонов: имя локальной копии car.image_url или None.
+    Отсутствующие и устаревшие копии обновляются в фоне — страница их не ждёт.
+    """
+    if not car.image_url:
+        return None
+    img = car.remote_image
+    if is_due(img):
+        schedule_refresh(car.image_url)
+    return img.image_path if img is not None else None
+
+
+@remote_images_cli.command('refresh')
+@click.option('--all', 'everything', is_flag=True, help='Перепроверить все копии, а не только устаревшие.')
+def refresh_command(everything):
+    """Скачать недостающие и обновить устаревшие копии внешних фото."""
+    urls = db.session.execute(
+        select(Car.image_url).where(Car.image_url.isnot(None), Car.image_url != '').distinct()
+    ).scalars().all()
+    known = {img.url: img for img in RemoteImage.query}
+    now = datetime.utcnow()
+    ok = failed = 0
+    for url in urls:
+        if not (everything or is_due(known.get(url), now)):
+            continue
+        img = refresh(url)
+        if img is not None and img.status == 'ok':
+            ok += 1
+        else:
+            failed += 1
+            click.echo(f"{url}: {img.error if img is not None else 'конфликт записи'}", err=True)
+    click.echo(f"Обновлено: {ok}, ошибок: {failed}")
+
+
+@remote_images_cli.command('prune')
+def prune_command():
+    """Удалить копии фото, на адреса которых больше не ссылается ни одна машина."""
+    used = select(Car.image_url).where(Car.image_url.isnot(None))
+    gone = RemoteImage.query.filter(RemoteImage.url.notin_(used)).all()
+    names = [img.image_path for img in gone if img.image_path]
+    for img in gone:
+        db.session.delete(img)
+    db.session.commit()
+    for name in names:
+        release(name)
+    click.echo(f"Удалено записей: {len(gone)}")
@@ -0,0 +1,239 @@
+from datetime import date
+from decimal import Decimal
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import Date, String, cast, event, func, inspect, literal, select
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import Car, Employee, Sale, SalesRollup
+
+rollups_cli = AppGroup('rollups', help='Сводки продаж для отчётов.')
+
+# Сводка хранит число сделок и выручку за месяц в нескольких разрезах.
+# Каждая вставка/удаление/правка Sale прибавляет или вычитает свой вклад
+# в той же транзакции, поэтому отчёты читают десятки строк сводки вместо
+# агрегирования всей таблицы sales. Разрез «по маркам» берёт текущую марку
+# машины, поэтому при смене Car.brand вклад её продаж переезжает к новой марке.
+
+DIMENSIONS = {
+    'month': 'По месяцам',
+    'employee': 'По сотрудникам',
+    'brand': 'По маркам',
+    'payment': 'По способу оплаты',
+}
+PAYMENT_LABELS = {'cash': 'Наличные', 'card': 'Карта', 'transfer': 'Перевод'}
+
+_WATCHED = ('sale_date', 'price_base', 'employee_id', 'car_id', 'payment_method')
+_DELTAS = 'sales_rollup_deltas'
+
+
+def month_start(d) -> date:
+    return date(d.year, d.month, 1)
+
+
+def _contribute(session, connection, values: dict, sign: int):
+    if values['sale_date'] is None:
+        return
+    brand = connection.execute(select(Car.brand).where(Car.id == values['car_id'])).scalar()
+    keys = {
+        'month': '',
+        'employee': str(values['employee_id']),
+        'brand': brand or '',
+        'payment': values['payment_method'] or '',
+    }
+    period = month_start(values['sale_date'])
+    revenue = Decimal(values['price_base'] or 0)
+    for dimension, key in keys.items():
+        _add(session, period, dimension, key, sign, revenue)
+
+
+def _add(session, period, dimension: str, key: str, sign: int, revenue: Decimal):
+    deltas = session.info.setdefault(_DELTAS, {})
+    deals, total = deltas.get((period, dimension, key), (0, Decimal(0)))
+    deltas[(period, dimension, key)] = (deals + sign, total + sign * revenue)
+
+
+def _current(target) -> dict:
+    return {name: getattr(target, name) for name in _WATCHED}
+
+
+@event.listens_for(Sale, 'after_insert')
+def _sale_inserted(mapper, connection, target):
+    _contribute(inspect(target).session, connection, _current(target), 1)
+
+
+@event.listens_for(Sale, 'after_delete')
+def _sale_deleted(mapper, connection, target):
+    _contribute(inspect(target).session, connection, _current(target), -1)
+
+
+@event.listens_for(Sale, 'after_update')
+def _sale_updated(mapper, connection, target):
+    attrs = inspect(target).attrs
+    if not any(attrs[name].history.has_changes() for name in _WATCHED):
+        return
+    old = {}
+    for name in _WATCHED:
+        hist = attrs[name].history
+        old[name] = hist.deleted[0] if hist.deleted else getattr(target, name)
+    session = inspect(target).session
+    _contribute(session, connection, old, -1)
+    _contribute(session, connection, _current(target), 1)
+
+
+@event.listens_for(Car, 'before_update')
+def _car_brand_changed(mapper, connection, target):
+    # машины пишутся раньше зависимых продаж, так что продажи этого же flush
+    # дальше прочитают уже новую марку и разойдутся с ней же
+    if not inspect(target).attrs.brand.history.has_changes():
+        return
+    # прежнее значение — из базы: у просроченного после коммита объекта
+    # история атрибута его не хранит
+    old = connection.execute(select(Car.brand).where(Car.id == target.id)).scalar() or ''
+    new = target.brand or ''
+    if old == new:
+        return
+    session = inspect(target).session
+    sales = connection.execute(
+        select(Sale.sale_date, Sale.price_base).where(Sale.car_id == target.id, Sale.sale_date.isnot(None)))
+    for sale_date, price_base in sales:
+        period = month_start(sale_date)
+        revenue = Decimal(price_base or 0)
+        _add(session, period, 'brand', old, -1, revenue)
+        _add(session, period, 'brand', new, 1, revenue)
+
+
+@event.listens_for(Session, 'before_flush')
+def _reset_deltas(session, flush_context, instances):
+    session.info.pop(_DELTAS, None)
+
+
+@event.listens_for(Session, 'after_flush')
+def _apply_deltas(session, flush_context):
+    deltas = session.info.pop(_DELTAS, None)
+    if not deltas:
+        return
+    rows = [
+        {'period': period, 'dimension': dimension, 'key': key, 'deals': deals, 'revenue': revenue}
+        for (period, dimension, key), (deals, revenue) in sorted(deltas.items())
+        if deals or revenue
+    ]
+    if rows:
+        _upsert(session.connection(), rows)
+
+
+def _upsert(connection, rows):
+    t = SalesRollup.__table__
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        for row in rows:
+            match = (t.c.period == row['period']) & (t.c.dimension == row['dimension']) & (t.c.key == row['key'])
+            res = connection.execute(t.update().where(match).values(
+                deals=t.c.deals + row['deals'], revenue=t.c.revenue + row['revenue']))
+            if not res.rowcount:
+                connection.execute(t.insert().values(**row))
+        return
+    stmt = insert(t).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[t.c.period, t.c.dimension, t.c.key],
+        set_={'deals': t.c.deals + stmt.excluded.deals, 'revenue': t.c.revenue + stmt.excluded.revenue},
+    )
+    connection.execute(stmt)
+
+
+# ---- полный пересчёт ----
+
+def _month_expr(dialect: str):
+    if dialect == 'postgresql':
+        return cast(func.date_trunc('month', Sale.sale_date), Date)
+    return func.date(Sale.sale_date, 'start of month')
+
+
+def rebuild():
+    """Пересчитать сводку целиком из sales (INSERT ... SELECT на каждый разрез)."""
+    t = SalesRollup.__table__
+    period = _month_expr(db.engine.dialect.name)
+    keys = {
+        'month': literal(''),
+        'employee': cast(Sale.employee_id, String),
+        'brand': func.coalesce(Car.brand, ''),
+        'payment': func.coalesce(Sale.payment_method, ''),
+    }
+    db.session.execute(t.delete())
+    for dimension, key in keys.items():
+        src = (
+            select(period, literal(dimension), key, func.count(), func.coalesce(func.sum(Sale.price_base), 0))
+            .select_from(Sale)
+            .outerjoin(Car, Car.id == Sale.car_id)
+            .where(Sale.sale_date.isnot(None))
+            .group_by(period, key)
+        )
+        db.session.execute(t.insert().from_select(['period', 'dimension', 'key', 'deals', 'revenue'], src))
+
+
+@rollups_cli.command('rebuild')
+def rebuild_command():
+    """Пересчитать сводки продаж (после загрузки данных в обход ORM)."""
+    rebuild()
+    db.session.commit()
+    click.echo(f"Строк в сводке: {SalesRollup.query.count()}")
+
+
+# ---- отчёт ----
+
+def report(dimension: str, date_from: date = None, date_to: date = None):
+    """
+    Строки отчёта [{key, label, deals, revenue, average}] и итог за период.
+    date_from/date_to — первые числа месяцев, включительно.
+    """
+    conds = [SalesRollup.dimension == dimension]
+    if date_from:
+        conds.append(SalesRollup.period >= date_from)
+    if date_to:
+        conds.append(SalesRollup.period <= date_to)
+
+    group = SalesRollup.period if dimension == 'month' else SalesRollup.key
+    deals = func.sum(SalesRollup.deals).label('deals')
+    revenue = func.sum(SalesRollup.revenue).label('revenue')
+    stmt = select(group.label('key'), deals, revenue).where(*conds).group_by(group).having(func.sum(SalesRollup.deals) > 0)
+    stmt = stmt.order_by(group) if dimension == 'month' else stmt.order_by(revenue.desc())
+    rows = db.session.execute(stmt).all()
+
+    labels = {}
+    if dimension == 'employee' and rows:
+        ids = [int(r.key) for r in rows if r.key.isdigit()]
+        labels = {
+            str(e.id): f"{e.full_name} — {e.role}"
+            for e in Employee.query.filter(Employee.id.in_(ids))
+        }
+
+    def label(key):
+        if dimension == 'month':
+            return key.strftime('%m.%Y') if hasattr(key, 'strftime') else str(key)
+        if dimension == 'employee':
+            return labels.get(key, f"#{key} (удалён)")
+        if dimension == 'payment':
+            return PAYMENT_LABELS.get(key, key or '—')
+        return key or '—'
+
+    items = [{
+        'key': r.key,
+        'label': label(r.key),
+        'deals': r.deals,
+        'revenue': Decimal(r.revenue or 0),
+        'average': Decimal(r.revenue or 0) / r.deals,
+    } for r in rows]
+    total_deals = sum(i['deals'] for i in items)
+    total_revenue = sum((i['revenue'] for i in items), Decimal(0))
+    total = {
+        'deals': total_deals,
+        'revenue': total_revenue,
+        'average': total_revenue / total_deals if total_deals else None,
+    }
+    return items, total
@@ -0,0 +1,264 @@
+import re
+import unicodedata
+
+from sqlalchemy import Double, and_, cast, column, func, literal_column, or_, select, table
+
+# ---- нормализация и транслитерация ----
+
+_CYR_TO_LAT = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ж': 'zh',
+    'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n',
+    'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f',
+    'х': 'kh', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch', 'ъ': '', 'ы': 'y',
+    'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+}
+
+# сначала многобуквенные сочетания, затем одиночные буквы
+_LAT_TO_CYR = [
+    ('sch', 'щ'), ('zh', 'ж'), ('kh', 'х'), ('ts', 'ц'), ('ch', 'ч'),
+    ('sh', 'ш'), ('yu', 'ю'), ('ya', 'я'),
+    ('a', 'а'), ('b', 'б'), ('c', 'к'), ('d', 'д'), ('e', 'е'), ('f', 'ф'),
+    ('g', 'г'), ('h', 'х'), ('i', 'и'), ('j', 'дж'), ('k', 'к'), ('l', 'л'),
+    ('m', 'м'), ('n', 'н'), ('o', 'о'), ('p', 'п'), ('q', 'к'), ('r', 'р'),
+    ('s', 'с'), ('t', 'т'), ('u', 'у'), ('v', 'в'), ('w', 'в'), ('x', 'кс'),
+    ('y', 'й'), ('z', 'з'),
+]
+_LAT_RE = re.compile('|'.join(src for src, _ in _LAT_TO_CYR))
+_LAT_MAP = dict(_LAT_TO_CYR)
+
+# кириллические буквы, которые на клавиатуре выглядят как латинские («Х5» вместо «X5»)
+_HOMOGLYPHS = str.maketrans('авекмнорстух', 'abekmhopctyx')
+
+_NON_WORD = re.compile(r'[^0-9a-zа-я]+')
+
+
+def _strip_accents(ch: str) -> str:
+    # кириллицу не трогаем, иначе «й» распадётся на «и» + бреве
+    if 'а' <= ch <= 'я':
+        return ch
+    return ''.join(c for c in unicodedata.normalize('NFKD', ch) if not unicodedata.combining(c))
+
+
+def normalize(text: str) -> str:
+    """Нижний регистр, ё→е, без диакритики (Škoda → skoda), всё кроме букв/цифр — пробел."""
+    text = (text or '').lower().replace('ё', 'е')
+    text = ''.join(_strip_accents(ch) for ch in text)
+    return _NON_WORD.sub(' ', text).strip()
+
+
+def to_latin(word: str) -> str:
+    return ''.join(_CYR_TO_LAT.get(ch, ch) for ch in word)
+
+
+def to_cyrillic(word: str) -> str:
+    return _LAT_RE.sub(lambda m: _LAT_MAP[m.group(0)], word)
+
+
+def _variants(word: str):
+    seen = []
+    for v in (word, to_latin(word), to_cyrillic(word), word.translate(_HOMOGLYPHS)):
+        if v and v not in seen:
+            seen.append(v)
+    return seen
+
+
+def build_search_text(brand, model, vin) -> str:
+    """
+    Поисковая строка машины: марка и модель в обоих алфавитах + VIN как есть.
+    «BMW» хранится как «bmw бмв», поэтому «БМВ» находит BMW и наоборот.
+    """
+    words = []
+    for w in normalize(f"{brand or ''} {model or ''}").split():
+        for v in _variants(w):
+            if v not in words:
+                words.append(v)
+    vin = normalize(vin)
+    if vin and vin not in words:
+        words.append(vin)
+    return ' '.join(words)
+
+
+def build_person_text(last_name, first_name, middle_name) -> str:
+    """Поисковая строка человека: ФИО в нижнем регистре, ё→е, одни буквы/цифры."""
+    return normalize(' '.join(p for p in (last_name, first_name, middle_name) if p))
+
+
+_DIGITS = re.compile(r'\D+')
+
+
+def normalize_phone(raw) -> str:
+    """
+    Телефон в E.164 («8 (916) 123-45-67» → «+79161234567») или None,
+    если цифр слишком мало или много. Номера без кода страны считаем российскими.
+    """
+    digits = _DIGITS.sub('', raw or '')
+    if len(digits) == 10 and not (raw or '').strip().startswith('+'):
+        digits = '7' + digits
+    elif len(digits) == 11 and digits[0] == '8':
+        digits = '7' + digits[1:]
+    if not 11 <= len(digits) <= 15:
+        return None
+    return '+' + digits
+
+
+# часть запроса, похожая на номер: цифры, +, скобки, дефисы, точки
+_PHONE_TOKEN = re.compile(r'[\d+().\-]*\d[\d+().\-]*')
+
+
+def is_phone_token(token: str) -> bool:
+    return _PHONE_TOKEN.fullmatch(token) is not None
+
+
+def phone_query(q: str) -> tuple:
+    """
+    Варианты цифр номера из телефонных частей запроса для поиска подстрокой
+    в phone_e164; () — если цифр меньше трёх. Слова, в том числе с цифрами,
+    в номер не попадают. Полный номер 8XXXXXXXXXX переводится в 7XXXXXXXXXX;
+    у более короткого ведущая 8 — либо код выхода на межгород, либо просто
+    цифра номера, поэтому ищем оба варианта: «Петров2 8 (916)» → («8916», «7916»),
+    «845» → («845», «745»).
+    """
+    phone = ''.join(t for t in (q or '').split() if is_phone_token(t))
+    digits = _DIGITS.sub('', phone)
+    if len(digits) < 3:
+        return ()
+    if re.search(r'[+\d]', phone).group(0) != '8':
+        return (digits,)
+    if len(digits) == 11:
+        return ('7' + digits[1:],)
+    return (digits, '7' + digits[1:])
+
+
+def query_terms(q: str):
+    """Слова запроса со всеми вариантами написания: [[вариант, ...], ...]."""
+    return [_variants(w) for w in normalize(q).split()]
+
+
+# ---- поиск по каталогу ----
+
+_cars_fts = table('cars_fts', column('rowid'), column('search_text'))
+
+# литерал, а не параметр: выражение должно совпасть с выражением GIN-индекса
+_SIMPLE = literal_column("'simple'")
+
+
+def _fts5_query(terms) -> str:
+    # слова нормализованы до [0-9a-zа-я], так что кавычки внутри невозможны
+    groups = ['(' + ' OR '.join(f'"{v}"*' for v in variants) + ')' for variants in terms]
+    return ' AND '.join(groups)
+
+
+def _tsquery(terms) -> str:
+    groups = ['(' + ' | '.join(f'{v}:*' for v in variants) + ')' for variants in terms]
+    return ' & '.join(groups)
+
+
+def _ranked_matches(q: str, dialect: str):
+    """Подзапрос (car_id, rank) по индексу; rank — чем больше, тем релевантнее."""
+    from models import Car
+
+    terms = query_terms(q)
+    if not terms:
+        return None
+
+    if dialect == 'postgresql':
+        # GIN по to_tsvector('simple', search_text) и GIN gin_trgm_ops по search_text
+        tsv = func.to_tsvector(_SIMPLE, Car.search_text)
+        tsq = func.to_tsquery(_SIMPLE, _tsquery(terms))
+        qnorm = normalize(q)
+        # ts_rank и similarity — real; курсор хранит rank как float8, и при
+        # сравнении real с float8 равные ранги расходились бы между страницами
+        rank = cast(func.ts_rank(tsv, tsq) + func.similarity(Car.search_text, qnorm), Double)
+        return (
+            select(Car.id.label('car_id'), rank.label('rank'))
+            .where(or_(tsv.op('@@')(tsq), Car.search_text.ilike(f'%{qnorm}%')))
+            .subquery()
+        )
+
+    if dialect == 'sqlite':
+        # bm25() отрицательный: чем меньше, тем лучше
+        return (
+            select(
+                _cars_fts.c.rowid.label('car_id'),
+                (-func.bm25(literal_column('cars_fts'))).label('rank'),
+            )
+            .where(literal_column('cars_fts').op('MATCH')(_fts5_query(terms)))
+            .subquery()
+        )
+
+    # прочие СУБД: без индекса, но с тем же поведением по транслиту
+    conds = [or_(*(Car.search_text.like(f'%{v}%') for v in variants)) for variants in terms]
+    return select(Car.id.label('car_id'), literal_column('0.0').label('rank')).where(*conds).subquery()
+
+
+def search_cars(query, q: str, dialect: str):
+    """
+    Ограничить запрос Car результатами поиска.
+    Возвращает (query, rank_expr); rank_expr=None, если запрос пустой.
+    """
+    sub = _ranked_matches(q, dialect)
+    if sub is None:
+        return query, None
+    from models import Car
+    return query.join(sub, sub.c.car_id == Car.id), sub.c.rank
+
+
+def match_clause(q: str, dialect: str):
+    """Условие WHERE «машина подходит под запрос» (без ранжирования) или None."""
+    sub = _ranked_matches(q, dialect)
+    if sub is None:
+        return None
+    from models import Car
+    return Car.id.in_(select(sub.c.car_id))
+
+
+# ---- поиск людей (клиенты, сотрудники) ----
+# search_name — нормализованное ФИО, phone_e164 — телефон в E.164. Любая
+# часть ФИО или номера ищется подстрокой: в Postgres её обслуживает
+# GIN gin_trgm_ops, в SQLite — FTS5 с токенайзером trigram (<таблица>_fts).
+
+_TRIGRAM = 3
+
+
+def _fts_match(fts_name: str, query: str):
+    return select(column('rowid')).select_from(table(fts_name)).where(
+        literal_column(fts_name).op('MATCH')(query))
+
+
+def phone_match(model, variants, dialect: str):
+    """Условие «в phone_e164 есть подстрока из variants» (см. phone_query) по индексу."""
+    if dialect == 'sqlite':
+        expr = ' OR '.join(f'"{digits}"' for digits in variants)
+        return model.id.in_(_fts_match(f'{model.__tablename__}_fts', f'phone_e164 : ({expr})'))
+    return or_(*[model.phone_e164.like(f'%{digits}%') for digits in variants])
+
+
+def person_match(model, q: str, dialect: str):
+    """
+    Условие WHERE «человек подходит под запрос» или None. Слова ищутся в ФИО,
+    цифры — в телефоне (если он есть у модели); при обоих нужно совпадение обоих.
+    """
+    has_phone = hasattr(model, 'phone_e164')
+    if has_phone:
+        q_words = ' '.join(t for t in (q or '').split() if not is_phone_token(t))
+    else:
+        q_words = q
+    words = normalize(q_words).split()
+    digits = phone_query(q) if has_phone else ()
+    if not words and not digits:
+        return None
+    fts = f'{model.__tablename__}_fts'
+    conds = []
+
+    # короткие слова триграммами не ищутся — для них обычный LIKE
+    conds += [model.search_name.like(f'%{w}%') for w in words if len(w) < _TRIGRAM]
+    long = [w for w in words if len(w) >= _TRIGRAM]
+    if dialect == 'sqlite' and long:
+        # слова нормализованы до [0-9a-zа-я], кавычки внутри невозможны
+        conds.append(model.id.in_(_fts_match(fts, ' AND '.join(f'search_name : "{w}"' for w in long))))
+    else:
+        conds += [model.search_name.like(f'%{w}%') for w in long]
+
+    if digits:
+        conds.append(phone_match(model, digits, dialect))
+    return and_(*conds)
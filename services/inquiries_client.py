@@ -1,16 +1,322 @@
 # services/inquiries_client.py
 import os
+import threading
+import time
+from collections import OrderedDict, deque
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from pagination import KeysetPage
 
 BASE_URL = os.getenv("INQUIRIES_BASE", "http://inquiries:8080/api")
 API_KEY = os.getenv("INQUIRIES_API_KEY", "")
+# проба готовности сервиса (Go: GET /ready проверяет БД)
+READY_URL = os.getenv("INQUIRIES_READY_URL", BASE_URL.rsplit("/api", 1)[0] + "/ready")
+
+# (соединение, ответ): недоступный сервис не держит sync-воркер 5 секунд
+CONNECT_TIMEOUT = float(os.getenv("INQUIRIES_CONNECT_TIMEOUT", 1.0))
+READ_TIMEOUT = float(os.getenv("INQUIRIES_READ_TIMEOUT", 3.0))
+# keep-alive соединений на процесс (по числу потоков gunicorn-воркера)
+POOL_SIZE = int(os.getenv("INQUIRIES_POOL_SIZE", 4))
+RETRIES = int(os.getenv("INQUIRIES_RETRIES", 2))
+# срок вызова вместе с повторами: после него новая попытка не начинается,
+# так что поток ждёт не дольше DEADLINE + READ_TIMEOUT (на последнюю попытку)
+DEADLINE = float(os.getenv("INQUIRIES_DEADLINE", 3.0))
+# подряд идущих сбоев до размыкания и пауза до следующей пробы /ready
+BREAKER_THRESHOLD = int(os.getenv("INQUIRIES_BREAKER_THRESHOLD", 5))
+BREAKER_COOLDOWN = float(os.getenv("INQUIRIES_BREAKER_COOLDOWN", 15.0))
+# страниц списков заявок в кэше процесса (ключ — фильтры и курсор), 0 — без кэша
+LIST_CACHE_SIZE = int(os.getenv("INQUIRIES_LIST_CACHE_SIZE", 256))
+
+
+class InquiriesUnavailable(RuntimeError):
+    """Сервис заявок не отвечает или выключен предохранителем — запрос не отправлялся."""
+
+
+class InquiryRejected(RuntimeError):
+    """Сервис отверг запрос как некорректный (400/422) — повтор того же запроса не поможет."""
+
+
+# ---- предохранитель ----
+
+class CircuitBreaker:
+    """
+    closed — запросы идут; после threshold сбоев подряд — open: запросы
+    сразу отклоняются. Через cooldown один поток проверяет /ready: ответ
+    200 замыкает цепь, иначе ждём следующий cooldown.
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.rejected = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        return "closed" if self.opened_at is None else "open"
+
+    def allow(self, probe) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self._probing or time.monotonic() - self.opened_at < self.cooldown:
+                self.rejected += 1
+                return False
+            self._probing = True
+        ready = False
+        try:
+            ready = probe()
+        finally:
+            with self._lock:
+                self._probing = False
+                if ready:
+                    self.failures = 0
+                    self.opened_at = None
+                else:
+                    self.opened_at = time.monotonic()
+                    self.rejected += 1
+        return ready
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold and self.opened_at is None:
+                self.opened_at = time.monotonic()
+
+
+_breaker = CircuitBreaker(BREAKER_THRESHOLD, BREAKER_COOLDOWN)
+
+
+# ---- сессия с пулом соединений ----
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
 
 
-def _headers():
-    headers = {"Content-Type": "application/json"}
+class _DeadlineRetry(Retry):
+    """Retry, который не начинает попытку после срока текущего вызова (_request)."""
+
+    _local = threading.local()
+
+    @classmethod
+    def start(cls, seconds: float):
+        cls._local.deadline = time.monotonic() + seconds
+
+    def is_exhausted(self) -> bool:
+        deadline = getattr(self._local, "deadline", None)
+        return super().is_exhausted() or (deadline is not None and time.monotonic() >= deadline)
+
+
+def _make_session() -> requests.Session:
+    retry = _DeadlineRetry(
+        total=RETRIES,
+        connect=RETRIES,
+        # таймаут ответа не повторяем: медленный сервис держал бы поток
+        # по READ_TIMEOUT на каждую попытку
+        read=0,
+        status=RETRIES,
+        # повторяем только идемпотентные вызовы; POST — лишь если запрос не ушёл (ошибка соединения)
+        allowed_methods=frozenset({"GET", "HEAD", "PUT"}),
+        status_forcelist=(502, 503, 504),
+        backoff_factor=0.2,
+        backoff_jitter=0.2,  # разводим повторы разных воркеров во времени
+        backoff_max=2.0,
+        respect_retry_after_header=False,  # Retry-After может быть дольше DEADLINE
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=POOL_SIZE, pool_block=False, max_retries=retry)
+    s = requests.Session()
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    s.headers["Content-Type"] = "application/json"
     if API_KEY:
-        headers["X-Api-Key"] = API_KEY
-    return headers
+        s.headers["X-Api-Key"] = API_KEY
+    return s
+
+
+def _get_session() -> requests.Session:
+    # своя сессия в каждом процессе: сокеты родителя после fork не делим
+    global _session, _session_pid
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            _session = _make_session()
+            _session_pid = os.getpid()
+            _stats.reset()
+            _lists.reset()
+        return _session
+
+
+# ---- кэш списков ----
+
+class _ListCache:
+    """
+    Последний ответ на GET списка с его ETag/Last-Modified, LRU по ключу
+    (путь, фильтр). Повторный запрос идёт условным: 304 от сервиса
+    означает «список не менялся», и он берётся отсюда.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.reset()
+
+    def reset(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (etag, last_modified, data)
+        self.hits = 0  # ответов 304
+        self.misses = 0  # полных ответов
+
+    def validators(self, key) -> dict:
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is None:
+            return {}
+        etag, modified, _ = entry
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if modified:
+            headers["If-Modified-Since"] = modified
+        return headers
+
+    def hit(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def store(self, key, resp: requests.Response, data):
+        with self.lock:
+            self.misses += 1
+            etag, modified = resp.headers.get("ETag"), resp.headers.get("Last-Modified")
+            if self.size <= 0 or not (etag or modified):
+                self.entries.pop(key, None)
+                return
+            self.entries[key] = (etag, modified, data)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+
+_lists = _ListCache(LIST_CACHE_SIZE)
+
+
+# ---- статистика ----
+
+class _Stats:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.latencies = deque(maxlen=500)  # мс, последние запросы
+
+    def record(self, elapsed_ms: float, retries: int, ok: bool):
+        with self.lock:
+            self.requests += 1
+            self.retries += retries
+            if not ok:
+                self.errors += 1
+            self.latencies.append(elapsed_ms)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            lat = sorted(self.latencies)
+            data = {"requests": self.requests, "errors": self.errors, "retries": self.retries}
+
+        def pct(p):
+            return round(lat[min(len(lat) - 1, int(len(lat) * p))], 1) if lat else None
+        data["latency_ms"] = {"p50": pct(0.5), "p95": pct(0.95), "p99": pct(0.99),
+                              "max": round(lat[-1], 1) if lat else None, "window": len(lat)}
+        return data
+
+
+_stats = _Stats()
+
+
+def _pool_stats() -> list[dict]:
+    if _session is None or _session_pid != os.getpid():
+        return []
+    pools = []
+    for adapter in dict.fromkeys(_session.adapters.values()):
+        for key in list(adapter.poolmanager.pools.keys()):
+            pool = adapter.poolmanager.pools.get(key)
+            if pool is None:
+                continue
+            pools.append({
+                "host": f"{pool.scheme}://{pool.host}:{pool.port}",
+                "maxsize": pool.pool.maxsize if pool.pool else 0,
+                # очередь пула заполнена None до maxsize; соединения — остальное
+                "idle": sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool else 0,
+                "opened": pool.num_connections,  # всего открыто за жизнь пула
+                "requests": pool.num_requests,
+            })
+    return pools
+
+
+def stats() -> dict:
+    """Статистика клиента в текущем процессе: запросы, задержки, пул, предохранитель."""
+    return {
+        "pid": os.getpid(),
+        **_stats.snapshot(),
+        "pools": _pool_stats(),
+        "list_cache": {"size": len(_lists.entries), "max": _lists.size,
+                       "not_modified": _lists.hits, "full": _lists.misses},
+        "breaker": {
+            "state": _breaker.state,
+            "failures": _breaker.failures,
+            "rejected": _breaker.rejected,
+            "threshold": _breaker.threshold,
+            "cooldown_s": _breaker.cooldown,
+        },
+    }
+
+
+# ---- запросы ----
+
+def _probe_ready() -> bool:
+    try:
+        return _get_session().get(READY_URL, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)).status_code == 200
+    except requests.RequestException:
+        return False
+
+
+def _request(method: str, path: str, **kwargs) -> requests.Response:
+    if not _breaker.allow(_probe_ready):
+        raise InquiriesUnavailable("Сервис заявок временно недоступен")
+    session = _get_session()
+    started = time.perf_counter()
+    _DeadlineRetry.start(DEADLINE)
+    try:
+        resp = session.request(method, f"{BASE_URL}{path}", timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), **kwargs)
+    except requests.RequestException as e:
+        _stats.record((time.perf_counter() - started) * 1000, 0, ok=False)
+        _breaker.failure()
+        raise InquiriesUnavailable(f"Сервис заявок не отвечает: {e.__class__.__name__}") from e
+    retries = resp.raw.retries.history if resp.raw is not None and resp.raw.retries else ()
+    failed = resp.status_code >= 500
+    _stats.record((time.perf_counter() - started) * 1000, len(retries), ok=not failed)
+    if failed:
+        _breaker.failure()
+    else:
+        _breaker.success()
+    return resp
 
 
 def _raise_api_error(resp: requests.Response):
@@ -29,6 +335,15 @@ def _raise_api_error(resp: requests.Response):
     resp.raise_for_status()
 
 
+def _error_text(resp: requests.Response) -> str:
+    """Текст ошибки из JSON {"error": "..."} или начало тела ответа."""
+    try:
+        msg = resp.json().get("error")
+    except (ValueError, AttributeError):
+        msg = None
+    return msg or resp.text[:200] or resp.reason or str(resp.status_code)
+
+
 def create_inquiry(payload: dict) -> dict:
     """
     payload = {
@@ -40,46 +355,79 @@ def create_inquiry(payload: dict) -> dict:
         "contact_phone": str
     }
     """
-    url = f"{BASE_URL}/inquiries"
-    resp = requests.post(url, json=payload, headers=_headers(), timeout=5)
+    resp = _request("POST", "/inquiries", json=payload)
     if not resp.ok:
         _raise_api_error(resp)
     return resp.json()
 
 
-def list_by_buyer(buyer_id: int) -> list[dict]:
-    url = f"{BASE_URL}/inquiries"
-    resp = requests.get(
-        url,
-        params={"buyer_id": buyer_id},
-        headers=_headers(),
-        timeout=5,
-    )
+def create_inquiries_batch(items: list[dict]) -> list[dict]:
+    """
+    Пакет заявок из outbox (см. outbox.py): items — payload create_inquiry
+    плюс "client_ref". Повтор с теми же client_ref не создаёт дублей.
+    Возвращает [{"client_ref", "id" | "error"}] в порядке items.
+    """
+    resp = _request("POST", "/inquiries/batch", json={"items": items})
+    if resp.status_code in (400, 422):
+        raise InquiryRejected(_error_text(resp))
     if not resp.ok:
-        _raise_api_error(resp)
-    return resp.json()
+        # 401/403 — ключ, 404 — сервис без /batch, 408/429, 5xx (пакет откатился целиком):
+        # сами заявки тут ни при чём, отправим позже
+        raise InquiriesUnavailable(f"Сервис заявок ответил {resp.status_code}: {_error_text(resp)}")
+    return resp.json()["results"]
 
 
-def list_by_seller(seller_id: int) -> list[dict]:
-    url = f"{BASE_URL}/inquiries"
-    resp = requests.get(
-        url,
-        params={"seller_id": seller_id},
-        headers=_headers(),
-        timeout=5,
-    )
+def _get_list(params: dict) -> dict:
+    """GET /inquiries с ревалидацией по кэшу: неизменная страница не передаётся заново."""
+    params = {k: v for k, v in params.items() if v not in (None, "")}
+    key = tuple(sorted(params.items()))
+    resp = _request("GET", "/inquiries", params=params, headers=_lists.validators(key))
+    if resp.status_code == 304:
+        data = _lists.hit(key)
+        if data is not None:
+            return data
+        # запись вытеснили между запросами — берём список целиком
+        resp = _request("GET", "/inquiries", params=params)
     if not resp.ok:
         _raise_api_error(resp)
-    return resp.json()
+    data = resp.json()
+    _lists.store(key, resp, data)
+    return data
+
+
+def _page(params: dict, cursor, limit, status, date_from, date_to) -> KeysetPage:
+    data = _get_list({**params, "cursor": cursor, "limit": limit, "status": status,
+                      "from": date_from, "to": date_to})
+    return KeysetPage(data["items"], next_cursor=data.get("next_cursor"),
+                      prev_cursor=data.get("prev_cursor"), per_page=limit)
+
+
+def list_by_buyer(buyer_id: int, cursor=None, limit=None, status=None, date_from=None, date_to=None) -> KeysetPage:
+    """
+    Страница исходящих заявок покупателя, новые сверху. cursor — из
+    next_cursor/prev_cursor предыдущей страницы; date_from/date_to —
+    "YYYY-MM-DD", обе границы включительно.
+    """
+    return _page({"buyer_id": buyer_id}, cursor, limit, status, date_from, date_to)
+
+
+def list_by_seller(seller_id: int, cursor=None, limit=None, status=None, date_from=None, date_to=None) -> KeysetPage:
+    """Страница входящих заявок продавца; параметры — как у list_by_buyer."""
+    return _page({"seller_id": seller_id}, cursor, limit, status, date_from, date_to)
 
 
 def update_status(inquiry_id: int, status: str) -> None:
-    url = f"{BASE_URL}/inquiries/{inquiry_id}/status"
-    resp = requests.put(
-        url,
-        json={"status": status},
-        headers=_headers(),
-        timeout=5,
-    )
+    resp = _request("PUT", f"/inquiries/{inquiry_id}/status", json={"status": status})
+    if not resp.ok:
+        _raise_api_error(resp)
+
+
+def update_status_many(seller_id: int, ids: list[int], status: str) -> list[int]:
+    """
+    Один статус для многих заявок продавца одним запросом. Заявки других
+    продавцов не меняются; возвращает id обновлённых.
+    """
+    resp = _request("PUT", "/inquiries/status", json={"seller_id": seller_id, "ids": ids, "status": status})
     if not resp.ok:
         _raise_api_error(resp)
+    return resp.json()["updated"]
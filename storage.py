@@ -0,0 +1,203 @@
+import hashlib
+import os
+import re
+import time
+import uuid
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import and_, select, union
+
+from extensions import db
+from images import VARIANTS, remove_variants
+
+uploads_cli = AppGroup('uploads', help='Хранилище загруженных фото.')
+
+# <2 hex>/<2 hex>/<sha256>.<ext> — 65 536 каталогов, в каждом единицы файлов
+_CONTENT_NAME = re.compile(r'^([0-9a-f]{2})/([0-9a-f]{2})/([0-9a-f]{64})\.[a-z0-9]+$')
+_VARIANT_STEM = re.compile(r'^(.*)_(?:%s)_\d+$' % '|'.join(VARIANTS))
+
+_CHUNK = 64 * 1024
+
+
+def content_name(digest: str, ext: str) -> str:
+    return f"{digest[:2]}/{digest[2:4]}/{digest}.{ext}"
+
+
+def content_digest(name: str):
+    """sha256 из имени вида ab/cd/<sha256>.ext или None для старых имён."""
+    m = _CONTENT_NAME.match(name or '')
+    return m.group(3) if m else None
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+def save_upload(file_storage, ext: str) -> str:
+    """
+    Сохранить файл под именем из sha256 содержимого и вернуть это имя.
+    Одинаковые фото хранятся один раз: если файл уже есть, копия не пишется.
+    """
+    stream = file_storage.stream
+    return save_chunks(iter(lambda: stream.read(_CHUNK), b''), ext)
+
+
+def save_chunks(chunks, ext: str, max_bytes: int = None, check=None) -> str:
+    """
+    То же для произвольного источника байтов (например, скачиваемого фото).
+    max_bytes — прервать запись с UploadTooLarge; check(path) — проверить
+    дописанный временный файл до того, как он попадёт в хранилище.
+    """
+    folder = current_app.config['UPLOAD_FOLDER']
+    os.makedirs(folder, exist_ok=True)
+    tmp = os.path.join(folder, f".tmp-{uuid.uuid4().hex}")
+    h = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp, 'wb') as out:
+            for chunk in chunks:
+                size += len(chunk)
+                if max_bytes is not None and size > max_bytes:
+                    raise UploadTooLarge(f'больше {max_bytes} байт')
+                h.update(chunk)
+                out.write(chunk)
+        if check is not None:
+            check(tmp)
+        name = content_name(h.hexdigest(), ext)
+        dst = os.path.join(folder, name)
+        if os.path.exists(dst):
+            # свежая отметка времени, чтобы gc не счёл файл сиротой до коммита
+            os.utime(dst)
+        else:
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            os.replace(tmp, dst)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return name
+
+
+def ref_count(name: str) -> int:
+    """Сколько записей ссылается на файл (индексы по cars.image_path и remote_images.image_path)."""
+    from models import Car, RemoteImage
+    return (Car.query.filter(Car.image_path == name).count()
+            + RemoteImage.query.filter(RemoteImage.image_path == name).count())
+
+
+def _same_stem(column, name: str):
+    # <stem>.<любое расширение>: диапазон, а не LIKE, — идёт по B-tree индексу
+    stem = name.rsplit('.', 1)[0]
+    return and_(column > stem + '.', column < stem + '/')
+
+
+def stem_ref_count(name: str) -> int:
+    """
+    Сколько записей ссылается на то же содержимое под любым расширением
+    (<hash>.jpg и <hash>.jpeg). Варианты фото общие для всех таких имён.
+    """
+    from models import Car, RemoteImage
+    return (Car.query.filter(_same_stem(Car.image_path, name)).count()
+            + RemoteImage.query.filter(_same_stem(RemoteImage.image_path, name)).count())
+
+
+def _recently_saved(path: str) -> bool:
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        return False
+    return mtime > time.time() - current_app.config['UPLOADS_GRACE_MINUTES'] * 60
+
+
+def release(name: str):
+    """
+    Удалить файл, если на него больше никто не ссылается, и его варианты,
+    если они не нужны тому же фото под другим расширением.
+    Вызывать после коммита, который убрал ссылку.
+
+    Свежий файл не трогаем: имена по содержимому совпадают, и те же байты
+    мог только что сохранить другой запрос, ещё не закоммитивший ссылку
+    (save_chunks обновляет mtime). Такой файл позже уберёт `flask uploads gc`.
+    """
+    if not name or ref_count(name):
+        return
+    path = os.path.join(current_app.config['UPLOAD_FOLDER'], name)
+    if _recently_saved(path):
+        return
+    if not stem_ref_count(name):
+        remove_variants(name)
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def referenced_stems() -> set:
+    """Имена (без расширения) всех файлов, на которые есть ссылки в БД."""
+    from models import Car, RemoteImage
+    stmt = union(
+        select(Car.image_path).where(Car.image_path.isnot(None)),
+        select(RemoteImage.image_path).where(RemoteImage.image_path.isnot(None)),
+    )
+    rows = db.session.execute(stmt.execution_options(yield_per=5000)).scalars()
+    return {name.rsplit('.', 1)[0] for name in rows}
+
+
+def find_orphans(grace_seconds: int):
+    """Файлы в UPLOAD_FOLDER без ссылок из БД и старше grace_seconds: [(path, size)]."""
+    folder = current_app.config['UPLOAD_FOLDER']
+    alive = referenced_stems()
+    cutoff = time.time() - grace_seconds
+    orphans = []
+    stack = [folder]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                    continue
+                st = entry.stat(follow_symlinks=False)
+                if st.st_mtime > cutoff:
+                    continue  # возможно, загрузка ещё не закоммичена
+                rel = os.path.relpath(entry.path, folder).replace(os.sep, '/')
+                if entry.name.startswith('.tmp-') or entry.name.endswith('.tmp'):
+                    orphans.append((entry.path, st.st_size))
+                    continue
+                stem = rel.rsplit('.', 1)[0]
+                m = _VARIANT_STEM.match(stem)
+                if (m.group(1) if m else stem) not in alive:
+                    orphans.append((entry.path, st.st_size))
+    return orphans
+
+
+def _prune_empty_dirs(folder: str):
+    for root, _dirs, _files in os.walk(folder, topdown=False):
+        if root != folder and not os.listdir(root):
+            try:
+                os.rmdir(root)
+            except OSError:
+                pass
+
+
+@uploads_cli.command('gc')
+@click.option('--dry-run', is_flag=True, help='Только показать, что будет удалено.')
+@click.option('--grace', type=int, help='Не трогать файлы моложе N минут (по умолчанию UPLOADS_GRACE_MINUTES).')
+def gc_command(dry_run, grace):
+    """Удалить файлы, на которые не ссылается ни одна машина и ни одно закэшированное внешнее фото."""
+    if grace is None:
+        grace = current_app.config['UPLOADS_GRACE_MINUTES']
+    orphans = find_orphans(grace * 60)
+    total = sum(size for _, size in orphans)
+    for path, _ in orphans:
+        if dry_run:
+            click.echo(path)
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    if not dry_run:
+        _prune_empty_dirs(current_app.config['UPLOAD_FOLDER'])
+    verb = 'Найдено' if dry_run else 'Удалено'
+    click.echo(f"{verb} файлов: {len(orphans)}, {total / 1024 / 1024:.1f} МБ")
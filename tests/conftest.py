@@ -0,0 +1,31 @@
+import os
+
+import pytest
+
+# app.py собирает приложение при импорте, поэтому база задаётся раньше:
+# SQLite в памяти, одна на процесс (Flask-SQLAlchemy держит одно соединение)
+os.environ['DATABASE_URL'] = 'sqlite://'
+
+from app import app as flask_app  # noqa: E402
+from extensions import db  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    flask_app.config.update(
+        TESTING=True,
+        WTF_CSRF_ENABLED=False,
+        PASSWORD_HASH_WORKERS=0,
+        PAGE_CACHE_ENABLED=False,
+        UPLOAD_FOLDER=str(tmp_path / 'uploads'),
+    )
+    with flask_app.app_context():
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,45 @@
+from datetime import date
+
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, text
+
+import querycount
+from extensions import db
+from models import Car, Customer, Employee, Sale
+from querycount import QueryBudgetExceeded, query_budget
+
+
+def test_sales_list_stays_within_budget(client):
+    employee = Employee(last_name='Сидоров', first_name='Пётр')
+    db.session.add(employee)
+    for i in range(6):
+        car = Car(vin=f'XTA21099{i:09d}', brand='Лада', model='2109', year=2000, price=100000)
+        customer = Customer(last_name=f'Клиент{i}', first_name='Иван')
+        db.session.add(Sale(car=car, customer=customer, employee=employee, price=100000, sale_date=date(2025, 1, i + 1)))
+    db.session.commit()
+    db.session.expunge_all()
+
+    # с ленивой загрузкой машины, клиента и сотрудника вышло бы 1 + 6 * 3 запросов
+    resp = client.get('/sales/')
+    assert resp.status_code == 200
+    assert int(resp.headers['X-SQL-Queries']) <= 5
+
+
+def test_lazy_route_over_budget_raises():
+    app = Flask(__name__)
+    app.config.update(TESTING=True, SQL_QUERY_COUNTER=None, SQL_REPEAT_THRESHOLD=5, SQL_QUERY_BUDGET_RAISE=None)
+    querycount.init_app(app)
+    engine = create_engine('sqlite://')
+
+    @app.route('/lazy')
+    @query_budget(2)
+    def lazy():
+        # запрос на каждый элемент списка — типичный N+1
+        with engine.connect() as conn:
+            for i in range(5):
+                conn.execute(text('SELECT :i'), {'i': i})
+        return 'ok'
+
+    with pytest.raises(QueryBudgetExceeded, match='5 SQL-запросов при бюджете 2'):
+        app.test_client().get('/lazy')
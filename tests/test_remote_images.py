@@ -0,0 +1,98 @@
+import io
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from PIL import Image
+
+from models import RemoteImage
+from remote_images import fetch
+
+
+def _png() -> bytes:
+    buf = io.BytesIO()
+    Image.new('RGB', (4, 4), 'red').save(buf, 'PNG')
+    return buf.getvalue()
+
+
+# путь -> (Content-Type, тело, отдавать ли Content-Length)
+ROUTES = {
+    '/photo.png': ('image/png', _png(), True),
+    '/huge.jpg': ('image/jpeg', b'\xff' * 4096, True),
+    '/huge-stream.jpg': ('image/jpeg', b'\xff' * 4096, False),
+    '/page.html': ('text/html', b'<html></html>', True),
+    '/fake.png': ('image/png', b'not really a png', True),
+}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.hits.append(self.path)
+        ctype, body, with_length = ROUTES[self.path]
+        self.send_response(200)
+        self.send_header('Content-Type', ctype)
+        if with_length:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    httpd.hits = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def local_fetch(app, server):
+    """fetch() с разрешённым localhost и маленьким лимитом размера."""
+    app.config.update(REMOTE_IMAGES_ALLOW_PRIVATE=True, REMOTE_IMAGES_MAX_BYTES=1024, REMOTE_IMAGES_TIMEOUT=5)
+
+    def run(path):
+        img = RemoteImage(url=f'http://127.0.0.1:{server.server_port}{path}', failures=0)
+        fetch(img)
+        return img
+    yield run
+    app.config.update(REMOTE_IMAGES_ALLOW_PRIVATE=False)
+
+
+def test_image_is_saved(local_fetch):
+    img = local_fetch('/photo.png')
+    assert img.status == 'ok'
+    assert img.image_path.endswith('.png')
+
+
+@pytest.mark.parametrize('path', ['/huge.jpg', '/huge-stream.jpg'])
+def test_oversized_body_is_rejected(local_fetch, path):
+    img = local_fetch(path)
+    assert img.status == 'error'
+    assert 'больше 1024 байт' in img.error
+    assert img.image_path is None
+
+
+@pytest.mark.parametrize('path, error', [
+    ('/page.html', 'неподходящий Content-Type'),
+    ('/fake.png', 'не является изображением'),
+])
+def test_non_image_is_rejected(local_fetch, path, error):
+    img = local_fetch(path)
+    assert img.status == 'error'
+    assert error in img.error
+    assert img.image_path is None
+
+
+def test_private_address_is_refused_by_default(app, server):
+    assert not app.config['REMOTE_IMAGES_ALLOW_PRIVATE']
+    img = RemoteImage(url=f'http://127.0.0.1:{server.server_port}/photo.png', failures=0)
+    fetch(img)
+    assert img.status == 'error'
+    assert 'внутренней сети' in img.error
+    assert server.hits == []
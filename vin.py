@@ -0,0 +1,24 @@
+# Правила VIN, общие для формы машины (CarForm) и массовой загрузки (car_import.py)
+
+VIN_MIN_LENGTH = 10
+VIN_MAX_LENGTH = 32
+VIN_LENGTH_MESSAGE = f'VIN должен содержать от {VIN_MIN_LENGTH} до {VIN_MAX_LENGTH} символов'
+# в реальном VIN этих букв нет
+FORBIDDEN_CHARS = ('I', 'O', 'Q')
+
+
+def normalize_vin(raw) -> str:
+    """Верхний регистр, без пробелов по краям."""
+    return (raw or '').upper().strip()
+
+
+def vin_error(vin: str, check_length: bool = True):
+    """Текст ошибки для нормализованного VIN или None, если формат верный."""
+    if check_length and not VIN_MIN_LENGTH <= len(vin) <= VIN_MAX_LENGTH:
+        return VIN_LENGTH_MESSAGE
+    if not all(c.isalnum() for c in vin):
+        return 'VIN может содержать только буквы и цифры'
+    for char in FORBIDDEN_CHARS:
+        if char in vin:
+            return f'VIN не может содержать букву "{char}"'
+    return None